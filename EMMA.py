@@ -2,7 +2,36 @@
 from optparse import OptionParser
 import re
 import os
+import itertools
+import glob
+import shutil
+import hashlib
+import cPickle
+import tempfile
+import multiprocessing
+import functools
+import time
+import json
+import cProfile
+import sys
+import threading
+import subprocess
+import SocketServer
+import io
+import gzip
+import bz2
 import numpy
+try:
+    import lzma
+except ImportError:
+    try:
+        from backports import lzma
+    except ImportError:
+        lzma = None
+try:
+    import resource
+except ImportError:
+    resource = None
 from numpy import matrix
 from numpy import zeros
 
@@ -35,7 +64,9 @@ predicted labels share. The total sum of this number should be maximized for the
 global assignment. This global assignment or maximum matching is found by 
 optimizing a linear program where all elements of the smaller of the two 
 partitions are matched with one of the other partition. For this, the third 
-party linear program solver lp_solve(^1) is used. 
+party linear program solver lp_solve(^1) is used. Alternatively, the maximum 
+matching is found in-process by the Hungarian method (option "-l hungarian") 
+which does not require lp_solve.
 
 After the maximum matching of labels has been found, predicted labels are 
 exchanged by their gold standard matches. The evaluation is then performed as a 
@@ -54,12 +85,38 @@ calculated. The actual morpheme label comparison is performed for assigned
 combinations and multiplied by the inverse number of possible combinations.
 In this way, giving too few or too many alternatives is punished.
 
+The precision and recall fractions of each word are kept, so that confidence 
+intervals of the measures can be estimated by bootstrap resampling of the words 
+(option "-b") and two predictions can be compared by a paired bootstrap test 
+(option "-c").
+
+Segmentations can also be evaluated without labels by precision and recall of
+morph boundaries (option "-B"), e.g. against WordListSegmented.txt.
+
+Scores can be broken down by strata of words, e.g. word length, number of gold
+standard alternatives or any user-defined strata, on the basis of the same 
+morpheme assignment (option "-S").
+
+Gold standards which are too big to be loaded can be read from disk in chunks
+of words (option "-k"), and the count matrix can be calculated by several 
+processes over shards of the word list (option "-j").
+
+For quick checks on large label inventories, the assignment can be approximated
+by a greedy matching in near-linear time (option "-l greedy"). Its matching 
+weight is reported together with an upper bound of the optimal weight and 
+their relative gap.
+
+With option "-D" the evaluation runs as resident service which keeps gold 
+standards loaded and answers JSON requests with predictions line by line on 
+stdin/stdout or on a Unix socket ("--socket"), see class daemon.
+
 (^1) source: http://lpsolve.sourceforge.net, lp_solve version 5.5.0.15, 
      Under GNU LESSER GENERAL PUBLIC LICENSE
 According to Section 6 of this license our work is "work that uses the Library"
-[lp_solve]. For running the evaluation script, lp_solve has to be installed on 
-the user's computer. An executable will be provided with the evaluation script
-or can be acquired from the url stated above.
+[lp_solve]. For running the evaluation script with the lp_solve backend, 
+lp_solve has to be installed on the user's computer. An executable will be 
+provided with the evaluation script or can be acquired from the url stated 
+above.
 
 @author: Sebastian Spiegler, University of Bristol, Bristol, U.K.
 @contact: spiegler@cs.bris.ac.uk
@@ -73,469 +130,3210 @@ Created on Mar 24, 2010
 #
 ################################################################################
 
-# Please state executable and path of lp_solve !!!
-_lpSolvePath = "lp_solve"
+# Please state executable and path of lp_solve !!!
+_lpSolvePath = "lp_solve"
+
+# directory of on-disk caches
+_cacheDir = os.environ.get("EMMA_CACHE_DIR", 
+                           os.path.join(os.path.expanduser("~"), ".cache", "emma"))
+
+# version of gold standard snapshot format
+_goldCacheVersion = 1
+
+# version of state file of incremental evaluation
+_incrementalStateVersion = 3
+
+# version of result cache entries and maximum size of result cache
+_resultCacheVersion = 1
+_resultCacheMaxBytes = 256 * 1024 * 1024
+
+# suffixes of files written by EMMA next to prediction files
+_emmaOutputSuffixes = (".assignment", ".result", ".lpInput", ".lpOutput")
+
+# tolerance for comparing weights of assignments
+_weightTolerance = 1e-9
+
+# maximum number of cells evaluated at once when solving the assignments of 
+# alternatives in a batch
+_batchCells = 4000000
+
+# minimum number of words per shard of the count matrix when it is 
+# calculated by several processes
+_shardWords = 50000
+
+################################################################################
+#
+# Class instrumentation
+# Opt-in measurement of phases of an evaluation: wall time, number of calls and
+# peak memory of each phase, and counters (solver invocations, matrix size, 
+# ...). Phases are functions decorated by instrumentation.phase, nested phases 
+# are named by their path, e.g. "main/morphassignment/countMatrix". When 
+# disabled, a phase costs one test per call. The recorder is not thread-safe,
+# it must only be enabled for evaluations in a single thread.
+#
+################################################################################
+class instrumentation:
+    #===========================================================================
+    # method which starts recording, profileFile: cProfile statistics are 
+    # also collected and written to this file
+    #===========================================================================
+    @staticmethod
+    def enable(profileFile=None):
+        global _instrumentation
+        _instrumentation = phaserecorder(profileFile)
+
+    #===========================================================================
+    # method which stops recording, writes report (JSON) and profile if 
+    # requested and returns report
+    #===========================================================================
+    @staticmethod
+    def finish(reportFile=None):
+        global _instrumentation
+        recorder = _instrumentation
+        _instrumentation = None
+        if recorder is None:
+            return None
+        report = recorder.finish()
+        if reportFile:
+            f = open(reportFile, 'w')
+            json.dump(report, f, indent=1, sort_keys=True)
+            f.close()
+        return report
+
+    # decorator of functions which are recorded as phase
+    @staticmethod
+    def phase(name):
+        def decorate(function):
+            @functools.wraps(function)
+            def recorded(*args, **kwargs):
+                if _instrumentation is None:
+                    return function(*args, **kwargs)
+                _instrumentation.begin(name)
+                try:
+                    return function(*args, **kwargs)
+                finally:
+                    _instrumentation.end()
+            return recorded
+        return decorate
+
+    # adds inc to counter
+    @staticmethod
+    def count(name, inc=1):
+        if _instrumentation is not None:
+            _instrumentation.counters[name] = _instrumentation.counters.get(name, 0) + inc
+
+    # sets counter to the largest recorded value
+    @staticmethod
+    def record(name, value):
+        if _instrumentation is not None:
+            _instrumentation.counters[name] = max(value, _instrumentation.counters.get(name, value))
+
+class phaserecorder:
+    def __init__(self, profileFile=None):
+        # path => dict(calls, seconds, peakMemory, peakGrowth)
+        self.phases = dict()
+        self.counters = dict()
+        self.stack = list()
+        self.started = time.time()
+        self.profileFile = profileFile
+        self.profile = None
+        if profileFile:
+            self.profile = cProfile.Profile()
+            self.profile.enable()
+
+    def begin(self, name):
+        if len(self.stack) > 0:
+            name = self.stack[-1][0] + "/" + name
+        self.stack.append((name, time.time(), tools.peakMemory()))
+
+    #===========================================================================
+    # method which ends innermost phase, peakMemory is the peak of the 
+    # process at the end of the phase, peakGrowth by how much the phase 
+    # raised it
+    #===========================================================================
+    def end(self):
+        (path, started, memory) = self.stack.pop()
+        seconds = time.time() - started
+        peak = tools.peakMemory()
+        if not self.phases.__contains__(path):
+            self.phases[path] = dict(calls=0, seconds=float(0), peakMemory=0, 
+                                     peakGrowth=0)
+        entry = self.phases[path]
+        entry["calls"] += 1
+        entry["seconds"] += seconds
+        entry["peakMemory"] = max(entry["peakMemory"], peak)
+        entry["peakGrowth"] = max(entry["peakGrowth"], peak - memory)
+
+    def finish(self):
+        if self.profile is not None:
+            self.profile.disable()
+            self.profile.dump_stats(self.profileFile)
+        return dict(seconds=time.time() - self.started, 
+                    peakMemory=tools.peakMemory(), 
+                    phases=self.phases, counters=self.counters)
+
+# recorder of enabled instrumentation
+_instrumentation = None
+
+################################################################################
+#
+# Class main_class
+#
+################################################################################
+class main_class:
+    #===========================================================================
+    # main method 
+    #===========================================================================
+    @staticmethod
+    @instrumentation.phase("main")
+    def main(goldFile, predFile, saveAssign, saveResult, verbose, short, 
+             solver="lpsolve", jobs=1, lpSolvePath=None, useCache=True, 
+             cacheDir=None, stateFile=None, resamples=0, comparePred=None, 
+             confidence=0.95, chunkWords=None, strataSpecs=None, 
+             boundaries=False):
+        # unlabelled evaluation of morph boundaries
+        if boundaries:
+            gold = GoldStandard.load(goldFile, useCache, cacheDir)
+            (precision, recall, fmeasure) = boundary.evaluate(gold, predFile)
+            if not short:
+                print "\nRESULT (morph boundaries):\n=========================="
+                print "gold standard:", goldFile
+                print "prediction   :", predFile, "\n"
+                print "precision:", precision
+                print "recall   :", recall
+                print "fmeasure :", fmeasure
+            else:
+                print str(precision) + "\t" + str(recall) + "\t" + str(fmeasure)
+            return
+        
+        # gold standard is read in chunks if chunkWords is given
+        gold = None
+        if not chunkWords:
+            gold = GoldStandard.load(goldFile, useCache, cacheDir)
+        assignFile = None
+        if saveAssign:
+            assignFile = predFile + ".assignment"
+        resultFile = None
+        if saveResult:
+            resultFile = predFile + ".result"
+        if chunkWords:
+            result = chunked.evaluate(goldFile, predFile, chunkWords, solver, jobs, 
+                                      lpSolvePath, assignFile)
+        elif stateFile:
+            result = incremental.evaluate(gold, predFile, stateFile, solver, jobs, 
+                                          lpSolvePath, assignFile, resultFile)
+        else:
+            result = evaluate(gold, predFile, solver, jobs, lpSolvePath, 
+                              assignFile, resultFile, verbose, useCache, cacheDir)
+        
+        if not short:
+            print "\nRESULT:\n======="
+            print "gold standard:", goldFile
+            print "prediction   :", predFile, "\n"
+            print "precision:", result.precision
+            print "recall   :", result.recall
+            print "fmeasure :", result.fmeasure
+        else:
+            print str(result.precision) + "\t" + str(result.recall) + "\t" + str(result.fmeasure) 
+        
+        # optimality gap of approximate assignment (short: matching weight, 
+        # upper bound of optimal weight and relative gap)
+        if result.weightBound is not None:
+            (weight, bound) = result.weightBound
+            if not short:
+                print "\napproximate assignment (" + solver + "):"
+                print "matching weight:", weight, "upper bound of optimum:", bound, "relative gap:", result.relativeGap()
+            else:
+                print tools.list2string([str(value) for value in [weight, bound, result.relativeGap()]], "\t")
+        
+        # breakdown by strata of words (short: one line per stratum)
+        for spec in strataSpecs or []:
+            if gold is None:
+                goldItems = chunked.readItems(goldFile)
+            else:
+                goldItems = gold.getGoldDict().iteritems()
+            (wordStrata, order) = strata.load(spec, goldItems)
+            table = strata.table(spec, strata.evaluate(result, wordStrata, order), 
+                                 short)
+            if not short:
+                print
+            print "".join(table),
+        
+        # bootstrap confidence intervals and paired test
+        # (short: one line of lower and upper bounds, one line of differences 
+        # and p-values)
+        measures = ["precision", "recall", "fmeasure"]
+        if resamples > 0:
+            (intervals, samples) = significance.bootstrap(result, resamples, confidence)
+            if not short:
+                print "\nbootstrap, " + str(resamples) + " resamples, " + str(100 * confidence) + "% confidence interval:"
+                for measure in measures:
+                    print measure.ljust(9) + ":", intervals[measure][0], "-", intervals[measure][1]
+            else:
+                print tools.list2string([str(bound) for measure in measures for bound in intervals[measure]], "\t")
+        if comparePred:
+            if chunkWords:
+                compareResult = chunked.evaluate(goldFile, comparePred, chunkWords, 
+                                                 solver, jobs, lpSolvePath)
+            else:
+                compareResult = evaluate(gold, comparePred, solver, jobs, lpSolvePath, 
+                                         useCache=useCache, cacheDir=cacheDir)
+            tests = significance.pairedTest(result, compareResult, 
+                                            resamples or 1000, confidence)
+            if not short:
+                print "\npaired bootstrap test against:", comparePred
+                for measure in measures:
+                    (difference, pValue, (low, high)) = tests[measure]
+                    print measure.ljust(9) + ": difference", difference, "(" + str(low), "-", str(high) + "), p-value", pValue
+            else:
+                print tools.list2string([str(tests[measure][k]) for measure in measures for k in (0, 1)], "\t")
+        
+    #===========================================================================
+    # method which finds subset of predictions which also occur in gold standard
+    #===========================================================================
+    @staticmethod
+    def findPredictions(goldFile, predFile):
+        # gold standard words    
+        goldWordSet = set()
+        f = tools.openFile(goldFile)
+        try:
+            for goldLine in f:
+                goldWordSet.add(goldLine.split("\t", 1)[0])
+        finally:
+            f.close()
+        return main_class.readPredictions(goldWordSet, predFile)
+    
+    #===========================================================================
+    # method which reads predictions of words in gold standard word set. 
+    # Lines are streamed and only split into analyses if their word is in the 
+    # gold standard. Morphemes are interned and identical analyses are shared,
+    # each prediction is a tuple of analyses, an analysis a tuple of morphemes.
+    #===========================================================================
+    @staticmethod
+    @instrumentation.phase("readPredictions")
+    def readPredictions(goldWordSet, predFile):
+        f = tools.openFile(predFile)
+        try:
+            return main_class.parsePredictions(goldWordSet, f)
+        finally:
+            f.close()
+
+    #===========================================================================
+    # method which parses prediction lines (any iterable of lines) of words 
+    # in gold standard word set
+    #===========================================================================
+    @staticmethod
+    def parsePredictions(goldWordSet, lines):
+        predictionDict = dict() 
+        analyses = dict()
+        for predLine in lines:
+            tab = predLine.find("\t")
+            if tab < 0:
+                continue
+            word2 = predLine[:tab]
+            if goldWordSet.__contains__(word2):
+                lol = list()
+                for segmentation in predLine[tab + 1:].split(","):
+                    segments = tuple([intern(segment) for segment in segmentation.split()])
+                    lol.append(analyses.setdefault(segments, segments))
+                predictionDict[intern(word2)] = tuple(lol)
+        return predictionDict
+    
+    #===========================================================================
+    # method which reads in gold standard file
+    #===========================================================================
+    @staticmethod
+    def readGoldStandard(goldFile):
+        (goldDict, words) = main_class.readGoldStandardOrdered(goldFile)
+        return goldDict
+
+    #===========================================================================
+    # method which reads in gold standard file, also returns words in order 
+    # of their first occurrence
+    #===========================================================================
+    @staticmethod
+    def readGoldStandardOrdered(goldFile):
+        # gold standard dictionary
+        goldDict = dict() 
+        words = list()
+        for line in tools.openFile(goldFile):
+            (word, lol) = main_class.parseGoldLine(line)
+            if not goldDict.__contains__(word):
+                words.append(word)
+            goldDict[word] = lol
+        return (goldDict, words)
+
+    #===========================================================================
+    # method which splits line of gold standard file into word and list of 
+    # analyses
+    #===========================================================================
+    @staticmethod
+    def parseGoldLine(line):
+        split1 = line.split("\t")
+        word = split1[0]
+        segmentationList = split1[1].split(",")
+        lol = list()
+        for segmentation in segmentationList:
+            segments = re.findall("[^\s]+", segmentation)
+            lol.append(segments)
+        return (word, lol)
+
+################################################################################
+#
+# Library interface: the gold standard is loaded and indexed once and can be 
+# used for evaluating any number of predictions, e.g.
+#
+#     gold = GoldStandard.load("goldFile")
+#     result = evaluate(gold, "predFile")
+#     print result.precision, result.recall, result.fmeasure
+#
+################################################################################
+class GoldStandard:
+    #===========================================================================
+    # goldDict: word => list of analyses (lists of morphemes), may be None if 
+    # table is given, it is then only built from table when needed
+    #===========================================================================
+    def __init__(self, goldDict, goldFile=None, morphIndex=None, 
+                 contentHash=None, table=None):
+        self.goldDict = goldDict
+        self.goldFile = goldFile
+        if goldDict is None:
+            self.words = set(table.words)
+            morphIndex = table.morphIndex
+        else:
+            self.words = set(goldDict.keys())
+        if morphIndex is None:
+            morphIndex = morphassignment.wordSegmentationList2MorphIndex(goldDict)
+        self.morphIndex = morphIndex
+        self.contentHash = contentHash
+        self.table = table
+        self.orderedWords = None
+
+    #===========================================================================
+    # method which returns gold standard as dict: word => list of analyses
+    #===========================================================================
+    def getGoldDict(self):
+        if self.goldDict is None:
+            self.goldDict = self.table.toDict()
+        return self.goldDict
+
+    #===========================================================================
+    # method which returns words in order of goldDict (the order in which 
+    # fractions are summed up), without building goldDict
+    #===========================================================================
+    def getWords(self):
+        if self.orderedWords is None:
+            if self.goldDict is None:
+                self.orderedWords = dict.fromkeys(self.table.words).keys()
+            else:
+                self.orderedWords = self.goldDict.keys()
+        return self.orderedWords
+
+    #===========================================================================
+    # method which returns gold standard as segmentationtable
+    #===========================================================================
+    def getTable(self):
+        if self.table is None:
+            self.table = segmentationtable.fromDict(self.goldDict, None, 
+                                                    self.morphIndex)
+        return self.table
+
+    #===========================================================================
+    # method which returns segmentationtables of gold standard and predictions
+    # of words in both, in order of goldDict
+    #===========================================================================
+    @instrumentation.phase("tables")
+    def getTables(self, predDict):
+        words = [word for word in self.getWords() if predDict.__contains__(word)]
+        return (self.getTable().select(words), 
+                segmentationtable.fromDict(predDict, words))
+
+    #===========================================================================
+    # method which returns hash of gold standard content
+    #===========================================================================
+    def getContentHash(self):
+        if self.contentHash is None:
+            self.contentHash = tools.dictHash(self.getGoldDict())
+        return self.contentHash
+
+    #===========================================================================
+    # method which loads gold standard file, a snapshot of the parsed gold 
+    # standard is kept in the cache directory and reused if the file content
+    # has not changed
+    #===========================================================================
+    @staticmethod
+    @instrumentation.phase("readGold")
+    def load(goldFile, useCache=True, cacheDir=None):
+        contentHash = tools.fileHash(goldFile)
+        if not useCache:
+            return GoldStandard(main_class.readGoldStandard(goldFile), goldFile, 
+                                contentHash=contentHash)
+        
+        snapshot = goldcache.snapshotPath(contentHash, cacheDir)
+        if os.path.isdir(snapshot):
+            try:
+                return goldcache.read(snapshot, goldFile, contentHash)
+            except (IOError, ValueError):
+                pass
+        (goldDict, words) = main_class.readGoldStandardOrdered(goldFile)
+        gold = GoldStandard(goldDict, goldFile, contentHash=contentHash)
+        try:
+            goldcache.write(snapshot, gold, words)
+        except (IOError, OSError):
+            pass
+        return gold
+
+    #===========================================================================
+    # method which selects the predictions of gold standard words, predictions
+    # is either a prediction file or dict: word => list of analyses
+    #===========================================================================
+    def findPredictions(self, predictions):
+        if isinstance(predictions, basestring):
+            return main_class.readPredictions(self.words, predictions)
+        predDict = dict()
+        for word in predictions:
+            if self.words.__contains__(word):
+                predDict[word] = predictions[word]
+        return predDict
+
+class EvaluationResult:
+    #===========================================================================
+    # wordScores: word => [precision fraction, recall fraction]
+    # cached: True if result was replayed from result cache
+    # words: gold standard words in the order their fractions are summed up, 
+    #        precisionScores and recallScores hold the fractions of these 
+    #        words as arrays (0 for words without prediction)
+    # weightBound: (matching weight, upper bound of optimal weight) of an 
+    #        approximate morpheme assignment, None if exact
+    #===========================================================================
+    def __init__(self, precision, recall, fmeasure, morphAssignDict, 
+                 evaluatedWords, wordScores, cached=False, words=None, 
+                 weightBound=None):
+        self.precision = precision
+        self.recall = recall
+        self.fmeasure = fmeasure
+        self.morphAssignDict = morphAssignDict
+        self.evaluatedWords = evaluatedWords
+        self.wordScores = wordScores
+        self.cached = cached
+        self.words = words
+        self.weightBound = weightBound
+        self.precisionScores = None
+        self.recallScores = None
+        if words is not None:
+            (self.precisionScores, self.recallScores) = assigneval.scoreVectors(words, 
+                                                                                wordScores)
+
+    #===========================================================================
+    # method which returns relative gap between matching weight and upper 
+    # bound of optimal weight, 0 for exact assignments
+    #===========================================================================
+    def relativeGap(self):
+        if self.weightBound is None or self.weightBound[1] <= 0:
+            return 0.0
+        (weight, bound) = self.weightBound
+        return (bound - weight) / bound
+
+#===============================================================================
+# method which evaluates predictions against gold standard
+#     gold:        GoldStandard, gold standard file or dict
+#     predictions: prediction file or dict: word => list of analyses
+#     assignFile/resultFile: morpheme assignment and prediction file with 
+#                  gold standard labels are saved if given
+#     useCache:    results are looked up in and saved to result cache, a 
+#                  result is only replayed if neither verbose output nor 
+#                  resultFile is requested
+#     quiet:       words which could not be evaluated are not printed
+# Returns EvaluationResult.
+#===============================================================================
+@instrumentation.phase("evaluate")
+def evaluate(gold, predictions, solver="hungarian", jobs=1, lpSolvePath=None, 
+             assignFile=None, resultFile=None, verbose=False, useCache=True, 
+             cacheDir=None, quiet=False):
+    if not isinstance(gold, GoldStandard):
+        if isinstance(gold, basestring):
+            gold = GoldStandard.load(gold, useCache, cacheDir)
+        else:
+            gold = GoldStandard(gold)
+    
+    # replay cached result
+    cacheKey = None
+    if useCache:
+        cacheKey = resultcache.key(gold, predictions, solver)
+        if not verbose and resultFile is None:
+            result = resultcache.read(cacheKey, cacheDir, gold.getWords())
+            if result is not None:
+                if assignFile is not None:
+                    morphassignment.saveMorphemeAssignment(result.morphAssignDict, 
+                                                           assignFile)
+                return result
+    
+    predDict = gold.findPredictions(predictions)
+    
+    # lp_solve files are written next to prediction file, temporary files 
+    # are used for predictions in memory
+    lpInput = None
+    lpOutput = None
+    if isinstance(predictions, basestring):
+        lpInput = predictions + ".lpInput"
+        lpOutput = predictions + ".lpOutput"
+    backend = solverbackend.create(solver, lpInput=lpInput, lpOutput=lpOutput, 
+                                   jobs=jobs, lpSolvePath=lpSolvePath)
+    try:
+        # morpheme assignment
+        (goldTable, predTable) = gold.getTables(predDict)
+        morphAssignDict = morphassignment.main(None, predDict, assignFile, 
+                                               assignFile != None, verbose, 
+                                               backend, gold.morphIndex, 
+                                               goldTable, predTable)
+        
+        # assignment evaluation, gold standard analyses are taken from 
+        # goldTable
+        wordScores = dict()
+        (precision, recall, fmeasure) = assigneval.main(None, predDict, 
+                                                        morphAssignDict, 
+                                                        resultFile,
+                                                        resultFile != None, 
+                                                        verbose, wordScores, 
+                                                        goldTable, predTable, 
+                                                        wordCount=len(gold.words), 
+                                                        quiet=quiet)
+    finally:
+        # clean up
+        backend.cleanup()
+    result = EvaluationResult(precision, recall, fmeasure, morphAssignDict, 
+                              len(predDict), wordScores, 
+                              words=gold.getWords(), 
+                              weightBound=backend.weightBound)
+    if cacheKey is not None:
+        resultcache.write(cacheKey, result, cacheDir)
+    return result
+
+################################################################################
+#
+# Class incremental
+# Re-evaluation of a prediction file which differs only slightly from a 
+# previously evaluated one. The evaluation state (predictions, count matrix, 
+# morpheme assignment, per-word scores) is kept in a state file. Only cells 
+# of words with changed predictions are updated in the count matrix, 
+# components of the assignment without changed cells keep their previous 
+# assignment and only words with changed predictions or changed morpheme 
+# assignments are scored again.
+#
+################################################################################
+class incremental:
+    #===========================================================================
+    # method which evaluates predictions, incrementally if stateFile holds the
+    # state of a previous evaluation against the same gold standard with the
+    # same solver, and saves the new state. Returns EvaluationResult.
+    #===========================================================================
+    @staticmethod
+    @instrumentation.phase("incremental")
+    def evaluate(gold, predictions, stateFile, solver="hungarian", jobs=1, 
+                 lpSolvePath=None, assignFile=None, resultFile=None):
+        goldDict = gold.getGoldDict()
+        predDict = gold.findPredictions(predictions)
+        predMorphIndex = morphassignment.wordSegmentationList2MorphIndex(predDict)
+        state = incremental.readState(stateFile, gold, solver)
+        
+        # count matrix
+        if state is None:
+            countMatrix = morphassignment.calcSparseCountMatrix(goldDict, 
+                                                                predDict, 
+                                                                gold.morphIndex, 
+                                                                predMorphIndex)
+            warmStart = None
+        else:
+            changedWords = incremental.findChangedWords(state["predDict"], predDict)
+            (countMatrix, warmStart) = incremental.updateCountMatrix(state, gold, 
+                                                                     predDict, 
+                                                                     predMorphIndex, 
+                                                                     changedWords)
+        
+        # morpheme assignment
+        backend = solverbackend.create(solver, jobs=jobs, lpSolvePath=lpSolvePath)
+        try:
+            assignment = backend.solve(countMatrix, False, warmStart)
+        finally:
+            backend.cleanup()
+        morphAssignDict = morphassignment.assignment2MorphAssignDict(gold.morphIndex, 
+                                                                     predMorphIndex, 
+                                                                     assignment, 
+                                                                     False)
+        if assignFile is not None:
+            morphassignment.saveMorphemeAssignment(morphAssignDict, assignFile)
+        
+        # assignment evaluation of all or of affected words
+        if state is None or resultFile is not None:
+            wordScores = dict()
+            wordFractions = dict()
+            assigneval.main(goldDict, predDict, morphAssignDict, resultFile, 
+                            resultFile != None, False, wordScores, 
+                            wordFractions=wordFractions)
+        else:
+            wordScores = state["wordScores"]
+            wordFractions = state["wordFractions"]
+            affectedWords = incremental.findAffectedWords(changedWords, 
+                                                          state["morphAssignDict"], 
+                                                          morphAssignDict, 
+                                                          predDict)
+            subGoldDict = dict()
+            subPredDict = dict()
+            for word in affectedWords:
+                wordScores.pop(word, None)
+                wordFractions.pop(word, None)
+                if predDict.__contains__(word):
+                    subGoldDict[word] = goldDict[word]
+                    subPredDict[word] = predDict[word]
+            if len(subGoldDict) > 0:
+                assigneval.main(subGoldDict, subPredDict, morphAssignDict, None, 
+                                False, False, wordScores, 
+                                wordFractions=wordFractions)
+        
+        # fractions are added up in the same order as in assigneval.main
+        (precision_count, recall_count) = assigneval.sumWordFractions(gold.getWords(), 
+                                                                      wordFractions)
+        (precision, recall, fmeasure) = assigneval.calcPerformanceMeasures(precision_count, 
+                                                                           recall_count, 
+                                                                           len(goldDict), 
+                                                                           False)
+        
+        incremental.writeState(stateFile, dict(version=_incrementalStateVersion, 
+                                               goldHash=gold.getContentHash(), 
+                                               solver=solver, 
+                                               predDict=predDict, 
+                                               predMorphIndex=predMorphIndex, 
+                                               rows=countMatrix.rows, 
+                                               cols=countMatrix.cols, 
+                                               data=countMatrix.data, 
+                                               morphAssignDict=morphAssignDict, 
+                                               wordScores=wordScores, 
+                                               wordFractions=wordFractions))
+        return EvaluationResult(precision, recall, fmeasure, morphAssignDict, 
+                                len(predDict), wordScores, 
+                                words=gold.getWords(), 
+                                weightBound=backend.weightBound)
+
+    #===========================================================================
+    # method which returns words whose predictions were added, removed or 
+    # changed
+    #===========================================================================
+    @staticmethod
+    def findChangedWords(oldPredDict, predDict):
+        changedWords = set()
+        for word in predDict:
+            if not oldPredDict.__contains__(word) or oldPredDict[word] != predDict[word]:
+                changedWords.add(word)
+        for word in oldPredDict:
+            if not predDict.__contains__(word):
+                changedWords.add(word)
+        return changedWords
+
+    #===========================================================================
+    # method which updates count matrix of previous state: contributions of
+    # changed words are subtracted with their old predictions and added with 
+    # their new ones. Returns (count matrix, warm start for assignsolver).
+    #===========================================================================
+    @staticmethod
+    def updateCountMatrix(state, gold, predDict, predMorphIndex, changedWords):
+        oldPredDict = state["predDict"]
+        oldPredMorphIndex = state["predMorphIndex"]
+        
+        # all cells are calculated on the union of old and new predicted 
+        # morphemes
+        unionIndex = sorted(set(oldPredMorphIndex).union(predMorphIndex))
+        unionIds = dict((m, i) for (i, m) in enumerate(unionIndex))
+        oldToUnion = numpy.array([unionIds[m] for m in oldPredMorphIndex], dtype=int)
+        shape = (len(gold.morphIndex), len(unionIndex))
+        
+        goldDict = gold.getGoldDict()
+        changedGoldDict = dict()
+        oldChangedPredDict = dict()
+        newChangedPredDict = dict()
+        for word in changedWords:
+            changedGoldDict[word] = goldDict[word]
+            if oldPredDict.__contains__(word):
+                oldChangedPredDict[word] = oldPredDict[word]
+            if predDict.__contains__(word):
+                newChangedPredDict[word] = predDict[word]
+        oldCells = morphassignment.calcSparseCountMatrix(changedGoldDict, 
+                                                         oldChangedPredDict, 
+                                                         gold.morphIndex, 
+                                                         unionIndex)
+        newCells = morphassignment.calcSparseCountMatrix(changedGoldDict, 
+                                                         newChangedPredDict, 
+                                                         gold.morphIndex, 
+                                                         unionIndex)
+        oldCols = numpy.asarray(state["cols"], dtype=int)
+        if len(oldCols) > 0:
+            oldCols = oldToUnion[oldCols]
+        updated = sparsecountmatrix.fromTriplets(numpy.concatenate((state["rows"], newCells.rows, oldCells.rows)), 
+                                                 numpy.concatenate((oldCols, newCells.cols, oldCells.cols)), 
+                                                 numpy.concatenate((state["data"], newCells.data, -oldCells.data)), 
+                                                 shape)
+        
+        # rounding errors of removed cells are dropped, columns are mapped to
+        # new predicted morpheme index (order is kept as both are sorted)
+        newIds = dict((m, i) for (i, m) in enumerate(predMorphIndex))
+        unionToNew = numpy.array([newIds.get(m, -1) for m in unionIndex], dtype=int)
+        keep = numpy.abs(updated.data) >= _weightTolerance
+        if len(unionToNew) > 0:
+            keep &= unionToNew[updated.cols] >= 0
+        countMatrix = sparsecountmatrix(updated.rows[keep], 
+                                        unionToNew[updated.cols[keep]], 
+                                        updated.data[keep], 
+                                        (len(gold.morphIndex), len(predMorphIndex)))
+        
+        # rows and columns with changed cells
+        touchedRows = zeros(countMatrix.shape[0], dtype=bool)
+        touchedCols = zeros(countMatrix.shape[1], dtype=bool)
+        for cells in (oldCells, newCells):
+            touchedRows[cells.rows] = True
+            if len(cells.cols) > 0:
+                cols = unionToNew[cells.cols]
+                touchedCols[cols[cols >= 0]] = True
+        
+        # previous assignment in new index
+        goldIds = dict((m, i) for (i, m) in enumerate(gold.morphIndex))
+        previous = list()
+        for (predM, goldM) in state["morphAssignDict"].items():
+            if newIds.__contains__(predM) and goldIds.__contains__(goldM):
+                previous.append((goldIds[goldM], newIds[predM]))
+        return (countMatrix, (previous, touchedRows, touchedCols))
+
+    #===========================================================================
+    # method which returns words which have to be scored again: changed words
+    # and words with predicted morphemes whose assignment has changed
+    #===========================================================================
+    @staticmethod
+    def findAffectedWords(changedWords, oldMorphAssignDict, morphAssignDict, 
+                          predDict):
+        changedMorphemes = set()
+        for predM in set(oldMorphAssignDict.keys()).union(morphAssignDict.keys()):
+            if oldMorphAssignDict.get(predM) != morphAssignDict.get(predM):
+                changedMorphemes.add(predM)
+        affectedWords = set(changedWords)
+        if len(changedMorphemes) > 0:
+            for word in predDict:
+                for segmentation in predDict[word]:
+                    if not changedMorphemes.isdisjoint(segmentation):
+                        affectedWords.add(word)
+                        break
+        return affectedWords
+
+    #===========================================================================
+    # method which reads state file, returns None if there is no usable state
+    #===========================================================================
+    @staticmethod
+    def readState(stateFile, gold, solver):
+        try:
+            f = open(stateFile, 'rb')
+            try:
+                state = cPickle.load(f)
+            finally:
+                f.close()
+        except (IOError, EOFError, cPickle.UnpicklingError):
+            return None
+        if (state.get("version") != _incrementalStateVersion or 
+            state.get("goldHash") != gold.getContentHash() or 
+            state.get("solver") != solver):
+            return None
+        return state
+
+    @staticmethod
+    def writeState(stateFile, state):
+        directory = os.path.dirname(os.path.abspath(stateFile))
+        (fd, tempName) = tempfile.mkstemp(prefix=".state", dir=directory)
+        f = os.fdopen(fd, 'wb')
+        cPickle.dump(state, f, 2)
+        f.close()
+        os.rename(tempName, stateFile)
+
+################################################################################
+#
+# Class goldcache
+# Binary snapshot of a parsed gold standard, stored in a directory of numpy 
+# arrays which are memory-mapped when read:
+#     morphemes.npy    sorted morpheme index
+#     words.npy        words in order of gold standard file
+#     wordOffsets.npy  offsets of the alternatives of each word
+#     altOffsets.npy   offsets of the morphemes of each alternative
+#     morphIds.npy     morphemes of all alternatives as ids in morpheme index
+# The snapshot directory is named by a hash of the gold standard file content.
+#
+################################################################################
+class goldcache:
+    @staticmethod
+    def snapshotPath(contentHash, cacheDir=None):
+        if cacheDir is None:
+            cacheDir = _cacheDir
+        return os.path.join(cacheDir, "gold-v" + str(_goldCacheVersion) + "-" + 
+                            contentHash)
+
+    #===========================================================================
+    # method which writes snapshot, words: words of goldDict in file order
+    #===========================================================================
+    @staticmethod
+    def write(snapshot, gold, words):
+        table = segmentationtable.fromDict(gold.getGoldDict(), words, gold.morphIndex)
+        
+        # arrays are written to temporary directory which is then renamed, 
+        # so readers never see an incomplete snapshot
+        parent = os.path.dirname(snapshot)
+        if not os.path.isdir(parent):
+            os.makedirs(parent)
+        tempDir = tempfile.mkdtemp(prefix=".gold", dir=parent)
+        arrays = (("morphemes", numpy.array(gold.morphIndex, dtype=str)),
+                  ("words", numpy.array(words, dtype=str)),
+                  ("wordOffsets", table.wordOffsets),
+                  ("altOffsets", table.altOffsets),
+                  ("morphIds", table.morphIds))
+        for (name, array) in arrays:
+            numpy.save(os.path.join(tempDir, name + ".npy"), array)
+        try:
+            os.rename(tempDir, snapshot)
+        except OSError:
+            # snapshot written concurrently by another process
+            shutil.rmtree(tempDir, True)
+
+    #===========================================================================
+    # method which reads snapshot into GoldStandard backed by the mapped 
+    # arrays, goldDict is only built if it is needed
+    #===========================================================================
+    @staticmethod
+    def read(snapshot, goldFile=None, contentHash=None):
+        arrays = dict()
+        for name in ("morphemes", "words", "wordOffsets", "altOffsets", "morphIds"):
+            arrays[name] = numpy.load(os.path.join(snapshot, name + ".npy"), 
+                                      mmap_mode="r")
+        morphIndex = arrays["morphemes"].tolist()
+        table = segmentationtable(arrays["words"].tolist(), 
+                                  numpy.asarray(arrays["wordOffsets"]), 
+                                  numpy.asarray(arrays["altOffsets"]), 
+                                  arrays["morphIds"], morphIndex)
+        return GoldStandard(None, goldFile, morphIndex, contentHash, table)
+
+    #===========================================================================
+    # method which removes all gold standard snapshots
+    #===========================================================================
+    @staticmethod
+    def clear(cacheDir=None):
+        if cacheDir is None:
+            cacheDir = _cacheDir
+        if not os.path.isdir(cacheDir):
+            return
+        for f in os.listdir(cacheDir):
+            if f.startswith("gold-v"):
+                shutil.rmtree(os.path.join(cacheDir, f), True)
+
+################################################################################
+#
+# Class chunked
+# Evaluation against a gold standard file which is too big to be loaded: the
+# gold standard is read from disk in chunks of words, once for the count 
+# matrix, whose partial matrices are added up, and once for the assignment 
+# evaluation. Only predictions, morpheme indices and per-word scores are held 
+# in memory. Fractions are added up in the same order as in an evaluation 
+# against the gold standard read at once.
+#
+################################################################################
+class chunked:
+    #===========================================================================
+    # method which evaluates predictions (file or dict) against gold standard
+    # file read in chunks of chunkWords words. Returns EvaluationResult.
+    #===========================================================================
+    @staticmethod
+    @instrumentation.phase("chunked")
+    def evaluate(goldFile, predictions, chunkWords, solver="hungarian", jobs=1, 
+                 lpSolvePath=None, assignFile=None):
+        (lastLines, goldMorphIndex) = chunked.scanGoldStandard(goldFile)
+        if isinstance(predictions, basestring):
+            predDict = main_class.readPredictions(lastLines, predictions)
+        else:
+            predDict = dict()
+            for word in predictions:
+                if lastLines.__contains__(word):
+                    predDict[word] = predictions[word]
+        predMorphIndex = morphassignment.wordSegmentationList2MorphIndex(predDict)
+        shape = (len(goldMorphIndex), len(predMorphIndex))
+        
+        # count matrix
+        countMatrix = sparsecountmatrix.fromTriplets([], [], [], shape)
+        for (words, goldChunk) in chunked.readChunks(goldFile, lastLines, chunkWords):
+            (goldTable, predTable) = chunked.tables(words, goldChunk, predDict, 
+                                                    goldMorphIndex, predMorphIndex)
+            partial = morphassignment.calcShardedCountMatrix(goldTable, predTable, 
+                                                             jobs)
+            countMatrix = sparsecountmatrix.sum([countMatrix, partial], shape)
+        instrumentation.record("matrixRows", countMatrix.shape[0])
+        instrumentation.record("matrixCols", countMatrix.shape[1])
+        instrumentation.record("matrixNonZeros", countMatrix.nnz)
+        
+        # morpheme assignment
+        backend = solverbackend.create(solver, jobs=jobs, lpSolvePath=lpSolvePath)
+        try:
+            assignment = backend.solve(countMatrix, False)
+        finally:
+            backend.cleanup()
+        countMatrix = None
+        morphAssignDict = morphassignment.assignment2MorphAssignDict(goldMorphIndex, 
+                                                                     predMorphIndex, 
+                                                                     assignment, 
+                                                                     False)
+        if assignFile is not None:
+            morphassignment.saveMorphemeAssignment(morphAssignDict, assignFile)
+        
+        # assignment evaluation
+        wordScores = dict()
+        wordFractions = dict()
+        for (words, goldChunk) in chunked.readChunks(goldFile, lastLines, chunkWords):
+            (goldTable, predTable) = chunked.tables(words, goldChunk, predDict, 
+                                                    goldMorphIndex, predMorphIndex)
+            assigneval.main(goldChunk, predDict, morphAssignDict, None, False, 
+                            False, wordScores, goldTable, predTable, wordFractions)
+        
+        # lastLines holds the words in the order of a gold standard dict read
+        # at once, fractions are added up in this order
+        goldWords = lastLines.keys()
+        (precision_count, recall_count) = assigneval.sumWordFractions(goldWords, 
+                                                                      wordFractions)
+        (precision, recall, fmeasure) = assigneval.calcPerformanceMeasures(precision_count, 
+                                                                           recall_count, 
+                                                                           len(goldWords), 
+                                                                           False)
+        return EvaluationResult(precision, recall, fmeasure, morphAssignDict, 
+                                len(predDict), wordScores, words=goldWords, 
+                                weightBound=backend.weightBound)
+
+    #===========================================================================
+    # method which reads gold standard file once. Returns dict: word => number
+    # of the line which holds its analyses (the last line of the word) and 
+    # sorted list of morphemes.
+    #===========================================================================
+    @staticmethod
+    def scanGoldStandard(goldFile):
+        lastLines = dict()
+        morphemes = set()
+        for (lineNo, line) in enumerate(tools.openFile(goldFile)):
+            (word, lol) = main_class.parseGoldLine(line)
+            lastLines[intern(word)] = lineNo
+            for segmentation in lol:
+                morphemes.update(segmentation)
+        return (lastLines, sorted(morphemes))
+
+    # (word, analyses) of each line of gold standard file
+    @staticmethod
+    def readItems(goldFile):
+        for line in tools.openFile(goldFile):
+            yield main_class.parseGoldLine(line)
+
+    #===========================================================================
+    # method which reads gold standard file in chunks of chunkWords words, 
+    # yields words in order of the file and dict: word => list of analyses
+    #===========================================================================
+    @staticmethod
+    def readChunks(goldFile, lastLines, chunkWords):
+        words = list()
+        goldChunk = dict()
+        for (lineNo, line) in enumerate(tools.openFile(goldFile)):
+            (word, lol) = main_class.parseGoldLine(line)
+            if lastLines[word] != lineNo:
+                continue
+            words.append(word)
+            goldChunk[word] = lol
+            if len(words) >= chunkWords:
+                yield (words, goldChunk)
+                words = list()
+                goldChunk = dict()
+        if len(words) > 0:
+            yield (words, goldChunk)
+
+    #===========================================================================
+    # method which builds segmentationtables of the predicted words of a chunk
+    #===========================================================================
+    @staticmethod
+    def tables(words, goldChunk, predDict, goldMorphIndex, predMorphIndex):
+        words = [word for word in words if predDict.__contains__(word)]
+        return (segmentationtable.fromDict(goldChunk, words, goldMorphIndex), 
+                segmentationtable.fromDict(predDict, words, predMorphIndex))
+
+################################################################################
+#
+# Class resultcache
+# Evaluation results (P/R/F, morpheme assignment, per-word scores) stored by 
+# a key of gold standard content, prediction content and evaluation options.
+# The least recently used entries are removed once the cache exceeds 
+# _resultCacheMaxBytes.
+#
+################################################################################
+class resultcache:
+    @staticmethod
+    def key(gold, predictions, solver):
+        if isinstance(predictions, basestring):
+            predHash = tools.fileHash(predictions)
+        else:
+            predHash = tools.dictHash(predictions)
+        h = hashlib.sha1()
+        h.update("v" + str(_resultCacheVersion) + "|" + gold.getContentHash() + 
+                 "|" + predHash + "|" + str(solver))
+        return h.hexdigest()
+
+    @staticmethod
+    def directory(cacheDir=None):
+        if cacheDir is None:
+            cacheDir = _cacheDir
+        return os.path.join(cacheDir, "results")
+
+    #===========================================================================
+    # method which returns cached EvaluationResult or None
+    #===========================================================================
+    @staticmethod
+    @instrumentation.phase("readResultCache")
+    def read(key, cacheDir=None, words=None):
+        path = os.path.join(resultcache.directory(cacheDir), key)
+        try:
+            f = open(path, 'rb')
+            try:
+                entry = cPickle.load(f)
+            finally:
+                f.close()
+            # mark as recently used
+            os.utime(path, None)
+        except (IOError, OSError, EOFError, cPickle.UnpicklingError):
+            return None
+        return EvaluationResult(entry["precision"], entry["recall"], 
+                                entry["fmeasure"], entry["morphAssignDict"], 
+                                entry["evaluatedWords"], entry["wordScores"], 
+                                True, words, entry.get("weightBound"))
+
+    @staticmethod
+    @instrumentation.phase("writeResultCache")
+    def write(key, result, cacheDir=None):
+        directory = resultcache.directory(cacheDir)
+        entry = dict(precision=result.precision, recall=result.recall, 
+                     fmeasure=result.fmeasure, 
+                     morphAssignDict=result.morphAssignDict, 
+                     evaluatedWords=result.evaluatedWords, 
+                     wordScores=result.wordScores, 
+                     weightBound=result.weightBound)
+        try:
+            if not os.path.isdir(directory):
+                os.makedirs(directory)
+            (fd, tempName) = tempfile.mkstemp(prefix=".result", dir=directory)
+            f = os.fdopen(fd, 'wb')
+            cPickle.dump(entry, f, 2)
+            f.close()
+            os.rename(tempName, os.path.join(directory, key))
+            resultcache.evict(cacheDir)
+        except (IOError, OSError):
+            pass
+
+    #===========================================================================
+    # method which removes least recently used entries until cache size is 
+    # below maxBytes
+    #===========================================================================
+    @staticmethod
+    def evict(cacheDir=None, maxBytes=None):
+        if maxBytes is None:
+            maxBytes = _resultCacheMaxBytes
+        directory = resultcache.directory(cacheDir)
+        entries = list()
+        total = 0
+        for f in os.listdir(directory):
+            if f.startswith("."):
+                continue
+            path = os.path.join(directory, f)
+            stat = os.stat(path)
+            entries.append((stat.st_mtime, stat.st_size, path))
+            total += stat.st_size
+        for (mtime, size, path) in sorted(entries):
+            if total <= maxBytes:
+                break
+            os.remove(path)
+            total -= size
+
+    @staticmethod
+    def clear(cacheDir=None):
+        shutil.rmtree(resultcache.directory(cacheDir), True)
+
+################################################################################
+#
+# Class leaderboard
+# Evaluation of many prediction files against one gold standard which is 
+# loaded once and shared by a pool of worker processes
+#
+################################################################################
+class leaderboard:
+    #===========================================================================
+    # main method which evaluates all prediction files found for predPattern 
+    # (directory or glob pattern) and writes table ranked by f-measure
+    #===========================================================================
+    @staticmethod
+    def main(goldFile, predPattern, tableFile, solver="hungarian", jobs=None, 
+             lpSolvePath=None, useCache=True, cacheDir=None):
+        predFiles = leaderboard.findPredictionFiles(predPattern)
+        gold = GoldStandard.load(goldFile, useCache, cacheDir)
+        if jobs is None:
+            jobs = multiprocessing.cpu_count()
+        jobs = max(1, min(jobs, len(predFiles)))
+        
+        settings = (gold, solver, lpSolvePath, useCache, cacheDir)
+        if jobs > 1:
+            # worker processes inherit gold standard when forked
+            pool = multiprocessing.Pool(jobs, _initLeaderboardWorker, settings)
+            try:
+                results = pool.map(_evaluateLeaderboardEntry, predFiles, 1)
+            finally:
+                pool.close()
+                pool.join()
+        else:
+            _initLeaderboardWorker(*settings)
+            results = map(_evaluateLeaderboardEntry, predFiles)
+        
+        table = leaderboard.rankingTable(goldFile, results)
+        if tableFile:
+            f = open(tableFile, 'w')
+            f.writelines(table)
+            f.close()
+        else:
+            print "".join(table),
+        return results
+
+    #===========================================================================
+    # method which lists prediction files: all files of a directory (without
+    # files written by EMMA) or files matching a glob pattern
+    #===========================================================================
+    @staticmethod
+    def findPredictionFiles(predPattern):
+        if os.path.isdir(predPattern):
+            predFiles = list()
+            for f in os.listdir(predPattern):
+                path = os.path.join(predPattern, f)
+                if f.startswith(".") or not os.path.isfile(path):
+                    continue
+                if os.path.splitext(f)[1] in _emmaOutputSuffixes:
+                    continue
+                predFiles.append(path)
+        else:
+            predFiles = glob.glob(predPattern)
+        return sorted(predFiles)
+
+    #===========================================================================
+    # method which generates lines of table ranked by f-measure
+    #===========================================================================
+    @staticmethod
+    def rankingTable(goldFile, results):
+        ranked = sorted(results, key=lambda e: (-e[3], e[0]))
+        table = list()
+        table.append("# gold standard: " + goldFile + "\n")
+        table.append("# rank\tfmeasure\tprecision\trecall\twords\tprediction\n")
+        for (rank, (predFile, precision, recall, fmeasure, words)) in enumerate(ranked):
+            table.append(str(rank + 1) + "\t" + str(fmeasure) + "\t" + 
+                         str(precision) + "\t" + str(recall) + "\t" + 
+                         str(words) + "\t" + predFile + "\n")
+        return table
+
+# module level functions for leaderboard worker processes
+_leaderboardSettings = None
+
+def _initLeaderboardWorker(gold, solver, lpSolvePath, useCache, cacheDir):
+    global _leaderboardSettings
+    _leaderboardSettings = (gold, solver, lpSolvePath, useCache, cacheDir)
+
+def _evaluateLeaderboardEntry(predFile):
+    (gold, solver, lpSolvePath, useCache, cacheDir) = _leaderboardSettings
+    result = evaluate(gold, predFile, solver, 1, lpSolvePath, useCache=useCache, 
+                      cacheDir=cacheDir)
+    return (predFile, result.precision, result.recall, result.fmeasure, 
+            result.evaluatedWords)
+
+################################################################################
+#
+# Class daemon
+# Resident evaluation service which keeps gold standards loaded. Requests and
+# responses are JSON objects, one per line, read from stdin and written to 
+# stdout, or exchanged over a Unix socket with one thread per connection:
+#     {"command": "load", "gold": goldFile}
+#     {"command": "evaluate", "gold": goldFile, "predictions": predictions}
+#         predictions: text in format of prediction file or
+#                      {word: [[morpheme, ...], ...]}
+#                      ("predFile": prediction file instead)
+#         optional: "solver", "bootstrap": resamples, "wordScores": true,
+#                   "strata": [built-in stratification or strata file, ...]
+#         approximate solvers also answer "weightBound": [matching weight, 
+#         upper bound of optimal weight] and "relativeGap"
+#     {"command": "unload", "gold": goldFile}
+#     {"command": "list"}
+#     {"command": "shutdown"}
+# The "id" of a request is returned with its response, failed requests are
+# answered by {"error": message}. Predictions are evaluated in memory without
+# result cache: the in-process solver writes no files, lp_solve uses unique 
+# temporary files, so that evaluations can run concurrently. Evaluations print
+# nothing. Instrumentation (--report, --profile) records a single thread and
+# cannot be combined with the socket server.
+#
+################################################################################
+class daemon:
+    def __init__(self, solver="hungarian", jobs=1, lpSolvePath=None, 
+                 useCache=True, cacheDir=None):
+        self.solver = solver
+        self.jobs = jobs
+        self.lpSolvePath = lpSolvePath
+        self.useCache = useCache
+        self.cacheDir = cacheDir
+        # absolute gold standard file => GoldStandard
+        self.golds = dict()
+        self.lock = threading.Lock()
+        self.running = True
+
+    #===========================================================================
+    # main method which loads gold standards and serves requests on stdin and
+    # stdout or on Unix socket
+    #===========================================================================
+    @staticmethod
+    def main(goldFiles, socketPath=None, solver="hungarian", jobs=1, 
+             lpSolvePath=None, useCache=True, cacheDir=None):
+        service = daemon(solver, jobs, lpSolvePath, useCache, cacheDir)
+        for goldFile in goldFiles:
+            service.getGold(goldFile)
+        if socketPath:
+            service.serveSocket(socketPath)
+        else:
+            service.serveStdio(sys.stdin, sys.stdout)
+
+    #===========================================================================
+    # method which serves requests line by line, evaluations print nothing so
+    # that stdout only carries responses
+    #===========================================================================
+    def serveStdio(self, inStream, outStream):
+        for line in iter(inStream.readline, ""):
+            if not line.strip():
+                continue
+            outStream.write(self.handle(line) + "\n")
+            outStream.flush()
+            if not self.running:
+                break
+
+    def serveSocket(self, socketPath):
+        if os.path.exists(socketPath):
+            os.remove(socketPath)
+        server = daemonserver(socketPath, daemonhandler)
+        server.service = self
+        try:
+            server.serve_forever()
+        finally:
+            server.server_close()
+            if os.path.exists(socketPath):
+                os.remove(socketPath)
+
+    #===========================================================================
+    # method which returns loaded gold standard, it is loaded if necessary
+    #===========================================================================
+    def getGold(self, goldFile):
+        key = os.path.abspath(goldFile)
+        self.lock.acquire()
+        try:
+            gold = self.golds.get(key)
+        finally:
+            self.lock.release()
+        if gold is None:
+            gold = GoldStandard.load(goldFile, self.useCache, self.cacheDir)
+            self.lock.acquire()
+            try:
+                gold = self.golds.setdefault(key, gold)
+            finally:
+                self.lock.release()
+        return gold
+
+    #===========================================================================
+    # method which answers request line by response line
+    #===========================================================================
+    def handle(self, line):
+        request = None
+        try:
+            request = json.loads(line)
+            response = self.process(request)
+        except Exception as e:
+            response = dict(error=e.__class__.__name__ + ": " + str(e))
+        if isinstance(request, dict) and request.__contains__("id"):
+            response["id"] = request["id"]
+        return json.dumps(response)
+
+    def process(self, request):
+        command = request.get("command", "evaluate")
+        if command == "evaluate":
+            return self.evaluateRequest(request)
+        elif command == "load":
+            gold = self.getGold(tools.encode(request["gold"]))
+            return dict(gold=gold.goldFile, words=len(gold.words))
+        elif command == "unload":
+            self.lock.acquire()
+            try:
+                gold = self.golds.pop(os.path.abspath(tools.encode(request["gold"])), None)
+            finally:
+                self.lock.release()
+            return dict(unloaded=gold is not None)
+        elif command == "list":
+            self.lock.acquire()
+            try:
+                golds = sorted(self.golds.keys())
+            finally:
+                self.lock.release()
+            return dict(golds=golds)
+        elif command == "shutdown":
+            self.running = False
+            return dict(shutdown=True)
+        raise ValueError("unknown command: " + str(command))
+
+    #===========================================================================
+    # method which evaluates predictions of request
+    #===========================================================================
+    def evaluateRequest(self, request):
+        gold = self.getGold(tools.encode(request["gold"]))
+        if request.__contains__("predFile"):
+            predDict = gold.findPredictions(tools.encode(request["predFile"]))
+        else:
+            predictions = request["predictions"]
+            if isinstance(predictions, basestring):
+                predDict = main_class.parsePredictions(gold.words, 
+                                                       tools.encode(predictions).splitlines())
+            else:
+                predDict = gold.findPredictions(dict((tools.encode(word), 
+                                                      [[tools.encode(m) for m in analysis] 
+                                                       for analysis in analyses]) 
+                                                     for (word, analyses) in predictions.items()))
+        started = time.time()
+        result = evaluate(gold, predDict, request.get("solver", self.solver), 
+                          self.jobs, self.lpSolvePath, useCache=False, 
+                          quiet=True)
+        response = dict(precision=result.precision, recall=result.recall, 
+                        fmeasure=result.fmeasure, 
+                        evaluatedWords=result.evaluatedWords, 
+                        seconds=time.time() - started)
+        if result.weightBound is not None:
+            response["weightBound"] = list(result.weightBound)
+            response["relativeGap"] = result.relativeGap()
+        if request.get("bootstrap", 0) > 0:
+            (intervals, samples) = significance.bootstrap(result, 
+                                                          request["bootstrap"])
+            response["intervals"] = intervals
+        if request.get("wordScores", False):
+            response["wordScores"] = result.wordScores
+        if request.__contains__("strata"):
+            response["strata"] = dict()
+            for spec in request["strata"]:
+                spec = tools.encode(spec)
+                (wordStrata, order) = strata.load(spec, gold.getGoldDict().iteritems())
+                response["strata"][spec] = strata.evaluate(result, wordStrata, order)
+        return response
+
+# Unix socket server with one thread per connection
+class daemonserver(SocketServer.ThreadingMixIn, SocketServer.UnixStreamServer):
+    daemon_threads = True
+
+class daemonhandler(SocketServer.StreamRequestHandler):
+    def handle(self):
+        service = self.server.service
+        for line in iter(self.rfile.readline, ""):
+            if not line.strip():
+                continue
+            self.wfile.write(service.handle(line) + "\n")
+            self.wfile.flush()
+            if not service.running:
+                # shutdown waits for serve_forever, which runs in another 
+                # thread
+                threading.Thread(target=self.server.shutdown).start()
+                break
+
+################################################################################
+#
+# Class significance
+# Bootstrap confidence intervals of precision, recall and f-measure and paired
+# significance test of two predictions. Gold standard words are resampled with 
+# replacement. The per-word fractions of a resample are weighted by how often 
+# each word was drawn and normalised by the formulas of calcPerformanceMeasures.
+# As the sums are formed in a different order than in assigneval, a resampled
+# measure may differ from the one of the resampled word list in the last 
+# digits.
+#
+################################################################################
+class significance:
+    #===========================================================================
+    # method which returns confidence intervals of an EvaluationResult as 
+    # dict: measure => (low, high) and the resampled measures as 
+    # dict: measure => array
+    #===========================================================================
+    @staticmethod
+    @instrumentation.phase("bootstrap")
+    def bootstrap(result, resamples=1000, confidence=0.95, seed=0):
+        samples = significance.resampleMeasures([result], resamples, seed)[0]
+        intervals = dict()
+        for measure in samples.keys():
+            intervals[measure] = significance.interval(samples[measure], confidence)
+        return (intervals, samples)
+
+    #===========================================================================
+    # paired bootstrap test of two EvaluationResults on the same gold standard,
+    # both are resampled with the same words. Returns 
+    # dict: measure => (difference, p-value, (low, high) of difference)
+    # The two-sided p-value is the share of resampled differences which are 
+    # at least as far from the observed difference as the observed difference 
+    # is from 0.
+    #===========================================================================
+    @staticmethod
+    @instrumentation.phase("pairedTest")
+    def pairedTest(resultA, resultB, resamples=1000, confidence=0.95, seed=0):
+        if resultA.words != resultB.words:
+            raise ValueError("results were not evaluated on the same gold standard")
+        (samplesA, samplesB) = significance.resampleMeasures([resultA, resultB], 
+                                                             resamples, seed)
+        tests = dict()
+        for measure in samplesA.keys():
+            difference = getattr(resultA, measure) - getattr(resultB, measure)
+            differences = samplesA[measure] - samplesB[measure]
+            extreme = numpy.abs(differences - difference) >= abs(difference)
+            pValue = (extreme.sum() + 1.0) / (resamples + 1.0)
+            tests[measure] = (difference, pValue, 
+                              significance.interval(differences, confidence))
+        return tests
+
+    #===========================================================================
+    # method which resamples the measures of all results with the same 
+    # bootstrap samples. Returns list of dict: measure => array
+    #===========================================================================
+    @staticmethod
+    def resampleMeasures(results, resamples, seed=0):
+        wordCount = len(results[0].words)
+        random = numpy.random.RandomState(seed)
+        # columns: precision and recall scores of each result
+        scores = numpy.column_stack([vector for result in results 
+                                     for vector in (result.precisionScores, 
+                                                    result.recallScores)])
+        # resamples drawn at once, about 250000 draws stay in the processor 
+        # cache
+        chunk = max(1, _batchCells // 16 // wordCount)
+        sums = list()
+        for start in range(0, resamples, chunk):
+            counts = significance.drawCounts(random, min(chunk, resamples - start), 
+                                             wordCount)
+            sums.append(counts.dot(scores))
+        sums = numpy.concatenate(sums)
+        samples = list()
+        for k in range(len(results)):
+            (p, r, f) = significance.calcPerformanceMeasures(sums[:, 2 * k], 
+                                                             sums[:, 2 * k + 1], 
+                                                             wordCount)
+            samples.append(dict(precision=p, recall=r, fmeasure=f))
+        return samples
+
+    #===========================================================================
+    # method which draws rows resamples of wordCount words and returns how 
+    # often each word was drawn (rows x wordCount). Words are drawn from 
+    # 32 random bits by multiplying with wordCount (each word has probability
+    # 1 / wordCount up to a relative error of wordCount / 2^32), which is 
+    # twice as fast as drawing uniform floats or integers below wordCount.
+    #===========================================================================
+    @staticmethod
+    def drawCounts(random, rows, wordCount):
+        bits = random.randint(0, 2 ** 32, (rows, wordCount), dtype=numpy.uint32)
+        # word of each draw, offset by row so that all rows are counted at once
+        keys = numpy.multiply(bits, numpy.uint64(wordCount), dtype=numpy.uint64)
+        numpy.right_shift(keys, numpy.uint64(32), out=keys)
+        numpy.add(keys, (numpy.arange(rows, dtype=numpy.uint64) * numpy.uint64(wordCount))[:, None], 
+                  out=keys)
+        counts = numpy.bincount(keys.view(numpy.intp).ravel(), 
+                                minlength=rows * wordCount)
+        return counts.reshape((rows, wordCount)).astype(float)
+
+    #===========================================================================
+    # calcPerformanceMeasures of assigneval for arrays of counts, wordCount 
+    # is a number or an array of word counts
+    #===========================================================================
+    @staticmethod
+    def calcPerformanceMeasures(precisionCounts, recallCounts, wordCount):
+        wordCount = numpy.asarray(wordCount, dtype=float)
+        precision = precisionCounts / wordCount
+        recall = recallCounts / wordCount
+        fmeasure = numpy.zeros(len(precision), dtype=float)
+        nonzero = (precision + recall) != 0
+        fmeasure[nonzero] = 2 * precision[nonzero] * recall[nonzero] / (precision[nonzero] + recall[nonzero])
+        return (precision, recall, fmeasure)
+
+    #===========================================================================
+    # method which returns percentile interval of resampled values
+    #===========================================================================
+    @staticmethod
+    def interval(values, confidence):
+        (low, high) = numpy.percentile(values, [50.0 * (1 - confidence), 
+                                                50.0 * (1 + confidence)])
+        return (float(low), float(high))
+
+################################################################################
+#
+# Class strata
+# Breakdown of an evaluation into strata of gold standard words, e.g. by 
+# frequency band, word length, part of speech or number of gold standard 
+# alternatives. The per-word fractions of one evaluation, i.e. of one global 
+# morpheme assignment, are summed up per stratum in word order and normalised 
+# by the number of gold standard words of the stratum. A word may belong to 
+# several strata.
+#
+################################################################################
+class strata:
+    # built-in strata: name => function of word and its gold standard analyses
+    builtins = dict(length=lambda word, analyses: strata.lengthBand(word), 
+                    alternatives=lambda word, analyses: str(len(analyses)))
+
+    #===========================================================================
+    # method which returns list of (stratum, gold standard words, precision, 
+    # recall, fmeasure) of an EvaluationResult with words.
+    # wordStrata: word => list of strata
+    # order: strata in order of the list (default: sorted), empty strata are 
+    # left out
+    #===========================================================================
+    @staticmethod
+    def evaluate(result, wordStrata, order=None):
+        if order is None:
+            order = sorted(set([s for names in wordStrata.itervalues() for s in names]))
+        ids = dict((name, i) for (i, name) in enumerate(order))
+        
+        # (stratum, word position) pairs in word order
+        stratumIds = list()
+        positions = list()
+        for (i, word) in enumerate(result.words):
+            for name in wordStrata.get(word, ()):
+                stratumIds.append(ids[name])
+                positions.append(i)
+        stratumIds = numpy.array(stratumIds, dtype=int)
+        positions = numpy.array(positions, dtype=int)
+        
+        # bincount adds the scores of each stratum one after another
+        wordCounts = numpy.bincount(stratumIds, minlength=len(order))
+        precisionCounts = numpy.bincount(stratumIds, result.precisionScores[positions], 
+                                         len(order))
+        recallCounts = numpy.bincount(stratumIds, result.recallScores[positions], 
+                                      len(order))
+        nonEmpty = numpy.flatnonzero(wordCounts > 0)
+        (precision, recall, fmeasure) = significance.calcPerformanceMeasures(precisionCounts[nonEmpty], 
+                                                                              recallCounts[nonEmpty], 
+                                                                              wordCounts[nonEmpty])
+        return zip([order[i] for i in nonEmpty], wordCounts[nonEmpty].tolist(), 
+                   precision.tolist(), recall.tolist(), fmeasure.tolist())
+
+    #===========================================================================
+    # method which assigns words to strata, spec is the name of a built-in 
+    # stratification or a file with lines: word [tab] stratum.
+    # goldItems: iterable of (word, analyses) of the gold standard.
+    # Returns dict: word => list of strata and strata in order.
+    #===========================================================================
+    @staticmethod
+    def load(spec, goldItems):
+        if strata.builtins.__contains__(spec):
+            function = strata.builtins[spec]
+            wordStrata = dict()
+            for (word, analyses) in goldItems:
+                wordStrata[word] = [function(word, analyses)]
+            order = sorted(set([names[0] for names in wordStrata.itervalues()]), 
+                           key=strata.sortKey)
+            return (wordStrata, order)
+        return strata.readStrataFile(spec)
+
+    #===========================================================================
+    # method which reads strata file: word [tab] stratum per line, strata are
+    # ordered by first occurrence
+    #===========================================================================
+    @staticmethod
+    def readStrataFile(strataFile):
+        wordStrata = dict()
+        order = list()
+        seen = set()
+        for line in tools.openFile(strataFile):
+            split1 = line.rstrip("\r\n").split("\t")
+            if len(split1) < 2:
+                continue
+            (word, name) = (split1[0], split1[1])
+            names = wordStrata.setdefault(word, list())
+            if not names.__contains__(name):
+                names.append(name)
+            if not seen.__contains__(name):
+                seen.add(name)
+                order.append(name)
+        return (wordStrata, order)
+
+    # band of 4 characters of word length, e.g. "05-08"
+    @staticmethod
+    def lengthBand(word):
+        length = len(word.decode("utf-8", "replace"))
+        lower = (max(length, 1) - 1) // 4 * 4 + 1
+        return "%02d-%02d" % (lower, lower + 3)
+
+    # numbers are ordered by value
+    @staticmethod
+    def sortKey(name):
+        if name.isdigit():
+            return (0, int(name), name)
+        return (1, 0, name)
+
+    #===========================================================================
+    # method which generates lines of table of strata
+    #===========================================================================
+    @staticmethod
+    def table(spec, rows, short=False):
+        table = list()
+        if not short:
+            table.append("# strata: " + spec + "\n")
+            table.append("# stratum\twords\tprecision\trecall\tfmeasure\n")
+        for (name, words, precision, recall, fmeasure) in rows:
+            line = name + "\t" + str(words) + "\t" + str(precision) + "\t" + \
+                   str(recall) + "\t" + str(fmeasure) + "\n"
+            if short:
+                line = spec + "\t" + line
+            table.append(line)
+        return table
+
+################################################################################
+#
+# Class morphassignment       
+# Step 1: global assignment of gold standard to predicted morphemes
+#
+################################################################################
+class morphassignment:
+    #===========================================================================
+    # main method for assigning predicted to gold standard morphemes
+    #===========================================================================
+    @staticmethod
+    @instrumentation.phase("morphassignment")
+    def main(goldDict, predDict, assignFile, saveAssign, verbose, backend, 
+             goldMorphIndex=None, goldTable=None, predTable=None):
+        # goldTable, predTable: segmentationtables of words in gold standard 
+        # and predictions, built if not given
+        if goldTable is None or predTable is None:
+            (goldTable, predTable) = segmentationtable.fromDicts(goldDict, predDict, 
+                                                                 goldMorphIndex)
+        goldMorphIndex = goldTable.morphIndex
+        predMorphIndex = predTable.morphIndex
+        
+        # calc countMatrix
+        countMatrix = morphassignment.calcShardedCountMatrix(goldTable, predTable, 
+                                                             backend.jobs)
+        instrumentation.record("matrixRows", countMatrix.shape[0])
+        instrumentation.record("matrixCols", countMatrix.shape[1])
+        instrumentation.record("matrixNonZeros", countMatrix.nnz)
+        
+        # get morpheme assignment dictionary
+        if verbose:
+            print "\nMorpheme Assignment (gold standard => prediction)\n=================================================\n"
+        assignment = backend.solve(countMatrix, verbose)
+        morphAssignDict = morphassignment.assignment2MorphAssignDict(goldMorphIndex, 
+                                                                     predMorphIndex, 
+                                                                     assignment, 
+                                                                     verbose)
+        # save assignment if flagged
+        if saveAssign:
+            morphassignment.saveMorphemeAssignment(morphAssignDict, assignFile)        
+
+        # return assignment dictionary
+        return morphAssignDict
+
+    #===========================================================================
+    # 
+    #===========================================================================
+    @staticmethod
+    def saveMorphemeAssignment(morphAssignDict, assignFile):
+        tempList = list()
+        for pred in morphAssignDict.keys():
+            gold = morphAssignDict[pred]
+            tempList.append(gold + "\t=>\t" + pred + "\n")
+        tempList = sorted(tempList)
+        resultList = list()
+        resultList.append("#############################################\n")
+        resultList.append("# gold standard labels\t=>\tpredicted labels\n")
+        resultList.append("#############################################\n")
+        resultList.extend(tempList)
+        
+        f = open(assignFile, 'w')
+        f.writelines(resultList)
+        f.close() 
+        
+    #===========================================================================
+    # method which generates morpheme index for gold standard/predictions 
+    #===========================================================================
+    @staticmethod
+    def wordSegmentationList2MorphIndex(wordDict):
+        morphList = list()
+        for word in wordDict:
+            segmentationList = wordDict[word]
+            for segmentation in segmentationList:
+                morphList.extend(segmentation)
+        morphList = list(sorted(set(morphList)))
+        return morphList
+
+    #===========================================================================
+    # method which calculates count matrix: if multiple analyzes exist for gold
+    # standard or predictions, then fraction is added:
+    # => 1/ (#gold standard analyzes * #predicted analyzes)
+    #===========================================================================
+    @staticmethod
+    def calcCountMatrix(goldDict, predDict, goldMorphIndex, predMorphIndex):
+        countMatrix = morphassignment.calcSparseCountMatrix(goldDict, predDict, 
+                                                            goldMorphIndex, 
+                                                            predMorphIndex)
+        return countMatrix.todense()
+
+    #===========================================================================
+    # method which calculates sparse count matrix: morphemes are looked up in 
+    # label => id dictionaries, all (row, col, fraction) triplets of a word are 
+    # generated as arrays and duplicates are summed up in one batch
+    #===========================================================================
+    @staticmethod
+    def calcSparseCountMatrix(goldDict, predDict, goldMorphIndex, predMorphIndex):
+        (goldTable, predTable) = segmentationtable.fromDicts(goldDict, predDict, 
+                                                             goldMorphIndex, 
+                                                             predMorphIndex)
+        return morphassignment.calcTableCountMatrix(goldTable, predTable)
+
+    #===========================================================================
+    # method which calculates sparse count matrix of segmentationtables of the
+    # same words
+    #===========================================================================
+    @staticmethod
+    @instrumentation.phase("countMatrix")
+    def calcTableCountMatrix(goldTable, predTable):
+        goldMorphIndex = goldTable.morphIndex
+        predMorphIndex = predTable.morphIndex
+        ratios = float(1) / (goldTable.altCounts().astype(float) * 
+                             predTable.altCounts().astype(float))
+        
+        # gold standard morpheme ids with word number, predicted morpheme ids 
+        # with offset and length per word 
+        gTokens = numpy.asarray(goldTable.morphIds, dtype=int)
+        gWords = numpy.repeat(numpy.arange(len(goldTable.words)), 
+                              goldTable.tokenRanges()[1])
+        pTokens = numpy.asarray(predTable.morphIds, dtype=int)
+        (pStart, pLength) = predTable.tokenRanges()
+        
+        shape = (len(goldMorphIndex), len(predMorphIndex))
+        if len(gTokens) == 0 or len(pTokens) == 0:
+            return sparsecountmatrix.fromTriplets([], [], [], shape)
+        
+        # cross product of gold and predicted tokens per word
+        repeats = pLength[gWords]
+        rows = numpy.repeat(gTokens, repeats)
+        offsets = numpy.cumsum(repeats) - repeats
+        within = numpy.arange(repeats.sum()) - numpy.repeat(offsets, repeats)
+        cols = pTokens[numpy.repeat(pStart[gWords], repeats) + within]
+        values = numpy.repeat(ratios[gWords], repeats)
+        return sparsecountmatrix.fromTriplets(rows, cols, values, shape)
+
+    #===========================================================================
+    # method which calculates sparse count matrix by several processes: the 
+    # words are split into shards of consecutive words, each process 
+    # calculates the partial matrix of a shard and the partial matrices are 
+    # added up. Cells are summed up per shard, so that values may differ in the
+    # last digits from calcTableCountMatrix.
+    #===========================================================================
+    @staticmethod
+    def calcShardedCountMatrix(goldTable, predTable, jobs=1, shardWords=None):
+        if shardWords is None:
+            shardWords = _shardWords
+        wordNo = len(goldTable.words)
+        shardNo = min(jobs or 1, wordNo // max(1, shardWords))
+        if shardNo <= 1:
+            return morphassignment.calcTableCountMatrix(goldTable, predTable)
+        bounds = [wordNo * k // shardNo for k in range(shardNo + 1)]
+        shards = zip(bounds[:-1], bounds[1:])
+        instrumentation.count("countMatrixShards", shardNo)
+        
+        # worker processes inherit tables when forked
+        pool = multiprocessing.Pool(shardNo, _initCountMatrixWorker, 
+                                    (goldTable, predTable))
+        try:
+            partials = pool.map(_countMatrixShard, shards, 1)
+        finally:
+            pool.close()
+            pool.join()
+        return sparsecountmatrix.sum(partials, (len(goldTable.morphIndex), 
+                                                len(predTable.morphIndex)))
+
+    #===========================================================================
+    # method which generates output for lp_solve: one binary variable per 
+    # non-zero cell of count matrix, written line by line
+    #===========================================================================
+    @staticmethod
+    @instrumentation.phase("writeLP")
+    def writeLPInputFile(countMatrix, lpInput):
+        if not isinstance(countMatrix, sparsecountmatrix):
+            countMatrix = sparsecountmatrix.fromDense(countMatrix)
+        rows = countMatrix.rows.tolist()
+        cols = countMatrix.cols.tolist()
+        data = countMatrix.data.tolist()
+        
+        f = open(lpInput, 'w')
+        
+        # objective function
+        f.write("max: ")
+        for k in range(len(data)):
+            if k > 0:
+                f.write(" + ")
+            f.write(str(data[k]) + " b_" + str(rows[k]) + "_" + str(cols[k]))
+        f.write(";\n\n")
+        
+        # row constraints, cells are sorted by row
+        morphassignment.writeLPConstraints(f, rows, cols, range(len(data)))
+        
+        # column constraints
+        colOrder = numpy.argsort(countMatrix.cols, kind="mergesort").tolist()
+        morphassignment.writeLPConstraints(f, cols, rows, colOrder, transposed=True)
+        
+        # binary variables
+        if len(data) > 0:
+            f.write("bin ")
+            for k in range(len(data)):
+                if k > 0:
+                    f.write(", ")
+                f.write("b_" + str(rows[k]) + "_" + str(cols[k]))
+            f.write(";\n\n")
+        f.close()
+
+    #===========================================================================
+    # method which writes one "<= 1" constraint per group of cells sharing the 
+    # same outer index, cells are visited in given order
+    #===========================================================================
+    @staticmethod
+    def writeLPConstraints(f, outer, inner, order, transposed=False):
+        previous = None
+        for k in order:
+            if transposed:
+                item = "b_" + str(inner[k]) + "_" + str(outer[k])
+            else:
+                item = "b_" + str(outer[k]) + "_" + str(inner[k])
+            if outer[k] != previous:
+                if previous is not None:
+                    f.write(" <= 1;\n")
+                f.write(item)
+                previous = outer[k]
+            else:
+                f.write(" + " + item)
+        if previous is not None:
+            f.write(" <= 1;\n")
+        f.write("\n")
+    
+    #===========================================================================
+    # method which reads assigned (row, col) pairs from lp_solve output
+    #===========================================================================
+    @staticmethod
+    def readLPOutputFile(lpOutput):
+        assignment = list()
+        for line in open(lpOutput,'r'):
+            line = re.sub('\n$', '', line)
+            found = re.findall("^b_(\d+)_(\d+)\s+(\d+)$", line)
+            if found:
+                (i, j, bit) = found[0]
+                if int(bit) == 1:
+                    assignment.append((int(i), int(j)))
+        return assignment
+
+    #===========================================================================
+    # method which translates lp_solve output into morpheme assignment dict
+    # morpheme assignment dict:    pred morpheme => gold standard morpheme
+    #===========================================================================
+    @staticmethod
+    def getMorphAssignDict(goldMorphIndex, predMorphIndex, lpOutput, verbose):
+        assignment = morphassignment.readLPOutputFile(lpOutput)
+        return morphassignment.assignment2MorphAssignDict(goldMorphIndex, 
+                                                          predMorphIndex, 
+                                                          assignment, verbose)
+
+    #===========================================================================
+    # method which translates list of assigned (row, col) pairs into morpheme 
+    # assignment dict:    pred morpheme => gold standard morpheme
+    #===========================================================================
+    @staticmethod
+    def assignment2MorphAssignDict(goldMorphIndex, predMorphIndex, assignment, verbose):
+        morphAssignDict = dict() 
+        for (i, j) in assignment:
+            goldM = goldMorphIndex[i]
+            predM = predMorphIndex[j]
+            morphAssignDict[predM] = goldM
+            
+            if verbose:
+                print goldM, "=>", predM
+        return morphAssignDict
+
+################################################################################
+#
+# Class assigneval
+# Step 2: mapping of morpheme assignment to predicted segmentations and 
+# evaluation based on set comparison
+#
+################################################################################
+    
+class assigneval:
+    #===========================================================================
+    # main method which evaluates predictions based on morpheme assignment
+    #===========================================================================
+    @staticmethod
+    @instrumentation.phase("assigneval")
+    def main(goldDict, predDict, morphAssignDict, resultFile, saveResult, verbose, 
+             wordScores=None, goldTable=None, predTable=None, wordFractions=None, 
+             wordCount=None, quiet=False):
+        # wordScores: if dict is given, it is filled with 
+        # word => [precision fraction, recall fraction] of each evaluated word
+        # wordFractions: if dict is given, it is filled with word => (precision
+        # fractions, recall fractions) of each evaluated word in the order they
+        # are added up
+        # goldTable, predTable: segmentationtables of words in gold standard 
+        # and predictions, built if not given. Gold standard analyses are 
+        # taken from goldTable, goldDict may be None if both tables and 
+        # wordCount (number of gold standard words) are given.
+        # quiet: words which could not be evaluated are not printed
+        if verbose:
+            print "\nAssignment evaluation\n=====================\n"
+        if goldTable is None or predTable is None:
+            (goldTable, predTable) = segmentationtable.fromDicts(goldDict, predDict)
+        words = goldTable.words
+        goldNo = goldTable.altCounts()
+        predNo = predTable.altCounts()
+        
+        # words with an empty analysis are evaluated one by one, as some of 
+        # their fractions are not defined
+        regular = (goldNo > 0) & (predNo > 0) & \
+                  ~assigneval.hasEmptyAlternative(goldTable) & \
+                  ~assigneval.hasEmptyAlternative(predTable)
+        rows = numpy.flatnonzero(regular)
+        instrumentation.count("evaluatedWords", len(words))
+        instrumentation.count("irregularWords", len(words) - len(rows))
+        
+        # comparison of all gold standard and predicted alternatives of words
+        (labels, predLabels) = assigneval.replaceTableLabels(predTable, 
+                                                             morphAssignDict, 
+                                                             goldTable.morphIndex)
+        (pairOffsets, goldAlt, predAlt) = assigneval.crossAlternatives(goldTable, 
+                                                                       predTable, 
+                                                                       rows)
+        found = assigneval.countCommon(goldTable, goldAlt, predTable, predLabels, 
+                                       predAlt, len(labels))
+        # list1ToList2Comparison of gold standard to prediction and v.v.
+        precisionRatios = found / predTable.altLengths()[predAlt].astype(float)
+        recallRatios = found / goldTable.altLengths()[goldAlt].astype(float)
+        
+        # segmentation assignment: assigned pairs of alternatives of each word
+        (selectedOffsets, selected) = assigneval.selectAlternatives(goldNo[rows], 
+                                                                    predNo[rows], 
+                                                                    pairOffsets, 
+                                                                    precisionRatios)
+        selectedRows = numpy.repeat(numpy.arange(len(rows)), numpy.diff(selectedOffsets))
+        precisionFractions = (float(1) / predNo[rows][selectedRows].astype(float)) * precisionRatios[selected]
+        recallFractions = (float(1) / goldNo[rows][selectedRows].astype(float)) * recallRatios[selected]
+        
+        wordPrecision = numpy.zeros(len(words), dtype=float)
+        wordRecall = numpy.zeros(len(words), dtype=float)
+        wordPrecision[rows] = assigneval.sumFractions(selectedOffsets, precisionFractions)
+        wordRecall[rows] = assigneval.sumFractions(selectedOffsets, recallFractions)
+        
+        # fractions of words evaluated one by one: position => (precision 
+        # fractions, recall fractions)
+        irregularFractions = dict()
+        exchangedOut = list()
+        if verbose or saveResult:
+            # output of all words in order
+            rowPositions = numpy.zeros(len(words), dtype=int)
+            rowPositions[rows] = numpy.arange(len(rows))
+            precisionList = precisionFractions.tolist()
+            recallList = recallFractions.tolist()
+            for (w, word) in enumerate(words):
+                if not regular[w]:
+                    (irregularFractions[w], exchanged) = assigneval.evaluateWord(word, 
+                                                                                 goldTable.analyses(w), 
+                                                                                 predDict[word], 
+                                                                                 morphAssignDict, 
+                                                                                 verbose, quiet)
+                    if exchanged is not None:
+                        exchangedOut.append(exchanged)
+                    continue
+                r = rowPositions[w]
+                exchangedStr = word + "\t"
+                for s in range(selectedOffsets[r], selectedOffsets[r + 1]):
+                    pair = selected[s]
+                    (i, j) = divmod(pair - pairOffsets[r], predNo[w])
+                    goldSegmentation = goldTable.analyses(w)[i]
+                    a = predAlt[pair]
+                    replacedPredSegm = [labels[l] for l in predLabels[predTable.altOffsets[a]:predTable.altOffsets[a + 1]]]
+                    if verbose: print numpy.min([goldNo[w], predNo[w]]), "alternative(s): p+=", precisionList[s],"r+=", recallList[s], "gold:", goldSegmentation, "pred:",replacedPredSegm
+                    exchangedStr += tools.list2string(replacedPredSegm, " ") + ", "
+                # add to result list of predicted segmentations with exchanged labels
+                exchangedOut.append(exchangedStr[0:len(exchangedStr)-2] + "\n")
+        else:
+            for w in numpy.flatnonzero(~regular):
+                word = words[w]
+                (irregularFractions[w], exchanged) = assigneval.evaluateWord(word, 
+                                                                             goldTable.analyses(w), 
+                                                                             predDict[word], 
+                                                                             morphAssignDict, 
+                                                                             verbose, quiet)
+        
+        # all fractions in word order, added up one after another to counts
+        fractionCounts = numpy.zeros(len(words), dtype=numpy.int64)
+        fractionCounts[rows] = numpy.diff(selectedOffsets)
+        for (w, (precisionList, recallList)) in irregularFractions.items():
+            fractionCounts[w] = len(precisionList)
+            wordPrecision[w] = assigneval.sumList(precisionList)
+            wordRecall[w] = assigneval.sumList(recallList)
+        fractionOffsets = segmentationtable.offsets(fractionCounts)
+        allPrecision = numpy.zeros(fractionOffsets[-1], dtype=float)
+        allRecall = numpy.zeros(fractionOffsets[-1], dtype=float)
+        positions = segmentationtable.ranges(fractionOffsets[rows], fractionCounts[rows])
+        allPrecision[positions] = precisionFractions
+        allRecall[positions] = recallFractions
+        for (w, (precisionList, recallList)) in irregularFractions.items():
+            allPrecision[fractionOffsets[w]:fractionOffsets[w + 1]] = precisionList
+            allRecall[fractionOffsets[w]:fractionOffsets[w + 1]] = recallList
+        precision_count = float(0)
+        recall_count = float(0)
+        if len(allPrecision) > 0:
+            precision_count = float(allPrecision.cumsum()[-1])
+            recall_count = float(allRecall.cumsum()[-1])
+        if wordFractions is not None:
+            fractionOffsets = fractionOffsets.tolist()
+            allPrecision = allPrecision.tolist()
+            allRecall = allRecall.tolist()
+            for (w, word) in enumerate(words):
+                (start, stop) = (fractionOffsets[w], fractionOffsets[w + 1])
+                wordFractions[word] = (tuple(allPrecision[start:stop]), 
+                                       tuple(allRecall[start:stop]))
+        if wordScores is not None:
+            for (word, p, r) in zip(words, wordPrecision.tolist(), wordRecall.tolist()):
+                wordScores[word] = [p, r]
+        
+        # write exchanged prediction
+        if saveResult:
+            f_out = open(resultFile, "w")
+            f_out.writelines(sorted(exchangedOut))
+            f_out.close()
+    
+        # get performance measures and return them
+        if wordCount is None:
+            wordCount = len(goldDict.keys())
+        (p, r, f) = assigneval.calcPerformanceMeasures(precision_count, recall_count, wordCount, verbose)
+        return (p, r, f)
+    
+    #===========================================================================
+    # method which evaluates a single word, returns fractions and line of 
+    # result file (None if word could not be evaluated)
+    #===========================================================================
+    @staticmethod
+    def evaluateWord(word, goldSegmentationList, predSegmentationList, 
+                     morphAssignDict, verbose, quiet=False):
+        goldNo = len(goldSegmentationList)
+        predNo = len(predSegmentationList)
+        precisionFractions = list()
+        recallFractions = list()
+        exchanged = None
+        try:
+            ratio_precision = float(1) / float(predNo)
+            ratio_recall = float(1) / float(goldNo)
+            
+            # simple evaluation
+            if goldNo == 1 and predNo == 1:
+                pairs = [(goldSegmentationList[0], 
+                          assigneval.replaceLabels(predSegmentationList[0], 
+                                                   morphAssignDict))]
+            # segmentation assignment
+            else:
+                (segmentationAssignmentDict, countMatrix) = assigneval.calcCountMatrix_Segmentation(goldSegmentationList, predSegmentationList, morphAssignDict)
+                assignment = assignsolver.solveBatch([countMatrix])[0]
+                pairs = [segmentationAssignmentDict[key] for key in assignment]
+            
+            exchangedStr = word + "\t"
+            for (goldSegmentation, replacedPredSegm) in pairs:
+                # precision = intersection prediction, gold standard / size prediction
+                precision_fraction = ratio_precision * assigneval.list1ToList2Comparison(list(goldSegmentation), list(replacedPredSegm))
+                precisionFractions.append(precision_fraction)
+
+                # recall = intersection prediction, gold standard / size gold standard
+                recall_fraction = ratio_recall * assigneval.list1ToList2Comparison(list(replacedPredSegm), list(goldSegmentation))
+                recallFractions.append(recall_fraction)
+
+                if verbose: print numpy.min([goldNo, predNo]), "alternative(s): p+=", precision_fraction,"r+=", recall_fraction, "gold:", goldSegmentation, "pred:",replacedPredSegm
+                exchangedStr += tools.list2string(replacedPredSegm, " ") + ", "
+            exchanged = exchangedStr[0:len(exchangedStr)-2] + "\n"
+        
+        except ZeroDivisionError:
+            if not quiet: print word, "with gs:", goldSegmentationList, "and ps:", predSegmentationList, "was not evaluated"
+        return ((precisionFractions, recallFractions), exchanged)
+
+    #===========================================================================
+    # method which returns for each word of table whether one of its 
+    # alternatives is empty
+    #===========================================================================
+    @staticmethod
+    def hasEmptyAlternative(table):
+        altWords = numpy.repeat(numpy.arange(len(table.words)), table.altCounts())
+        emptyAlternatives = numpy.flatnonzero(table.altLengths() == 0)
+        return numpy.bincount(altWords[emptyAlternatives], 
+                              minlength=len(table.words)) > 0
+
+    #===========================================================================
+    # method which replaces predicted morphemes of table by assigned gold 
+    # standard labels. Returns list of labels starting with the gold standard
+    # morphemes and label ids of all predicted morphemes. Predicted morphemes
+    # without assignment keep their label, which matches a gold standard 
+    # morpheme of the same name.
+    #===========================================================================
+    @staticmethod
+    def replaceTableLabels(predTable, morphAssignDict, goldMorphIndex):
+        labels = list(goldMorphIndex)
+        labelIds = dict((m, i) for (i, m) in enumerate(labels))
+        replacement = numpy.zeros(len(predTable.morphIndex), dtype=numpy.int64)
+        for (i, predLabel) in enumerate(predTable.morphIndex):
+            label = morphAssignDict.get(predLabel, predLabel)
+            if not labelIds.__contains__(label):
+                labelIds[label] = len(labels)
+                labels.append(label)
+            replacement[i] = labelIds[label]
+        return (labels, replacement[numpy.asarray(predTable.morphIds, dtype=numpy.int64)])
+
+    #===========================================================================
+    # method which returns all combinations of gold standard and predicted 
+    # alternatives of the words in rows: offsets of the combinations of each
+    # word, gold standard and predicted alternative of each combination 
+    # (gold standard alternative by predicted alternative)
+    #===========================================================================
+    @staticmethod
+    def crossAlternatives(goldTable, predTable, rows):
+        goldNo = goldTable.altCounts()[rows]
+        predNo = predTable.altCounts()[rows]
+        pairOffsets = segmentationtable.offsets(goldNo * predNo)
+        pairRows = numpy.repeat(numpy.arange(len(rows)), goldNo * predNo)
+        (i, j) = numpy.divmod(numpy.arange(pairOffsets[-1]) - pairOffsets[pairRows], 
+                              predNo[pairRows])
+        goldAlt = goldTable.wordOffsets[rows][pairRows] + i
+        predAlt = predTable.wordOffsets[rows][pairRows] + j
+        return (pairOffsets, goldAlt, predAlt)
+
+    #===========================================================================
+    # method which counts morphemes common to pairs of gold standard and 
+    # predicted alternatives (size of multiset intersection)
+    #===========================================================================
+    @staticmethod
+    def countCommon(goldTable, goldAlt, predTable, predLabels, predAlt, labelCount):
+        keyCounts = list()
+        for (offsets, ids, alternatives) in ((goldTable.altOffsets, goldTable.morphIds, goldAlt),
+                                             (predTable.altOffsets, predLabels, predAlt)):
+            starts = offsets[alternatives]
+            lengths = offsets[alternatives + 1] - starts
+            tokens = segmentationtable.ranges(starts, lengths)
+            pairs = numpy.repeat(numpy.arange(len(alternatives), dtype=numpy.int64), lengths)
+            keys = pairs * labelCount + numpy.asarray(ids, dtype=numpy.int64)[tokens]
+            keyCounts.append(numpy.unique(keys, return_counts=True))
+        ((goldKeys, goldCounts), (predKeys, predCounts)) = keyCounts
+        
+        found = numpy.zeros(len(goldAlt), dtype=float)
+        if len(goldKeys) == 0 or len(predKeys) == 0:
+            return found
+        positions = numpy.minimum(numpy.searchsorted(goldKeys, predKeys), len(goldKeys) - 1)
+        common = numpy.flatnonzero(goldKeys[positions] == predKeys)
+        found += numpy.bincount(predKeys[common] // labelCount, 
+                                weights=numpy.minimum(goldCounts[positions[common]], 
+                                                      predCounts[common]), 
+                                minlength=len(goldAlt))
+        return found
+
+    #===========================================================================
+    # method which assigns predicted to gold standard alternatives of each 
+    # word, words with more than one alternative are solved in one batch. 
+    # Returns offsets of the assigned pairs of each word and assigned pairs.
+    #===========================================================================
+    @staticmethod
+    @instrumentation.phase("alternatives")
+    def selectAlternatives(goldNo, predNo, pairOffsets, weights):
+        single = (goldNo == 1) & (predNo == 1)
+        multi = numpy.flatnonzero(~single)
+        instrumentation.count("alternativeMatrices", len(multi))
+        assignments = assignsolver.solveBatch([weights[pairOffsets[r]:pairOffsets[r + 1]].reshape(goldNo[r], predNo[r]) 
+                                               for r in multi])
+        counts = numpy.ones(len(goldNo), dtype=int)
+        counts[multi] = [len(assignment) for assignment in assignments]
+        selectedOffsets = segmentationtable.offsets(counts)
+        selected = numpy.zeros(selectedOffsets[-1], dtype=numpy.int64)
+        selected[selectedOffsets[:-1][single]] = pairOffsets[:-1][single]
+        for (r, assignment) in zip(multi, assignments):
+            selected[selectedOffsets[r]:selectedOffsets[r + 1]] = [pairOffsets[r] + i * predNo[r] + j 
+                                                                   for (i, j) in assignment]
+        return (selectedOffsets, selected)
+
+    #===========================================================================
+    # method which sums up fractions of each word one after another (as 
+    # fractions are added in word loop)
+    #===========================================================================
+    @staticmethod
+    def sumFractions(offsets, fractions):
+        counts = numpy.diff(offsets)
+        if len(counts) == 0 or counts.max() == 0:
+            return numpy.zeros(len(counts), dtype=float)
+        padded = numpy.zeros((len(counts), counts.max()), dtype=float)
+        fractionRows = numpy.repeat(numpy.arange(len(counts)), counts)
+        padded[fractionRows, numpy.arange(len(fractions)) - offsets[fractionRows]] = fractions
+        return padded.cumsum(axis=1)[:, -1]
+
+    # sum of values added one after another
+    @staticmethod
+    def sumList(values):
+        total = float(0)
+        for value in values:
+            total += value
+        return total
+
+    #===========================================================================
+    # method which adds up the fractions of words (wordFractions as filled by
+    # main) one after another in the order of words, as main does. Returns 
+    # precision count and recall count.
+    #===========================================================================
+    @staticmethod
+    def sumWordFractions(words, wordFractions):
+        precision_count = float(0)
+        recall_count = float(0)
+        for word in words:
+            if wordFractions.__contains__(word):
+                (precisionFractions, recallFractions) = wordFractions[word]
+                for fraction in precisionFractions:
+                    precision_count += fraction
+                for fraction in recallFractions:
+                    recall_count += fraction
+        return (precision_count, recall_count)
+
+    #===========================================================================
+    # method which returns precision and recall fractions of words as arrays,
+    # words without scores get 0
+    #===========================================================================
+    @staticmethod
+    def scoreVectors(words, wordScores):
+        precisionScores = numpy.zeros(len(words), dtype=float)
+        recallScores = numpy.zeros(len(words), dtype=float)
+        for (i, word) in enumerate(words):
+            if wordScores.__contains__(word):
+                (precisionScores[i], recallScores[i]) = wordScores[word]
+        return (precisionScores, recallScores)
+
+    #===========================================================================
+    # method calculates performance measures
+    #===========================================================================
+    @staticmethod
+    def calcPerformanceMeasures(precision_count, recall_count, word_count, verbose):
+        precision = float(precision_count) / float(word_count)
+        recall = float(recall_count) / float(word_count)
+        try: fmeasure = 2 * precision * recall / (precision + recall)
+        except ZeroDivisionError: fmeasure = 0
+        
+        if verbose:
+            print "\nCalculation of performance measures\n===================================\n"
+            print "precision (p) = p count / word count =", precision_count, "/", word_count, "=", precision
+            print "recall    (r) = r count / word count =", recall_count, "/", word_count, "=", recall
+            print "f-measure (f) = 2 * p * r / (p + r)  =", fmeasure    
+                     
+        return (precision, recall, fmeasure)
+     
+    #===========================================================================
+    # method which replaces predicted labels by assigned gold standard labels
+    #===========================================================================
+    @staticmethod
+    def replaceLabels(predSegmentation, morphAssignDict):
+        return [morphAssignDict.get(predLabel, predLabel) for predLabel in predSegmentation]
+
+    #===========================================================================
+    # method which performs set comparison of list1 to list2
+    #===========================================================================
+    @staticmethod
+    def list1ToList2Comparison(list1, list2):
+        # morphemes of list2 which are not yet matched
+        remaining = dict()
+        for l in list2:
+            remaining = tools.incDict(remaining, l, 1)
+        found = 0
+        list2Size = float(len(list2))
+        for l in list1:
+            if remaining.get(l, 0) > 0:
+                remaining[l] -= 1
+                found += 1
+        ratio = float(found) / list2Size
+        return ratio
+
+    #===========================================================================
+    # method which calculates count matrix of gold standard and predicted 
+    # alternatives of a word, returns dict: (i, j) => (gold standard 
+    # alternative, predicted alternative with exchanged labels) and matrix
+    #===========================================================================
+    @staticmethod
+    def calcCountMatrix_Segmentation(goldSegmentationList, predSegmentationList, predGoldDict):
+        countMatrix = zeros((len(goldSegmentationList), len(predSegmentationList)), dtype=float)
+        segmentationAssignmentDict = dict()
+        
+        for i in range(len(goldSegmentationList)):
+            goldSegmentation = goldSegmentationList[i]
+            for j in range(len(predSegmentationList)):
+                predSegmentation = predSegmentationList[j]
+                replacedPredSegm = assigneval.replaceLabels(predSegmentation, predGoldDict)
+                segmentationAssignmentDict[(i, j)] = (goldSegmentation, replacedPredSegm)
+                countMatrix[i, j] = assigneval.list1ToList2Comparison(goldSegmentation, replacedPredSegm)
+        return (segmentationAssignmentDict, countMatrix)
+
+################################################################################
+#
+# Class boundary
+# Unlabelled evaluation of segmentations by morph boundaries, e.g. of 
+# predictions against WordListSegmented.txt. The morphs of an analysis are 
+# expected to concatenate to the word, a boundary is the position after each
+# morph but the last one. Boundaries of each alternative are encoded as 
+# bitmasks (uint64 words), common boundaries of a pair of alternatives are 
+# counted by popcount of the masks' intersection.
+# Alternatives are handled as in assigneval: gold standard and predicted 
+# alternatives of a word are assigned to each other by a maximum matching of 
+# common boundaries, boundaries of a word are weighted by 1 / #predicted 
+# alternatives (precision) and 1 / #gold standard alternatives (recall). 
+# Precision and recall are the weighted common boundaries over the weighted 
+# predicted and gold standard boundaries of all words (words without 
+# prediction have no predicted boundaries).
+#
+################################################################################
+class boundary:
+    # number of set bits of each byte value
+    bitCounts = numpy.array([bin(b).count("1") for b in range(256)], dtype=numpy.int64)
+
+    #===========================================================================
+    # method which evaluates predictions (file or dict) against gold 
+    # standard, returns precision, recall and fmeasure of boundaries
+    #===========================================================================
+    @staticmethod
+    @instrumentation.phase("boundaries")
+    def evaluate(gold, predictions):
+        if not isinstance(gold, GoldStandard):
+            gold = GoldStandard(gold)
+        predDict = gold.findPredictions(predictions)
+        goldAll = gold.getTable()
+        words = [word for word in goldAll.words if predDict.__contains__(word)]
+        goldTable = goldAll.select(words)
+        predTable = segmentationtable.fromDict(predDict, words)
+        goldNo = goldTable.altCounts()
+        predNo = predTable.altCounts()
+        
+        # common boundaries of all pairs of alternatives
+        rows = numpy.flatnonzero((goldNo > 0) & (predNo > 0))
+        (goldMasks, predMasks) = boundary.alignMasks(boundary.masks(goldTable), 
+                                                     boundary.masks(predTable))
+        (pairOffsets, goldAlt, predAlt) = assigneval.crossAlternatives(goldTable, 
+                                                                       predTable, 
+                                                                       rows)
+        common = boundary.popcount(goldMasks[goldAlt] & predMasks[predAlt]).sum(axis=1)
+        
+        # common boundaries of assigned alternatives per word
+        wordCommon = numpy.zeros(len(words), dtype=float)
+        wordCommon[rows] = boundary.matchedCommon(goldNo[rows], predNo[rows], 
+                                                  pairOffsets, common)
+        
+        # weighted counts
+        commonPrecision = boundary.weightedSum(wordCommon, predNo)
+        commonRecall = boundary.weightedSum(wordCommon, goldNo)
+        predBoundaries = boundary.weightedSum(boundary.wordBoundaries(predTable), predNo)
+        goldBoundaries = boundary.weightedSum(boundary.wordBoundaries(goldAll), 
+                                              goldAll.altCounts())
+        precision = float(0)
+        if predBoundaries > 0:
+            precision = commonPrecision / predBoundaries
+        recall = float(0)
+        if goldBoundaries > 0:
+            recall = commonRecall / goldBoundaries
+        try: fmeasure = 2 * precision * recall / (precision + recall)
+        except ZeroDivisionError: fmeasure = 0
+        return (precision, recall, fmeasure)
+
+    #===========================================================================
+    # method which returns boundary bitmasks of all alternatives of table, 
+    # array (alternatives x words of 64 bits): bit p - 1 is set for a boundary
+    # after character p
+    #===========================================================================
+    @staticmethod
+    def masks(table):
+        altNo = len(table.altOffsets) - 1
+        altOffsets = numpy.asarray(table.altOffsets)
+        altLengths = numpy.diff(altOffsets)
+        charLengths = numpy.array([len(m.decode("utf-8", "replace")) for m in table.morphIndex], 
+                                  dtype=numpy.int64)
+        tokenLengths = charLengths[numpy.asarray(table.morphIds, dtype=numpy.int64)]
+        
+        # position after each morph within its alternative, last morphs of 
+        # alternatives are no boundaries
+        ends = numpy.concatenate(([0], numpy.cumsum(tokenLengths)))
+        positions = ends[1:] - numpy.repeat(ends[altOffsets[:-1]], altLengths)
+        isBoundary = numpy.ones(len(tokenLengths), dtype=bool)
+        isBoundary[altOffsets[1:][altLengths > 0] - 1] = False
+        isBoundary &= positions > 0
+        bits = positions - 1
+        
+        # bits of an alternative are distinct, so their sum is their union,
+        # sums of alternatives are differences of cumulative sums (modulo 2^64)
+        wordNo = 1
+        if isBoundary.any():
+            wordNo = int(bits[isBoundary].max()) // 64 + 1
+        masks = numpy.zeros((altNo, wordNo), dtype=numpy.uint64)
+        for k in range(wordNo):
+            values = numpy.zeros(len(tokenLengths), dtype=numpy.uint64)
+            inWord = isBoundary & (bits // 64 == k)
+            values[inWord] = numpy.left_shift(numpy.uint64(1), 
+                                              (bits[inWord] % 64).astype(numpy.uint64))
+            sums = numpy.concatenate((numpy.zeros(1, dtype=numpy.uint64), 
+                                      numpy.cumsum(values, dtype=numpy.uint64)))
+            masks[:, k] = sums[altOffsets[1:]] - sums[altOffsets[:-1]]
+        return masks
+
+    #===========================================================================
+    # method which returns number of common boundaries of a maximum matching
+    # of alternatives per word: the maximum over all pairs if there is only 
+    # one gold standard or predicted alternative, otherwise the matrices of
+    # common boundaries are solved in a batch
+    #===========================================================================
+    @staticmethod
+    def matchedCommon(goldNo, predNo, pairOffsets, common):
+        matched = numpy.zeros(len(goldNo), dtype=numpy.int64)
+        if len(goldNo) == 0:
+            return matched
+        matched[:] = numpy.maximum.reduceat(common, pairOffsets[:-1])
+        multi = numpy.flatnonzero((goldNo > 1) & (predNo > 1))
+        instrumentation.count("alternativeMatrices", len(multi))
+        weights = [common[pairOffsets[r]:pairOffsets[r + 1]].reshape(goldNo[r], predNo[r]) 
+                   for r in multi]
+        for (r, w, assignment) in zip(multi, weights, assignsolver.solveBatch(weights)):
+            matched[r] = sum([w[i, j] for (i, j) in assignment])
+        return matched
+
+    # masks with the same number of 64 bit words
+    @staticmethod
+    def alignMasks(goldMasks, predMasks):
+        wordNo = max(goldMasks.shape[1], predMasks.shape[1])
+        aligned = list()
+        for masks in (goldMasks, predMasks):
+            padded = numpy.zeros((masks.shape[0], wordNo), dtype=numpy.uint64)
+            padded[:, :masks.shape[1]] = masks
+            aligned.append(padded)
+        return aligned
+
+    # number of set bits of each element of uint64 array
+    @staticmethod
+    def popcount(values):
+        values = numpy.ascontiguousarray(values, dtype=numpy.uint64)
+        counts = boundary.bitCounts[values.view(numpy.uint8)]
+        return counts.reshape(values.shape + (8,)).sum(axis=-1)
+
+    # number of boundaries of all alternatives of each word
+    @staticmethod
+    def wordBoundaries(table):
+        altBoundaries = numpy.maximum(table.altLengths() - 1, 0).astype(float)
+        return assigneval.sumFractions(numpy.asarray(table.wordOffsets), altBoundaries)
+
+    # sum of counts divided by number of alternatives of each word, added up 
+    # in word order
+    @staticmethod
+    def weightedSum(counts, altCounts):
+        nonEmpty = altCounts > 0
+        if not nonEmpty.any():
+            return float(0)
+        weighted = counts[nonEmpty] / altCounts[nonEmpty].astype(float)
+        return float(weighted.cumsum()[-1])
 
 ################################################################################
 #
-# Class main_class
+# Class assignsolver
+# In-process solver for the maximum matching of a bipartite graph, replaces 
+# the call of lp_solve
 #
 ################################################################################
-class main_class:
+class assignsolver:
     #===========================================================================
-    # main method 
+    # method which finds maximum-weight assignment of rows to columns of count 
+    # matrix. Returns sorted list of (row, col) pairs with non-zero weight.
+    # The bipartite graph is split into connected components which are solved
+    # independently, on several processes if jobs > 1.
+    # warmStart: (previous assignment, touched rows, touched cols) where the 
+    # boolean arrays mark rows and columns with changed cells. Components 
+    # without touched rows and columns keep their previous assignment.
     #===========================================================================
     @staticmethod
-    def main(goldFile, predFile, saveAssign, saveResult, verbose, short):
-        # get predictions and gold standard
-        predDict = main_class.findPredictions(goldFile, predFile)
-        goldDict = main_class.readGoldStandard(goldFile)
-        
-        # morpheme assignment
-        lpInput  = predFile + ".lpInput"
-        lpOutput = predFile + ".lpOutput"
-        assignFile = predFile + ".assignment"
-        morphAssignDict = morphassignment.main(goldDict, predDict, lpInput, 
-                                               lpOutput, assignFile, 
-                                               saveAssign, verbose)
-        
-        # assignment evaluation
-        tempFile = predFile + ".temp"
-        resultFile = predFile + ".result"
-        (precision, recall, fmeasure) = assigneval.main(goldDict, predDict, 
-                                                        morphAssignDict, 
-                                                        tempFile,
-                                                        resultFile,
-                                                        saveResult, verbose)
-        if not short:
-            print "\nRESULT:\n======="
-            print "gold standard:", goldFile
-            print "prediction   :", predFile, "\n"
-            print "precision:", precision
-            print "recall   :", recall
-            print "fmeasure :", fmeasure
-        else:
-            print str(precision) + "\t" + str(recall) + "\t" + str(fmeasure) 
+    def solve(countMatrix, jobs=1, verbose=False, warmStart=None):
+        if not isinstance(countMatrix, sparsecountmatrix):
+            countMatrix = sparsecountmatrix.fromDense(countMatrix)
+        components = assignsolver.components(countMatrix)
+        instrumentation.count("solverInvocations")
+        instrumentation.count("components", len(components))
+        if verbose:
+            print assignsolver.componentStats(components), "\n"
+        if warmStart is not None:
+            (previous, touchedRows, touchedCols) = warmStart
+            previousCols = dict(previous)
         
-        # clean up
-        os.system("rm " + lpInput)
-        os.system("rm " + lpOutput)
+        # components with a single row or column are solved directly, 
+        # remaining components are solved by the Hungarian method
+        assignment = list()
+        blocks = list()
+        blockIds = list()
+        for (rowIds, colIds, rows, cols, data) in components:
+            if (warmStart is not None and not touchedRows[rowIds].any() and 
+                not touchedCols[colIds].any()):
+                for r in rowIds:
+                    if previousCols.__contains__(r):
+                        assignment.append((r, previousCols[r]))
+            elif len(rowIds) == 1 or len(colIds) == 1:
+                k = numpy.flatnonzero(data >= data.max() - _weightTolerance)[0]
+                assignment.append((rowIds[rows[k]], colIds[cols[k]]))
+            else:
+                block = zeros((len(rowIds), len(colIds)), dtype=float)
+                block[rows, cols] = data
+                blocks.append(block)
+                blockIds.append((rowIds, colIds))
         
-        path = os.path.dirname(tempFile)
-        if path == "":
-            listing = os.listdir(".")
+        instrumentation.count("hungarianBlocks", len(blocks))
+        if len(blocks) > 0:
+            instrumentation.record("largestBlockCells", max([b.size for b in blocks]))
+        if jobs > 1 and len(blocks) > 1:
+            pool = multiprocessing.Pool(jobs)
+            try:
+                results = pool.map(_solveDenseBlock, blocks)
+            finally:
+                pool.close()
+                pool.join()
         else:
-            listing = os.listdir(path)
-        for f in listing:
-            f = path + "/" + f
-            if str(f).startswith(tempFile):
-                os.system("rm " + f)
-                #print f, "deleted"
+            results = map(assignsolver.solveDense, blocks)
         
+        for ((rowIds, colIds), blockAssignment) in zip(blockIds, results):
+            for (r, c) in blockAssignment:
+                assignment.append((rowIds[r], colIds[c]))
+        return sorted(assignment)
+
     #===========================================================================
-    # method which finds subset of predictions which also occur in gold standard
+    # method which finds maximum-weight assignment of a dense weight matrix
     #===========================================================================
     @staticmethod
-    def findPredictions(goldFile, predFile):
-        text_gold = open(goldFile, "r")
-        goldLines = text_gold.readlines()
-        text_gold.close()
-    
-        # gold standard words    
-        goldWordSet = set()
-        for goldLine in goldLines:
-            split1 = goldLine.split("\t")
-            word1 = split1[0]
-            goldWordSet.add(word1)
+    def solveDense(weights):
+        weights = numpy.asarray(weights, dtype=float)
+        (rows, cols) = weights.shape
+        if rows == 0 or cols == 0:
+            return list()
         
+        # algorithm assigns every row, therefore rows <= cols is required
+        transposed = rows > cols
+        if transposed:
+            weights = weights.T
+        rowAssign = assignsolver.hungarian(-weights)
         
-        # prediction file
-        predictionDict = dict() 
-        for predLine in open(predFile,'r'):
-            split2 = predLine.split("\t")
-            word2 = split2[0]
-            if goldWordSet.__contains__(word2):
-                segmentationList = split2[1].split(",")
-                lol = list()
-                for segmentation in segmentationList:
-                    segments = re.findall("[^\s]+", segmentation)
-                    lol.append(segments)
-                predictionDict[word2] = lol
-        return predictionDict
-    
+        assignment = list()
+        for (r, c) in enumerate(rowAssign):
+            if weights[r, c] > 0:
+                if transposed:
+                    assignment.append((c, r))
+                else:
+                    assignment.append((r, c))
+        return sorted(assignment)
+
     #===========================================================================
-    # method which reads in gold standard file
+    # method which splits the bipartite graph of the count matrix (gold 
+    # standard rows, predicted columns, edges for non-zero cells) into 
+    # connected components. Returns list of (row ids, col ids, local rows, 
+    # local cols, data) per component.
     #===========================================================================
     @staticmethod
-    def readGoldStandard(goldFile):
-        # gold standard dictionary
-        goldDict = dict() 
-        for line in open(goldFile,'r'):
-            split1 = line.split("\t")
-            word = split1[0]
-            segmentationList = split1[1].split(",")
-            lol = list()
-            for segmentation in segmentationList:
-                segments = re.findall("[^\s]+", segmentation)
-                lol.append(segments)
-            goldDict[word] = lol
-        return goldDict
+    def components(countMatrix):
+        edgeRoot = assignsolver.componentRoots(countMatrix)
+        
+        # group edges by component
+        order = numpy.argsort(edgeRoot, kind="mergesort")
+        bounds = numpy.flatnonzero(numpy.diff(edgeRoot[order])) + 1
+        components = list()
+        for edges in numpy.split(order, bounds):
+            if len(edges) == 0:
+                continue
+            (rowIds, rows) = numpy.unique(countMatrix.rows[edges], return_inverse=True)
+            (colIds, cols) = numpy.unique(countMatrix.cols[edges], return_inverse=True)
+            components.append((rowIds, colIds, rows, cols, countMatrix.data[edges]))
+        return components
 
-################################################################################
-#
-# Class morphassignment       
-# Step 1: global assignment of gold standard to predicted morphemes
-#
-################################################################################
-class morphassignment:
     #===========================================================================
-    # main method for assigning predicted to gold standard morphemes
+    # method which returns the component root of every non-zero cell (edge)
     #===========================================================================
     @staticmethod
-    def main(goldDict, predDict, lpInput, lpOutput, assignFile, saveAssign, verbose):
-        goldMorphIndex = morphassignment.wordSegmentationList2MorphIndex(goldDict)
-        predMorphIndex = morphassignment.wordSegmentationList2MorphIndex(predDict)
+    def componentRoots(countMatrix):
+        (rowNo, colNo) = countMatrix.shape
+        u = countMatrix.rows
+        v = countMatrix.cols + rowNo
         
-        # calc countMatrix
-        countMatrix = morphassignment.calcCountMatrix(goldDict, predDict, 
-                                                      goldMorphIndex, 
-                                                      predMorphIndex)
-        
-        # input file for lp_solver generated
-        morphassignment.writeLPInputFile(countMatrix, lpInput)
-
-        # solve morpheme assignment
-        os.system(_lpSolvePath + " " + lpInput + " > " + lpOutput)
-        
-        # get morpheme assignment dictionary
-        if verbose:
-            print "\nMorpheme Assignment (gold standard => prediction)\n=================================================\n"
-        morphAssignDict = morphassignment.getMorphAssignDict(goldMorphIndex, 
-                                                             predMorphIndex, 
-                                                             lpOutput, verbose)
-        # save assignment if flagged
-        if saveAssign:
-            morphassignment.saveMorphemeAssignment(morphAssignDict, assignFile)        
-
-        # return assignment dictionary
-        return morphAssignDict
+        # hook roots to smallest neighbouring root and shortcut until every
+        # edge connects nodes with the same root
+        parent = numpy.arange(rowNo + colNo)
+        while len(u) > 0:
+            pu = parent[u]
+            pv = parent[v]
+            if (pu == pv).all():
+                break
+            lower = numpy.minimum(pu, pv)
+            numpy.minimum.at(parent, pu, lower)
+            numpy.minimum.at(parent, pv, lower)
+            while True:
+                grandParent = parent[parent]
+                if (grandParent == parent).all():
+                    break
+                parent = grandParent
+        return parent[u]
 
     #===========================================================================
-    # 
+    # method which finds an approximate maximum-weight assignment: non-zero 
+    # cells are visited by decreasing weight (ties by row and column) and 
+    # assigned if neither row nor column is taken yet. Returns sorted list of 
+    # (row, col) pairs, the matching weight and an upper bound of the optimal
+    # weight.
+    # The bound is the value of a feasible solution of the dual linear program
+    # (row and column values u, v >= 0 with u[r] + v[c] >= weight of every 
+    # cell): weights of assigned cells put on their rows and columns are 
+    # feasible, since greedy takes a cell before all lighter cells sharing its
+    # row or column. The values are lowered once rows first and once columns
+    # first, also row maxima and column maxima are feasible. Per component, 
+    # the smallest of these bounds is taken.
     #===========================================================================
     @staticmethod
-    def saveMorphemeAssignment(morphAssignDict, assignFile):
-        tempList = list()
-        for pred in morphAssignDict.keys():
-            gold = morphAssignDict[pred]
-            tempList.append(gold + "\t=>\t" + pred + "\n")
-        tempList = sorted(tempList)
-        resultList = list()
-        resultList.append("#############################################\n")
-        resultList.append("# gold standard labels\t=>\tpredicted labels\n")
-        resultList.append("#############################################\n")
-        resultList.extend(tempList)
+    def greedy(countMatrix):
+        if not isinstance(countMatrix, sparsecountmatrix):
+            countMatrix = sparsecountmatrix.fromDense(countMatrix)
+        (rowNo, colNo) = countMatrix.shape
+        order = numpy.argsort(-countMatrix.data, kind="mergesort")
+        rows = countMatrix.rows[order].tolist()
+        cols = countMatrix.cols[order].tolist()
+        rowTaken = bytearray(rowNo)
+        colTaken = bytearray(colNo)
+        chosen = list()
+        for k in xrange(len(rows)):
+            r = rows[k]
+            c = cols[k]
+            if not rowTaken[r] and not colTaken[c]:
+                rowTaken[r] = 1
+                colTaken[c] = 1
+                chosen.append(k)
+        chosen = order[chosen]
+        assignment = sorted(zip(countMatrix.rows[chosen].tolist(), 
+                                countMatrix.cols[chosen].tolist()))
+        if len(chosen) == 0:
+            return (assignment, 0.0, 0.0)
         
-        f = open(assignFile, 'w')
-        f.writelines(resultList)
-        f.close() 
+        # feasible dual solutions
+        (rows, cols, data) = (countMatrix.rows, countMatrix.cols, countMatrix.data)
+        duals = list()
+        duals.append((assignsolver.lowerDual(rows, data, zeros(colNo)[cols], rowNo), 
+                      zeros(colNo)))
+        duals.append((zeros(rowNo), 
+                      assignsolver.lowerDual(cols, data, zeros(rowNo)[rows], colNo)))
+        u = zeros(rowNo, dtype=float)
+        u[rows[chosen]] = data[chosen]
+        v = zeros(colNo, dtype=float)
+        v[cols[chosen]] = data[chosen]
+        rowFirst = assignsolver.lowerDual(rows, data, v[cols], rowNo)
+        duals.append((rowFirst, 
+                      assignsolver.lowerDual(cols, data, rowFirst[rows], colNo)))
+        colFirst = assignsolver.lowerDual(cols, data, u[rows], colNo)
+        duals.append((assignsolver.lowerDual(rows, data, colFirst[cols], rowNo), 
+                      colFirst))
         
+        # matching weight and dual values per component
+        (roots, edgeComponent) = numpy.unique(assignsolver.componentRoots(countMatrix), 
+                                              return_inverse=True)
+        rowComponent = zeros(rowNo, dtype=int)
+        rowComponent[rows] = edgeComponent
+        colComponent = zeros(colNo, dtype=int)
+        colComponent[cols] = edgeComponent
+        rowIds = numpy.unique(rows)
+        colIds = numpy.unique(cols)
+        weights = numpy.bincount(edgeComponent[chosen], data[chosen], len(roots))
+        bound = 2 * weights
+        for (u, v) in duals:
+            dual = (numpy.bincount(rowComponent[rowIds], u[rowIds], len(roots)) + 
+                    numpy.bincount(colComponent[colIds], v[colIds], len(roots)))
+            bound = numpy.minimum(bound, dual)
+        # rounding aside, the bound of a component is never below its weight
+        bound = numpy.maximum(bound, weights)
+        return (assignment, float(weights.sum()), float(bound.sum()))
+
     #===========================================================================
-    # method which generates morpheme index for gold standard/predictions 
+    # method which returns smallest dual values of one side (rows or columns) 
+    # which are feasible for given values of the cells' other side
     #===========================================================================
     @staticmethod
-    def wordSegmentationList2MorphIndex(wordDict):
-        morphList = list()
-        for word in wordDict:
-            segmentationList = wordDict[word]
-            for segmentation in segmentationList:
-                morphList.extend(segmentation)
-        morphList = list(sorted(set(morphList)))
-        return morphList
+    def lowerDual(index, data, otherValues, size):
+        values = zeros(size, dtype=float)
+        numpy.maximum.at(values, index, data - otherValues)
+        return values
 
     #===========================================================================
-    # method which calculates count matrix: if multiple analyzes exist for gold
-    # standard or predictions, then fraction is added:
-    # => 1/ (#gold standard analyzes * #predicted analyzes)
+    # method which summarizes number and size (rows x cols) of components
     #===========================================================================
     @staticmethod
-    def calcCountMatrix(goldDict, predDict, goldMorphIndex, predMorphIndex):
-        countMatrix = matrix(zeros((len(goldMorphIndex), 
-                                    len(predMorphIndex))), dtype=float)
-        # count matrix  
-        for word in goldDict.keys():
-            try:
-                goldSegLoL = goldDict[word]
-                predSegLoL = predDict[word]
-                ratio = float(1) / (float(len(goldSegLoL)) * float(len(predSegLoL)))
-                
-                for gSegmentation in goldSegLoL:
-                    for gSegment in gSegmentation:
-                        row = list(goldMorphIndex).index(gSegment)
-                        for pSegmentation in predSegLoL:
-                            for pSegment in pSegmentation:
-                                col = list(predMorphIndex).index(pSegment)
-                                countMatrix = tools.incItem(countMatrix, 
-                                                            row, col, ratio)
-            # key error can occur when gold standard word cannot be found in predictions                                
-            except KeyError:
-                pass
-        return countMatrix
+    def componentStats(components):
+        if len(components) == 0:
+            return "components: 0"
+        sizes = [len(c[0]) + len(c[1]) for c in components]
+        largest = components[numpy.argmax(sizes)]
+        
+        # size distribution in powers of two
+        distribution = dict()
+        for size in sizes:
+            upper = 2
+            while upper < size:
+                upper *= 2
+            distribution = tools.incDict(distribution, upper, 1)
+        distString = str()
+        for upper in sorted(distribution.keys()):
+            lower = upper / 2 + 1
+            if lower >= upper:
+                distString += str(upper) + ":" + str(distribution[upper]) + " "
+            else:
+                distString += str(lower) + "-" + str(upper) + ":" + str(distribution[upper]) + " "
+        trivial = len([c for c in components if len(c[0]) == 1 or len(c[1]) == 1])
+        return ("components: " + str(len(components)) + " (trivial: " + 
+                str(trivial) + "), largest: " + str(len(largest[0])) + "x" + 
+                str(len(largest[1])) + ", size distribution: " + distString.strip())
 
     #===========================================================================
-    # method which generates output for lp_solve
+    # method which finds maximum-weight assignments of many small weight 
+    # matrices. Matrices of same shape are stacked and all injective 
+    # assignments are evaluated at once, larger ones are solved one by one.
+    # Returns list of sorted (row, col) pair lists with non-zero weight.
     #===========================================================================
     @staticmethod
-    def writeLPInputFile(countMatrix, lpInput):
-        resultList = list()
+    def solveBatch(weightsList, maxPermutations=5040):
+        shapeDict = dict()
+        for k in range(len(weightsList)):
+            shape = numpy.shape(weightsList[k])
+            shapeDict = tools.add2DictList(shapeDict, shape, k)
         
-        (rows, cols) = countMatrix.shape
-        maxString = "max: " 
-        binString = "bin "
-    
-        for r in range(rows):
-            for c in range(cols):
-                item = "b_" + str(r) + "_" + str(c)
-                cost = tools.getItem(countMatrix, r, c) 
-                maxString += str(cost) + " " + item  + " + "
-                binString += item + ", "
-        maxString = maxString[0:len(maxString)-3] +";"
-        binString = binString[0:len(binString)-2] +";"
-        
-        rowConstraints = str()
-        for r in range(rows):
-            rconstraint = str()
-            for c in range(cols):
-                item = "b_" + str(r) + "_" + str(c)
-                rconstraint += item + " + "
-            rconstraint = rconstraint[0:len(rconstraint)-3] + " <= 1;"
-            rowConstraints += rconstraint + "\n" 
-        rowConstraints = re.sub("\n$", "", rowConstraints)
-        
-        colConstraints = str()
-        for c in range(cols):
-            cconstraint = str()
-            for r in range(rows):
-                item = "b_" + str(r) + "_" + str(c)
-                cconstraint += item + " + "
-            cconstraint = cconstraint[0:len(cconstraint)-3] + " <= 1;"
-            colConstraints += cconstraint + "\n" 
-        colConstraints = re.sub("\n$", "", colConstraints)
-        
-        resultList.append(maxString + "\n\n")
-        resultList.append(rowConstraints + "\n\n")
-        resultList.append(colConstraints + "\n\n")    
-        resultList.append(binString + "\n\n")
+        assignments = [None] * len(weightsList)
+        for ((rows, cols), indices) in shapeDict.items():
+            transposed = rows > cols
+            (n, m) = (cols, rows) if transposed else (rows, cols)
+            permutations = assignsolver.permutations(n, m, maxPermutations)
+            if n == 0 or permutations is None:
+                for k in indices:
+                    assignments[k] = assignsolver.solveDense(weightsList[k])
+                continue
+            
+            # stack: (matrices, n, m) with n <= m
+            stack = numpy.array([numpy.asarray(weightsList[k], dtype=float) for k in indices])
+            if transposed:
+                stack = stack.transpose(0, 2, 1)
+            # totals: (matrices, permutations), evaluated in chunks of 
+            # bounded size
+            chunk = max(1, _batchCells // (len(permutations) * n))
+            best = zeros((len(indices), n), dtype=int)
+            for start in range(0, len(indices), chunk):
+                totals = stack[start:start + chunk, numpy.arange(n), permutations].sum(axis=2)
+                best[start:start + chunk] = permutations[numpy.argmax(totals, axis=1)]
+            for (s, k) in enumerate(indices):
+                assignment = list()
+                for r in range(n):
+                    c = best[s, r]
+                    if stack[s, r, c] > 0:
+                        if transposed:
+                            assignment.append((c, r))
+                        else:
+                            assignment.append((r, c))
+                assignments[k] = sorted(assignment)
+        return assignments
 
-        f = open(lpInput, 'w')
-        f.writelines(resultList)
-        f.close()    
+    #===========================================================================
+    # method which returns all injective maps of n rows to m columns as array
+    # (permutations, n) or None if there are more than maxPermutations
+    #===========================================================================
+    _permutationCache = dict()
     
+    @staticmethod
+    def permutations(n, m, maxPermutations):
+        number = 1
+        for k in range(m - n + 1, m + 1):
+            number *= k
+        if number > maxPermutations:
+            return None
+        key = (n, m)
+        if not assignsolver._permutationCache.__contains__(key):
+            perms = numpy.array(list(itertools.permutations(range(m), n)), dtype=int)
+            assignsolver._permutationCache[key] = perms.reshape((number, n))
+        return assignsolver._permutationCache[key]
+
     #===========================================================================
-    # method which translates lp_solve output into morpheme assignment dict
-    # morpheme assignment dict:    pred morpheme => gold standard morpheme
+    # Hungarian method (shortest augmenting path with potentials) which 
+    # minimizes the total cost of assigning each row of cost matrix to a 
+    # distinct column. Requires rows <= cols. Returns column of each row.
     #===========================================================================
     @staticmethod
-    def getMorphAssignDict(goldMorphIndex, predMorphIndex, lpOutput, verbose):
-        morphAssignDict = dict() 
-        for line in open(lpOutput,'r'):
-            line = re.sub('\n$', '', line)
-            found = re.findall("^(\w+)\s+(\d+)$", line)
-            if found:
-                (assign, bit) = found[0]
-                if int(bit) == 1:
-                    split1 = assign.split("_")
-                    i = int(split1[1])
-                    j = int(split1[2])
-                    goldM = goldMorphIndex[i]
-                    predM = predMorphIndex[j]
-                    morphAssignDict[predM] = goldM
-                    
-                    if verbose:
-                        print goldM, "=>", predM
-                    
-        return morphAssignDict
+    def hungarian(cost):
+        (n, m) = cost.shape
+        u = zeros(n + 1)
+        v = zeros(m + 1)
+        # p[j]: row (1-based) assigned to column j, column 0 is a dummy
+        p = zeros(m + 1, dtype=int)
+        way = zeros(m + 1, dtype=int)
+        for i in range(1, n + 1):
+            p[0] = i
+            j0 = 0
+            minv = numpy.empty(m + 1)
+            minv.fill(numpy.inf)
+            used = zeros(m + 1, dtype=bool)
+            while True:
+                used[j0] = True
+                i0 = p[j0]
+                free = numpy.flatnonzero(~used)
+                cur = cost[i0 - 1, free - 1] - u[i0] - v[free]
+                # comparisons allow for rounding errors, so that ties are 
+                # broken in the same way for slightly different sums
+                better = cur < minv[free] - _weightTolerance
+                minv[free[better]] = cur[better]
+                way[free[better]] = j0
+                freeMinv = minv[free]
+                k = numpy.flatnonzero(freeMinv <= freeMinv.min() + _weightTolerance)[0]
+                j1 = free[k]
+                delta = minv[j1]
+                u[p[used]] += delta
+                v[used] -= delta
+                minv[free] -= delta
+                j0 = j1
+                if p[j0] == 0:
+                    break
+            # augmenting path
+            while j0 != 0:
+                j1 = way[j0]
+                p[j0] = p[j1]
+                j0 = j1
+        
+        rowAssign = zeros(n, dtype=int)
+        for j in range(1, m + 1):
+            if p[j] != 0:
+                rowAssign[p[j] - 1] = j - 1
+        return rowAssign
 
 ################################################################################
 #
-# Class assigneval
-# Step 2: mapping of morpheme assignment to predicted segmentations and 
-# evaluation based on set comparison
+# Class solverbackend
+# Backends which solve the global morpheme assignment. A backend is chosen per
+# run by name, see _solverBackends. Further local solvers can be plugged in by
+# subclassing solverbackend and calling solverbackend.register. Subclasses 
+# define name and
+#     solve(countMatrix, verbose, warmStart=None)
+# which returns sorted list of assigned (row, col) pairs of count matrix.
 #
 ################################################################################
+class solverbackend:
+    name = None
     
-class assigneval:
+    def __init__(self, lpInput=None, lpOutput=None, jobs=1, 
+                 lpSolvePath=None):
+        self.lpInput = lpInput
+        self.lpOutput = lpOutput
+        self.jobs = jobs
+        if lpSolvePath is None:
+            lpSolvePath = _lpSolvePath
+        self.lpSolvePath = lpSolvePath
+        # (matching weight, upper bound of optimal weight) of last solved 
+        # count matrix, None if the backend is exact
+        self.weightBound = None
+
     #===========================================================================
-    # main method which evaluates predictions based on morpheme assignment
+    # method which removes files written by the backend
     #===========================================================================
+    def cleanup(self):
+        pass
+
     @staticmethod
-    def main(goldDict, predDict, morphAssignDict, tempFile, resultFile, saveResult, verbose):
-        tempFile_lpInput = tempFile + ".lpInput"
-        tempFile_lpOutput = tempFile + ".lpOutput"
+    def register(backendClass):
+        _solverBackends[backendClass.name] = backendClass
 
-        if verbose:
-            print "\nAssignment evaluation\n=====================\n"
+    @staticmethod
+    def create(name, **settings):
+        try:
+            backendClass = _solverBackends[name]
+        except KeyError:
+            raise ValueError("unknown solver backend: " + str(name))
+        return backendClass(**settings)
 
-        precision_count = float(0)
-        recall_count = float(0)
+class hungarianbackend(solverbackend):
+    name = "hungarian"
+    
+    @instrumentation.phase("solver")
+    def solve(self, countMatrix, verbose, warmStart=None):
+        return assignsolver.solve(countMatrix, self.jobs, verbose, warmStart)
 
-        exchangedOut = list()
-        for word in goldDict.keys():
-            try:
-                goldSegmentationList = goldDict[word]
-                predSegmentationList = predDict[word]
-                goldNo = len(goldSegmentationList)
-                predNo = len(predSegmentationList)
-                
-                try:
-                    ratio_precision = float(1) / float(predNo)
-                    ratio_recall = float(1) / float(goldNo)
-                    
-                    # simple evaluation
-                    if goldNo == 1 and predNo == 1:
-                        for goldSegmentation in goldSegmentationList:
-                            for predSegmentation in predSegmentationList:
-                                replacedPredSegm = assigneval.replaceLabels(predSegmentation, 
-                                                                            morphAssignDict)            
-                            
-                                # precision = intersection prediction, gold standard / size prediction
-                                precision_fraction = ratio_precision * assigneval.list1ToList2Comparison(list(goldSegmentation), list(replacedPredSegm))
-                                precision_count += precision_fraction
-                
-                                # recall = intersection prediction, gold standard / size gold standard
-                                recall_fraction = ratio_recall * assigneval.list1ToList2Comparison(list(replacedPredSegm), list(goldSegmentation))
-                                recall_count += recall_fraction
-                                
-                                if verbose: print numpy.min([goldNo, predNo]), "alternative(s): p+=", precision_fraction,"r+=", recall_fraction, "gold:", goldSegmentation, "pred:",replacedPredSegm    
+class lpsolvebackend(solverbackend):
+    name = "lpsolve"
     
-                                # add to result list of predicted segmentations with exchanged labels
-                                exchangedOut.append(word + "\t" + 
-                                                    tools.list2string(replacedPredSegm, " ") + "\n")
+    # warm start is not supported, the whole assignment is solved again
+    @instrumentation.phase("solver")
+    def solve(self, countMatrix, verbose, warmStart=None):
+        if self.lpInput is None:
+            self.lpInput = tools.tempFileName(".lpInput")
+        if self.lpOutput is None:
+            self.lpOutput = tools.tempFileName(".lpOutput")
+        # input file for lp_solver generated
+        morphassignment.writeLPInputFile(countMatrix, self.lpInput)
         
-                    # segmentation assignment
-                    else:
-    
-                        (segmentationAssignmentDict, countMatrix) = assigneval.calcCountMatrix_Segmentation(goldSegmentationList, predSegmentationList, morphAssignDict)
-                        morphassignment.writeLPInputFile(countMatrix, tempFile_lpInput)
-    
-                        # solve morpheme assignment
-                        os.system(_lpSolvePath + " " + tempFile_lpInput + " > " + tempFile_lpOutput)
-    
-                        # use assignment
-                        exchangedStr = word + "\t"
-                        for line in open(tempFile_lpOutput,'r'):
-                            line = re.sub('\n$', '', line)
-                            found = re.findall("^(\w+)\s+(\d+)$", line)
-                            if found:
-                                (assign, bit) = found[0]
-                                
-                                if int(bit) == 1:
-                                    split1 = assign.split("_")
-                                    i = int(split1[1])
-                                    j = int(split1[2])
-                                    key = str(i) + "_" + str(j)
-                                    (goldSegmentation, replacedPredSegm) = segmentationAssignmentDict[key]
-                                    
-                                    # precision = intersection prediction, gold standard / size prediction
-                                    precision_fraction = ratio_precision * assigneval.list1ToList2Comparison(list(goldSegmentation), list(replacedPredSegm))
-                                    precision_count += precision_fraction
-                
-                                    # recall = intersection prediction, gold standard / size gold standard
-                                    recall_fraction = ratio_recall * assigneval.list1ToList2Comparison(list(replacedPredSegm), list(goldSegmentation))
-                                    recall_count += recall_fraction
-        
-                                    if verbose: print numpy.min([goldNo, predNo]), "alternative(s): p+=", precision_fraction,"r+=", recall_fraction, "gold:", goldSegmentation, "pred:",replacedPredSegm
-                                        
-                                    exchangedStr += tools.list2string(replacedPredSegm, " ") + ", "
-                    
-                        # add to result list of predicted segmentations with exchanged labels
-                        exchangedStr = exchangedStr[0:len(exchangedStr)-2]                
-                        exchangedOut.append(exchangedStr + "\n")
-                
-                except ZeroDivisionError:
-                    print word, "with gs:", goldSegmentationList, "and ps:", predSegmentationList, "was not evaluated"
-                    pass
-            
-            # if gold standard word is not found in predictions, pass
-            except KeyError:
-                pass
-        # write exchanged prediction
-        if saveResult:
-            f_out = open(resultFile, "w")
-            f_out.writelines(sorted(exchangedOut))
-            f_out.close()
-    
-        # get performance measures and return them
-        (p, r, f) = assigneval.calcPerformanceMeasures(precision_count, recall_count, len(goldDict.keys()), verbose)
-        return (p, r, f)
+        # solve morpheme assignment
+        instrumentation.count("lpSolveCalls")
+        f = open(self.lpOutput, "w")
+        try:
+            status = subprocess.call([self.lpSolvePath, self.lpInput], stdout=f)
+        finally:
+            f.close()
+        if status != 0:
+            raise RuntimeError(self.lpSolvePath + " failed with exit status " + 
+                               str(status) + " on " + self.lpInput)
+        return sorted(morphassignment.readLPOutputFile(self.lpOutput))
+
+    @instrumentation.phase("cleanup")
+    def cleanup(self):
+        for f in (self.lpInput, self.lpOutput):
+            if os.path.exists(f):
+                os.remove(f)
+
+# approximate assignment for quick checks in near-linear time, reports an 
+# upper bound of the optimal matching weight
+class greedybackend(solverbackend):
+    name = "greedy"
     
+    @instrumentation.phase("solver")
+    def solve(self, countMatrix, verbose, warmStart=None):
+        (assignment, weight, bound) = assignsolver.greedy(countMatrix)
+        self.weightBound = (weight, bound)
+        if verbose:
+            print "greedy matching weight:", weight, "upper bound of optimum:", bound, "\n"
+        return assignment
+
+# registered solver backends: name => backend class
+_solverBackends = dict()
+solverbackend.register(hungarianbackend)
+solverbackend.register(lpsolvebackend)
+solverbackend.register(greedybackend)
+
+# module level function, solving components in worker processes
+def _solveDenseBlock(weights):
+    return assignsolver.solveDense(weights)
+
+# module level functions, calculating count matrix of shards in worker 
+# processes
+_countMatrixTables = None
+
+def _initCountMatrixWorker(goldTable, predTable):
+    global _countMatrixTables
+    _countMatrixTables = (goldTable, predTable)
+
+def _countMatrixShard(shard):
+    (goldTable, predTable) = _countMatrixTables
+    (start, stop) = shard
+    return morphassignment.calcTableCountMatrix(goldTable.slice(start, stop), 
+                                                predTable.slice(start, stop))
+
+################################################################################
+#
+# Class sparsecountmatrix
+# Count matrix in coordinate format which only stores non-zero cells
+#
+################################################################################
+class sparsecountmatrix:
     #===========================================================================
-    # method calculates performance measures
+    # rows, cols, data: arrays of non-zero cells, sorted by row and column,
+    # without duplicates
+    #===========================================================================
+    def __init__(self, rows, cols, data, shape):
+        self.rows = rows
+        self.cols = cols
+        self.data = data
+        self.shape = shape
+        self.nnz = len(data)
+        self._lookup = None
+
+    #===========================================================================
+    # method which builds matrix from (row, col, value) triplets, values of 
+    # duplicate cells are summed up
     #===========================================================================
     @staticmethod
-    def calcPerformanceMeasures(precision_count, recall_count, word_count, verbose):
-        precision = float(precision_count) / float(word_count)
-        recall = float(recall_count) / float(word_count)
-        try: fmeasure = 2 * precision * recall / (precision + recall)
-        except ZeroDivisionError: fmeasure = 0
-        
-        if verbose:
-            print "\nCalculation of performance measures\n===================================\n"
-            print "precision (p) = p count / word count =", precision_count, "/", word_count, "=", precision
-            print "recall    (r) = r count / word count =", recall_count, "/", word_count, "=", recall
-            print "f-measure (f) = 2 * p * r / (p + r)  =", fmeasure    
-                     
-        return (precision, recall, fmeasure)
-     
+    def fromTriplets(rows, cols, values, shape):
+        rows = numpy.asarray(rows, dtype=int)
+        cols = numpy.asarray(cols, dtype=int)
+        values = numpy.asarray(values, dtype=float)
+        keys = rows * shape[1] + cols
+        (uniqueKeys, inverse) = numpy.unique(keys, return_inverse=True)
+        data = numpy.bincount(inverse, weights=values, minlength=len(uniqueKeys))
+        nonZero = data != 0
+        uniqueKeys = uniqueKeys[nonZero]
+        return sparsecountmatrix(uniqueKeys // shape[1], uniqueKeys % shape[1], 
+                                 data[nonZero], shape)
+
     #===========================================================================
-    # method which replaces predicted labels by assigned gold standard labels
+    # method which adds up matrices of the same shape, cells are summed up in
+    # order of the matrices
     #===========================================================================
     @staticmethod
-    def replaceLabels(predSegmentation, morphAssignDict):
-        newList = list()
-        assignmentSet = morphAssignDict.keys()
-        for predLabel in predSegmentation:
-            if assignmentSet.__contains__(predLabel):
-                goldLabel = morphAssignDict[predLabel]
-                newList.append(goldLabel)
-            else:
-                newList.append(predLabel)
-        return newList
+    def sum(matrices, shape):
+        if len(matrices) == 1:
+            return matrices[0]
+        return sparsecountmatrix.fromTriplets(numpy.concatenate([m.rows for m in matrices] + [[]]), 
+                                              numpy.concatenate([m.cols for m in matrices] + [[]]), 
+                                              numpy.concatenate([m.data for m in matrices] + [[]]), 
+                                              shape)
+
+    @staticmethod
+    def fromDense(countMatrix):
+        dense = numpy.asarray(countMatrix, dtype=float)
+        (rows, cols) = numpy.nonzero(dense)
+        return sparsecountmatrix(rows, cols, dense[rows, cols], dense.shape)
+
+    def getItem(self, row, col):
+        if self._lookup is None:
+            self._lookup = dict(zip(zip(self.rows.tolist(), self.cols.tolist()), 
+                                    self.data.tolist()))
+        return self._lookup.get((row, col), float(0))
+
+    def toarray(self):
+        dense = zeros(self.shape, dtype=float)
+        dense[self.rows, self.cols] = self.data
+        return dense
+
+    def todense(self):
+        return matrix(self.toarray())
+
+################################################################################
+#
+# Class segmentationtable
+# Analyses of a list of words with morphemes interned to integer ids, stored 
+# in flat arrays: the alternatives of word w are wordOffsets[w] to 
+# wordOffsets[w + 1] - 1, the morphemes of alternative a are 
+# morphIds[altOffsets[a]:altOffsets[a + 1]] as positions in morphIndex.
+#
+################################################################################
+class segmentationtable:
+    def __init__(self, words, wordOffsets, altOffsets, morphIds, morphIndex):
+        self.words = words
+        self.wordOffsets = wordOffsets
+        self.altOffsets = altOffsets
+        self.morphIds = morphIds
+        self.morphIndex = morphIndex
+        self._rows = None
 
     #===========================================================================
-    # method which performs set comparison of list1 to list2
+    # method which builds table of words (default: all words) of 
+    # wordDict: word => list of analyses. morphIndex defaults to the sorted 
+    # morphemes of these words.
     #===========================================================================
     @staticmethod
-    def list1ToList2Comparison(list1, list2):
-        list1 = list(list1)
-        list2 = list(list2)
-        found = 0
-        list2Size = float(len(list2))
-        for l in list1:
-            if list2.__contains__(l):
-                list2.remove(l)
-                found += 1
-        ratio = float(found) / list2Size
-        return ratio
+    def fromDict(wordDict, words=None, morphIndex=None):
+        if words is None:
+            words = wordDict.keys()
+        if morphIndex is None:
+            morphIndex = sorted(set([m for word in words 
+                                     for segmentation in wordDict[word] 
+                                     for m in segmentation]))
+        ids = dict((m, i) for (i, m) in enumerate(morphIndex))
+        wordOffsets = [0]
+        altOffsets = [0]
+        morphIds = list()
+        for word in words:
+            for segmentation in wordDict[word]:
+                morphIds.extend([ids[m] for m in segmentation])
+                altOffsets.append(len(morphIds))
+            wordOffsets.append(len(altOffsets) - 1)
+        return segmentationtable(list(words), 
+                                 numpy.array(wordOffsets, dtype=numpy.int64), 
+                                 numpy.array(altOffsets, dtype=numpy.int64), 
+                                 numpy.array(morphIds, dtype=numpy.int32), 
+                                 morphIndex)
 
     #===========================================================================
-    # 
+    # method which builds tables of the words of goldDict which are also in 
+    # predDict, in order of goldDict. predMorphIndex defaults to the sorted 
+    # morphemes of all predictions.
     #===========================================================================
     @staticmethod
-    def calcCountMatrix_Segmentation(goldSegmentationList, predSegmentationList, predGoldDict):
-        countMatrix = matrix(zeros((len(goldSegmentationList), len(predSegmentationList))), dtype=float)
-        segmentationAssignmentDict = dict()
-        
-        for i in range(len(goldSegmentationList)):
-            goldSegmentation = goldSegmentationList[i]
-            for j in range(len(predSegmentationList)):
-                predSegmentation = predSegmentationList[j]
-                replacedPredSegm = assigneval.replaceLabels(predSegmentation, predGoldDict)
-                key = str(i) +"_" + str(j)
-                segmentationAssignmentDict[key] = (goldSegmentation, replacedPredSegm)
-                count = assigneval.list1ToList2Comparison(goldSegmentation, replacedPredSegm)
-                countMatrix = tools.incItem(countMatrix, i, j, count)
-        return (segmentationAssignmentDict, countMatrix)
+    def fromDicts(goldDict, predDict, goldMorphIndex=None, predMorphIndex=None):
+        words = [word for word in goldDict.keys() if predDict.__contains__(word)]
+        if goldMorphIndex is None:
+            goldMorphIndex = morphassignment.wordSegmentationList2MorphIndex(goldDict)
+        if predMorphIndex is None:
+            predMorphIndex = morphassignment.wordSegmentationList2MorphIndex(predDict)
+        return (segmentationtable.fromDict(goldDict, words, goldMorphIndex), 
+                segmentationtable.fromDict(predDict, words, predMorphIndex))
+
+    #===========================================================================
+    # method which returns table of words (all in this table) in given order
+    #===========================================================================
+    def select(self, words):
+        if self._rows is None:
+            self._rows = dict((word, w) for (w, word) in enumerate(self.words))
+        rows = numpy.array([self._rows[word] for word in words], dtype=numpy.int64)
+        altCounts = self.wordOffsets[rows + 1] - self.wordOffsets[rows]
+        alternatives = segmentationtable.ranges(self.wordOffsets[rows], altCounts)
+        lengths = self.altOffsets[alternatives + 1] - self.altOffsets[alternatives]
+        tokens = segmentationtable.ranges(self.altOffsets[alternatives], lengths)
+        return segmentationtable(list(words), segmentationtable.offsets(altCounts), 
+                                 segmentationtable.offsets(lengths), 
+                                 numpy.asarray(self.morphIds)[tokens], 
+                                 self.morphIndex)
+
+    #===========================================================================
+    # method which returns table of consecutive words start to stop - 1
+    #===========================================================================
+    def slice(self, start, stop):
+        wordOffsets = numpy.asarray(self.wordOffsets[start:stop + 1])
+        altOffsets = numpy.asarray(self.altOffsets[wordOffsets[0]:wordOffsets[-1] + 1])
+        return segmentationtable(self.words[start:stop], 
+                                 wordOffsets - wordOffsets[0], 
+                                 altOffsets - altOffsets[0], 
+                                 self.morphIds[altOffsets[0]:altOffsets[-1]], 
+                                 self.morphIndex)
+
+    #===========================================================================
+    # method which returns dict: word => list of analyses (lists of morphemes)
+    #===========================================================================
+    def toDict(self):
+        morphIndex = self.morphIndex
+        morphIds = numpy.asarray(self.morphIds).tolist()
+        altOffsets = numpy.asarray(self.altOffsets).tolist()
+        wordOffsets = numpy.asarray(self.wordOffsets).tolist()
+        alternatives = [[morphIndex[i] for i in morphIds[altOffsets[a]:altOffsets[a + 1]]] 
+                        for a in range(len(altOffsets) - 1)]
+        wordDict = dict()
+        for (w, word) in enumerate(self.words):
+            wordDict[word] = alternatives[wordOffsets[w]:wordOffsets[w + 1]]
+        return wordDict
+
+    # analyses of word w (lists of morphemes)
+    def analyses(self, w):
+        return [[self.morphIndex[i] for i in self.morphIds[self.altOffsets[a]:self.altOffsets[a + 1]]] 
+                for a in range(self.wordOffsets[w], self.wordOffsets[w + 1])]
+
+    # number of alternatives of each word
+    def altCounts(self):
+        return numpy.diff(self.wordOffsets)
+
+    # number of morphemes of each alternative
+    def altLengths(self):
+        return numpy.diff(self.altOffsets)
+
+    # offset of the first morpheme of each word and number of its morphemes
+    # (all alternatives)
+    def tokenRanges(self):
+        bounds = numpy.asarray(self.altOffsets)[self.wordOffsets]
+        return (bounds[:-1], numpy.diff(bounds))
+
+    #===========================================================================
+    # method which returns concatenation of ranges start to start + count - 1
+    #===========================================================================
+    @staticmethod
+    def ranges(starts, counts):
+        total = counts.sum()
+        return numpy.repeat(starts - (numpy.cumsum(counts) - counts), counts) + numpy.arange(total)
+
+    # offsets of consecutive blocks of given sizes
+    @staticmethod
+    def offsets(counts):
+        return numpy.concatenate(([0], numpy.cumsum(counts))).astype(numpy.int64)
 
 ################################################################################
 #
@@ -569,6 +3367,8 @@ class tools:
     
     @staticmethod
     def getItem(m1, row, col):
+        if isinstance(m1, sparsecountmatrix):
+            return m1.getItem(row, col)
         return m1.getA()[row][col]
         
     @staticmethod    
@@ -579,6 +3379,74 @@ class tools:
         m1.getA()[row][col] = value
         return m1
     
+    #===========================================================================
+    # method which returns peak resident memory of process in bytes (0 if 
+    # not available), ru_maxrss is given in kilobytes on Linux and in bytes 
+    # on Mac OS X
+    #===========================================================================
+    @staticmethod
+    def peakMemory():
+        if resource is None:
+            return 0
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        if os.uname()[0] == "Darwin":
+            return peak
+        return peak * 1024
+
+    # byte string of (unicode) string, e.g. of JSON request
+    @staticmethod
+    def encode(string):
+        if isinstance(string, unicode):
+            return string.encode("utf-8")
+        return string
+
+    #===========================================================================
+    # method which opens a file for reading, gzip, bz2 and xz compressed files
+    # are recognised by their magic number and decompressed transparently
+    #===========================================================================
+    @staticmethod
+    def openFile(fileName):
+        f = open(fileName, 'rb')
+        magic = f.read(6)
+        f.close()
+        if magic.startswith("\x1f\x8b"):
+            return io.BufferedReader(gzip.GzipFile(fileName, 'rb'))
+        if magic.startswith("BZh"):
+            return bz2.BZ2File(fileName, 'r')
+        if magic.startswith("\xfd7zXZ\x00"):
+            if lzma is None:
+                raise IOError("module lzma (or backports.lzma) is required for xz compressed file " + fileName)
+            return lzma.LZMAFile(fileName, 'rb')
+        return open(fileName, 'r')
+
+    @staticmethod
+    def fileHash(fileName):
+        h = hashlib.sha1()
+        f = open(fileName, 'rb')
+        block = f.read(1 << 20)
+        while block:
+            h.update(block)
+            block = f.read(1 << 20)
+        f.close()
+        return h.hexdigest()
+    
+    #===========================================================================
+    # method which hashes word => list of analyses dict independent of order
+    #===========================================================================
+    @staticmethod
+    def dictHash(wordDict):
+        h = hashlib.sha1()
+        for word in sorted(wordDict.keys()):
+            analyses = [tools.list2string(a, " ") for a in wordDict[word]]
+            h.update(word + "\t" + tools.list2string(analyses, ", ") + "\n")
+        return h.hexdigest()
+    
+    @staticmethod
+    def tempFileName(suffix):
+        (fd, name) = tempfile.mkstemp(suffix=suffix, prefix="emma")
+        os.close(fd)
+        return name
+    
     @staticmethod
     def list2string(llist, delimiter):
         s = str()
@@ -591,27 +3459,82 @@ class tools:
 # Option parser
 #
 ################################################################################
-usage ="%prog -g goldFile -p predFile [-a save assignment -r save result -v verbose -s short result]"
-usage +="\n       Input files in format of Morpho Challenge results."
-usage +="\n       Example: word [tab] analysis 1[morpheme space]*, ..., analysis n\n"
-usage +="\nCopyright (C) 2010 Sebastian Spiegler, spiegler@cs.bris.ac.uk\nThis program is under GNU General Public License version 3.\nSee: <http://www.gnu.org/licenses/>.\n"
-usage +="\nEvaluation method for comparing gold standard morpheme analyses with predicted analyses for words in a word list.\n"
-parser = OptionParser(usage=usage, version="%prog 1.0")
-parser.add_option("-g", "--goldFile", action="store", type="string", dest="goldFile", help="gold standard file")
-parser.add_option("-p", "--predFile", action="store", type="string", dest="predFile", help="prediction file")
-parser.add_option("-a", "--saveAssign", action="store_true", dest="saveAssign", help="flag for saving morpheme assignments")
-parser.add_option("-r", "--saveResult", action="store_true", dest="saveResult", help="flag for saving prediction file with gold standard morphemes labels")
-parser.add_option("-v", "--verbose", action="store_true", dest="verbose", help="verbose, prints out all information")
-parser.add_option("-s", "--short", action="store_true", dest="short", help="short result, prints precision, recall, f-measure separated by tab")
-
-(options, args) = parser.parse_args()
-if options.goldFile and options.predFile:
-    goldFile=options.goldFile
-    predFile=options.predFile
-    saveAssign=options.saveAssign
-    saveResult=options.saveResult
-    verbose=options.verbose
-    short=options.short
-    main_class.main(goldFile, predFile, saveAssign, saveResult, verbose, short)    
-else:
-    parser.print_help()
\ No newline at end of file
+if __name__ == "__main__":
+    usage ="%prog -g goldFile -p predFile [-a save assignment -r save result -v verbose -s short result -l solver -L lp_solve path -j jobs -k chunkWords -S strata -b resamples -c comparePredFile -B boundaries]"
+    usage +="\n       %prog -g goldFile -m predDirectory|'predGlob' [-t tableFile -l solver -L lp_solve path -j jobs]"
+    usage +="\n       %prog -D [-g goldFile,... --socket socketPath -l solver -L lp_solve path -j jobs]"
+    usage +="\n       Input files in format of Morpho Challenge results."
+    usage +="\n       Example: word [tab] analysis 1[morpheme space]*, ..., analysis n\n"
+    usage +="\nCopyright (C) 2010 Sebastian Spiegler, spiegler@cs.bris.ac.uk\nThis program is under GNU General Public License version 3.\nSee: <http://www.gnu.org/licenses/>.\n"
+    usage +="\nEvaluation method for comparing gold standard morpheme analyses with predicted analyses for words in a word list.\n"
+    parser = OptionParser(usage=usage, version="%prog 1.0")
+    parser.add_option("-g", "--goldFile", action="store", type="string", dest="goldFile", help="gold standard file")
+    parser.add_option("-p", "--predFile", action="store", type="string", dest="predFile", help="prediction file")
+    parser.add_option("-a", "--saveAssign", action="store_true", dest="saveAssign", help="flag for saving morpheme assignments")
+    parser.add_option("-r", "--saveResult", action="store_true", dest="saveResult", help="flag for saving prediction file with gold standard morphemes labels")
+    parser.add_option("-v", "--verbose", action="store_true", dest="verbose", help="verbose, prints out all information")
+    parser.add_option("-s", "--short", action="store_true", dest="short", help="short result, prints precision, recall, f-measure separated by tab")
+    parser.add_option("-l", "--solver", action="store", type="choice", choices=sorted(_solverBackends.keys()), dest="solver", help="solver backend for morpheme assignment: lpsolve (external lp_solve, default), hungarian (in-process, default of ranking -m and daemon -D) or greedy (approximate for quick checks, reports optimality gap)")
+    parser.add_option("-L", "--lpSolvePath", action="store", type="string", dest="lpSolvePath", help="executable of lp_solve (default: " + _lpSolvePath + ")")
+    parser.add_option("-j", "--jobs", action="store", type="int", dest="jobs", help="number of processes calculating shards of the count matrix and solving components of the morpheme assignment in parallel (hungarian solver, default: 1), or evaluating prediction files in parallel (-m, default: number of cores)")
+    parser.add_option("-i", "--stateFile", action="store", type="string", dest="stateFile", help="state file of incremental evaluation: if it holds the state of a previous evaluation, only changes of predictions are evaluated (no verbose output)")
+    parser.add_option("-k", "--chunkWords", action="store", type="int", dest="chunkWords", help="gold standard is not loaded but read from disk in chunks of this number of words (no cache, verbose output, result file or state file)")
+    parser.add_option("-B", "--boundaries", action="store_true", dest="boundaries", help="unlabelled evaluation of morph boundaries of segmentations (e.g. gold standard WordListSegmented.txt) instead of morpheme assignment")
+    parser.add_option("-S", "--strata", action="append", type="string", dest="strataSpecs", help="scores per stratum of words, computed with the same morpheme assignment: built-in length or alternatives (number of gold standard alternatives), or file with lines: word [tab] stratum (repeatable)")
+    parser.add_option("-b", "--bootstrap", action="store", type="int", dest="resamples", default=0, help="number of bootstrap resamples for confidence intervals of precision, recall and f-measure")
+    parser.add_option("-c", "--comparePred", action="store", type="string", dest="comparePred", help="second prediction file which is compared to predFile by a paired bootstrap test (default: 1000 resamples)")
+    parser.add_option("--confidence", action="store", type="float", dest="confidence", default=0.95, help="level of confidence intervals (default: 0.95)")
+    parser.add_option("--report", action="store", type="string", dest="reportFile", help="JSON report of time, calls and peak memory of evaluation phases and counters (not with -D --socket)")
+    parser.add_option("--profile", action="store", type="string", dest="profileFile", help="cProfile statistics of evaluation (see module pstats, not with -D --socket)")
+    parser.add_option("-D", "--daemon", action="store_true", dest="daemon", help="resident service which keeps gold standards (-g, comma-separated) loaded and evaluates JSON requests read line by line from stdin")
+    parser.add_option("--socket", action="store", type="string", dest="socketPath", help="Unix socket on which the daemon (-D) serves requests instead of stdin")
+    parser.add_option("-m", "--multiPred", action="store", type="string", dest="multiPred", help="directory or glob pattern of prediction files which are all evaluated and ranked")
+    parser.add_option("-n", "--noCache", action="store_true", dest="noCache", help="do not use on-disk caches")
+    parser.add_option("--clearCache", action="store_true", dest="clearCache", help="remove gold standard snapshots and cached results")
+    parser.add_option("-C", "--cacheDir", action="store", type="string", dest="cacheDir", help="directory of on-disk caches (default: " + _cacheDir + ")")
+    parser.add_option("-t", "--tableFile", action="store", type="string", dest="tableFile", help="ranked table of prediction files (-m), default: printed")
+
+    (options, args) = parser.parse_args()
+    if options.daemon and options.socketPath and (options.reportFile or options.profileFile):
+        parser.error("options --report and --profile cannot be combined with -D --socket")
+    if options.reportFile or options.profileFile:
+        instrumentation.enable(options.profileFile)
+    if options.clearCache:
+        goldcache.clear(options.cacheDir)
+        resultcache.clear(options.cacheDir)
+    if options.goldFile and options.predFile:
+        goldFile=options.goldFile
+        predFile=options.predFile
+        saveAssign=options.saveAssign
+        saveResult=options.saveResult
+        verbose=options.verbose
+        short=options.short
+        solver=options.solver or "lpsolve"
+        jobs=options.jobs or 1
+        lpSolvePath=options.lpSolvePath
+        useCache=not options.noCache
+        cacheDir=options.cacheDir
+        stateFile=options.stateFile
+        resamples=options.resamples
+        comparePred=options.comparePred
+        confidence=options.confidence
+        chunkWords=options.chunkWords
+        if chunkWords and (saveResult or verbose or stateFile):
+            parser.error("option -k cannot be combined with -r, -v or -i")
+        boundaries=options.boundaries
+        if boundaries and (saveAssign or saveResult or verbose or stateFile or chunkWords or options.strataSpecs or resamples or comparePred):
+            parser.error("option -B can only be combined with -s, -n and -C")
+        strataSpecs=options.strataSpecs
+        main_class.main(goldFile, predFile, saveAssign, saveResult, verbose, short, solver, jobs, lpSolvePath, useCache, cacheDir, stateFile, resamples, comparePred, confidence, chunkWords, strataSpecs, boundaries)    
+    elif options.goldFile and options.multiPred:
+        leaderboard.main(options.goldFile, options.multiPred, options.tableFile, 
+                         options.solver or "hungarian", options.jobs, options.lpSolvePath, 
+                         not options.noCache, options.cacheDir)
+    elif options.daemon:
+        goldFiles = [goldFile for goldFile in (options.goldFile or "").split(",") if goldFile]
+        daemon.main(goldFiles, options.socketPath, 
+                    options.solver or "hungarian", options.jobs or 1, 
+                    options.lpSolvePath, not options.noCache, options.cacheDir)
+    elif not options.clearCache:
+        parser.print_help()
+    instrumentation.finish(options.reportFile)
\ No newline at end of file
@@ -0,0 +1,502 @@
+#!/usr/bin/python
+from optparse import OptionParser
+import re
+import os
+import sys
+import time
+import json
+import random
+import zlib
+import shutil
+import tarfile
+import tempfile
+import platform
+import subprocess
+import numpy
+import EMMA
+
+'''
+Benchmark suite for EMMA which measures how the evaluation scales with the
+number of words, the size of the predicted label inventory and the number of
+alternative analyses per word.
+
+    ----------------------------------------------------------------------
+    This program is free software: you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    This program is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+    ----------------------------------------------------------------------
+
+Gold standard and predictions are generated from the Ukwabelana word lists:
+the labels of WordListLabelled are the gold standard analyses, the segments of
+WordListSegmented are the predicted analyses. For each configuration
+    words:        number of words, words beyond the size of the word list
+                  are copies of words whose predicted stem is renamed, so
+                  that the predicted inventory grows with the vocabulary
+    labels:       size of the predicted label inventory, segments are hashed
+                  to this number of labels (0: segments are kept)
+    alternatives: number of alternative analyses per word in gold standard
+                  and predictions, missing alternatives are perturbations of
+                  the first one (label dropped, segments merged or split)
+the files are written and evaluated phase by phase in a fresh process:
+    readGold, readPredictions, tables, countMatrix, writeLP, solve, assignEval
+Wall time and peak resident memory after each phase are recorded and written
+as JSON, together with the versions of EMMA, python and numpy. A previous
+JSON file can be given for comparison.
+
+The sweep varies one dimension at a time, the other two are kept at the first
+value of their lists (option "--grid": all combinations).
+'''
+################################################################################
+#
+# Important variables
+#
+################################################################################
+
+# corpus archive and word lists in archive
+_corpusArchive = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                              "UkwabelanaCorpus.tar.gz")
+_labelledFile = "2010.07.17.WordListLabelled.txt"
+_segmentedFile = "2010.07.17.WordListSegmented.txt"
+
+# version of result format
+_benchmarkVersion = 1
+
+# phases in order of evaluation
+_phases = ("readGold", "readPredictions", "tables", "countMatrix", "writeLP",
+           "solve", "assignEval")
+
+################################################################################
+#
+# Class benchmark
+#
+################################################################################
+class benchmark:
+    #===========================================================================
+    # main method which runs all configurations, prints summary and writes
+    # results to outFile
+    #===========================================================================
+    @staticmethod
+    def main(labelledFile, segmentedFile, outFile, wordCounts, labelCounts,
+             altCounts, solvers, repeat, grid, seed, compareFile):
+        tempDir = tempfile.mkdtemp(prefix="emmabench")
+        try:
+            if labelledFile is None or segmentedFile is None:
+                (labelledFile, segmentedFile) = corpus.extract(_corpusArchive,
+                                                               tempDir)
+            results = list()
+            for config in benchmark.configurations(wordCounts, labelCounts,
+                                                   altCounts, solvers, grid):
+                config["seed"] = seed
+                runs = list()
+                for r in range(repeat):
+                    runs.append(benchmark.runWorker(config, labelledFile,
+                                                    segmentedFile, tempDir))
+                result = benchmark.combineRuns(config, runs)
+                results.append(result)
+                print benchmark.summaryLine(result)
+        finally:
+            shutil.rmtree(tempDir, True)
+
+        report = dict(version=_benchmarkVersion,
+                      created=time.strftime("%Y-%m-%dT%H:%M:%S"),
+                      environment=benchmark.environment(),
+                      repeat=repeat, results=results)
+        if outFile:
+            f = open(outFile, 'w')
+            json.dump(report, f, indent=1, sort_keys=True)
+            f.close()
+        if compareFile:
+            f = open(compareFile, 'r')
+            baseline = json.load(f)
+            f.close()
+            print "".join(benchmark.comparisonTable(baseline, report))
+        return report
+
+    #===========================================================================
+    # method which lists configurations: one dimension is varied at a time
+    # with the others at their first value, or all combinations (grid)
+    #===========================================================================
+    @staticmethod
+    def configurations(wordCounts, labelCounts, altCounts, solvers, grid):
+        points = list()
+        if grid:
+            for w in wordCounts:
+                for l in labelCounts:
+                    for a in altCounts:
+                        points.append((w, l, a))
+        else:
+            for w in wordCounts:
+                points.append((w, labelCounts[0], altCounts[0]))
+            for l in labelCounts[1:]:
+                points.append((wordCounts[0], l, altCounts[0]))
+            for a in altCounts[1:]:
+                points.append((wordCounts[0], labelCounts[0], a))
+        configs = list()
+        for solver in solvers:
+            for (w, l, a) in points:
+                configs.append(dict(words=w, labels=l, alternatives=a,
+                                    solver=solver))
+        return configs
+
+    #===========================================================================
+    # method which runs configuration in a fresh process, so that peak memory
+    # is measured for this configuration only
+    #===========================================================================
+    @staticmethod
+    def runWorker(config, labelledFile, segmentedFile, tempDir):
+        (fd, workerOut) = tempfile.mkstemp(suffix=".json", dir=tempDir)
+        os.close(fd)
+        subprocess.check_call([sys.executable, os.path.abspath(__file__),
+                               "--worker", json.dumps(config),
+                               "--workerOut", workerOut,
+                               "--labelledFile", labelledFile,
+                               "--segmentedFile", segmentedFile])
+        f = open(workerOut, 'r')
+        run = json.load(f)
+        f.close()
+        os.remove(workerOut)
+        return run
+
+    #===========================================================================
+    # method which combines repeated runs: minimum time and maximum memory
+    # of each phase
+    #===========================================================================
+    @staticmethod
+    def combineRuns(config, runs):
+        result = dict(config)
+        result["phases"] = dict()
+        for phase in runs[0]["phases"].keys():
+            result["phases"][phase] = dict(seconds=min([run["phases"][phase]["seconds"] for run in runs]),
+                                           peakMemory=max([run["phases"][phase]["peakMemory"] for run in runs]))
+        result["seconds"] = sum([p["seconds"] for p in result["phases"].values()])
+        result["peakMemory"] = max([p["peakMemory"] for p in result["phases"].values()])
+        result["counters"] = runs[0]["counters"]
+        result["scores"] = runs[0]["scores"]
+        return result
+
+    #===========================================================================
+    # method which returns versions of EMMA, python, numpy and machine
+    #===========================================================================
+    @staticmethod
+    def environment():
+        emmaFile = os.path.splitext(EMMA.__file__)[0] + ".py"
+        environment = dict(python=platform.python_version(),
+                           numpy=numpy.__version__,
+                           machine=platform.platform(),
+                           emmaSha1=EMMA.tools.fileHash(emmaFile))
+        try:
+            git = subprocess.Popen(["git", "rev-parse", "HEAD"],
+                                   cwd=os.path.dirname(os.path.abspath(emmaFile)),
+                                   stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+            commit = git.communicate()[0].strip()
+            if git.returncode == 0:
+                environment["gitCommit"] = commit
+        except OSError:
+            pass
+        return environment
+
+    @staticmethod
+    def summaryLine(result):
+        line = "words %6d labels %6d alternatives %2d %-10s total %8.3fs peak %7.1fMB |" % (
+            result["words"], result["labels"], result["alternatives"],
+            result["solver"], result["seconds"], result["peakMemory"] / 1048576.0)
+        for phase in _phases:
+            if result["phases"].__contains__(phase):
+                line += " %s %.3fs" % (phase, result["phases"][phase]["seconds"])
+        return line
+
+    #===========================================================================
+    # method which generates lines of table comparing time and memory of
+    # configurations found in both reports (ratio current / baseline)
+    #===========================================================================
+    @staticmethod
+    def comparisonTable(baseline, report):
+        key = lambda r: (r["words"], r["labels"], r["alternatives"], r["solver"])
+        baselineResults = dict((key(r), r) for r in baseline["results"])
+        table = list()
+        table.append("\n# comparison with baseline (ratio current / baseline)\n")
+        table.append("# words\tlabels\talternatives\tsolver\ttime\tmemory\t" + "\t".join(_phases) + "\n")
+        for result in report["results"]:
+            if not baselineResults.__contains__(key(result)):
+                continue
+            old = baselineResults[key(result)]
+            ratios = [benchmark.ratio(result["seconds"], old["seconds"]),
+                      benchmark.ratio(result["peakMemory"], old["peakMemory"])]
+            for phase in _phases:
+                if result["phases"].__contains__(phase) and old["phases"].__contains__(phase):
+                    ratios.append(benchmark.ratio(result["phases"][phase]["seconds"],
+                                                  old["phases"][phase]["seconds"]))
+                else:
+                    ratios.append("-")
+            table.append("\t".join([str(k) for k in key(result)] + ratios) + "\n")
+        return table
+
+    @staticmethod
+    def ratio(current, old):
+        if old == 0:
+            return "-"
+        return "%.2f" % (float(current) / old)
+
+################################################################################
+#
+# Class worker
+# Evaluation of one configuration phase by phase
+#
+################################################################################
+class worker:
+    #===========================================================================
+    # main method which generates data of configuration, evaluates it and
+    # writes measurements to workerOut
+    #===========================================================================
+    @staticmethod
+    def main(config, labelledFile, segmentedFile, workerOut):
+        tempDir = tempfile.mkdtemp(prefix="emmabench")
+        try:
+            (goldDict, predDict) = corpus.read(labelledFile, segmentedFile)
+            (goldLines, predLines) = corpus.synthesize(goldDict, predDict,
+                                                       config["words"],
+                                                       config["labels"],
+                                                       config["alternatives"],
+                                                       config["seed"])
+            goldFile = os.path.join(tempDir, "gold.txt")
+            predFile = os.path.join(tempDir, "pred.txt")
+            for (fileName, lines) in ((goldFile, goldLines), (predFile, predLines)):
+                f = open(fileName, 'w')
+                f.writelines(lines)
+                f.close()
+            del goldDict, predDict, goldLines, predLines
+            run = worker.evaluate(goldFile, predFile, config["solver"], tempDir)
+        finally:
+            shutil.rmtree(tempDir, True)
+        f = open(workerOut, 'w')
+        json.dump(run, f)
+        f.close()
+
+    #===========================================================================
+    # method which evaluates prediction file phase by phase
+    #===========================================================================
+    @staticmethod
+    def evaluate(goldFile, predFile, solver, tempDir):
+        phases = dict()
+        clock = worker.clock(phases)
+
+        clock("readGold")
+        gold = EMMA.GoldStandard(EMMA.main_class.readGoldStandard(goldFile), goldFile)
+        clock("readPredictions")
+        predDict = gold.findPredictions(predFile)
+        clock("tables")
+        (goldTable, predTable) = gold.getTables(predDict)
+        clock("countMatrix")
+        countMatrix = EMMA.morphassignment.calcTableCountMatrix(goldTable, predTable)
+        clock("writeLP")
+        EMMA.morphassignment.writeLPInputFile(countMatrix, os.path.join(tempDir, "pred.lpInput"))
+        clock("solve")
+        backend = EMMA.solverbackend.create(solver,
+                                            lpInput=os.path.join(tempDir, "solve.lpInput"),
+                                            lpOutput=os.path.join(tempDir, "solve.lpOutput"))
+        assignment = backend.solve(countMatrix, False)
+        morphAssignDict = EMMA.morphassignment.assignment2MorphAssignDict(goldTable.morphIndex,
+                                                                          predTable.morphIndex,
+                                                                          assignment, False)
+        clock("assignEval")
+        (precision, recall, fmeasure) = EMMA.assigneval.main(gold.getGoldDict(), predDict,
+                                                             morphAssignDict, None,
+                                                             False, False, None,
+                                                             goldTable, predTable)
+        clock(None)
+
+        counters = dict(goldWords=len(gold.getGoldDict()),
+                        predWords=len(predDict),
+                        goldAlternatives=len(goldTable.altOffsets) - 1,
+                        predAlternatives=len(predTable.altOffsets) - 1,
+                        goldMorphemes=len(goldTable.morphIndex),
+                        predMorphemes=len(predTable.morphIndex),
+                        matrixRows=countMatrix.shape[0],
+                        matrixCols=countMatrix.shape[1],
+                        matrixNonZeros=countMatrix.nnz,
+                        lpInputBytes=os.path.getsize(os.path.join(tempDir, "pred.lpInput")),
+                        assignedMorphemes=len(morphAssignDict))
+        scores = dict(precision=precision, recall=recall, fmeasure=fmeasure)
+        return dict(phases=phases, counters=counters, scores=scores)
+
+    #===========================================================================
+    # method which returns function ending the current phase and starting the
+    # named one (None: no further phase), time and peak memory of each ended
+    # phase are stored in phases
+    #===========================================================================
+    @staticmethod
+    def clock(phases):
+        current = [None, None]
+        def startPhase(phase):
+            now = time.time()
+            if current[0] is not None:
+                phases[current[0]] = dict(seconds=now - current[1],
+                                          peakMemory=EMMA.tools.peakMemory())
+            current[0] = phase
+            current[1] = time.time()
+        return startPhase
+
+################################################################################
+#
+# Class corpus
+# Word lists and synthetic perturbations of them
+#
+################################################################################
+class corpus:
+    #===========================================================================
+    # method which extracts word lists from corpus archive
+    #===========================================================================
+    @staticmethod
+    def extract(archive, directory):
+        tar = tarfile.open(archive, 'r:gz')
+        try:
+            fileNames = list()
+            for name in (_labelledFile, _segmentedFile):
+                fileName = os.path.join(directory, name)
+                f = open(fileName, 'wb')
+                shutil.copyfileobj(tar.extractfile(name), f)
+                f.close()
+                fileNames.append(fileName)
+        finally:
+            tar.close()
+        return tuple(fileNames)
+
+    #===========================================================================
+    # method which reads word lists, returns dicts: word => list of analyses
+    # for words in both lists. Gold standard analyses are the labels of the
+    # labelled list, predicted analyses the segments of the segmented list.
+    #===========================================================================
+    @staticmethod
+    def read(labelledFile, segmentedFile):
+        goldDict = dict()
+        for line in open(labelledFile, 'r'):
+            (word, analyses) = line.rstrip("\n").split("\t", 1)
+            goldDict[word] = [re.findall("<[^>]+>", a) for a in analyses.split(",")]
+        predDict = dict()
+        for line in open(segmentedFile, 'r'):
+            (word, analyses) = line.rstrip("\n").split("\t", 1)
+            if goldDict.__contains__(word):
+                predDict[word] = [a.split() for a in analyses.split(",")]
+        for word in goldDict.keys():
+            if not predDict.__contains__(word):
+                del goldDict[word]
+        return (goldDict, predDict)
+
+    #===========================================================================
+    # method which generates lines of gold standard and prediction file of
+    # a configuration
+    #===========================================================================
+    @staticmethod
+    def synthesize(goldDict, predDict, words, labels, alternatives, seed):
+        rng = random.Random(seed)
+        # words with at least one non-empty analysis in both lists
+        baseWords = sorted([word for word in goldDict.keys() 
+                            if max(map(len, goldDict[word])) > 0 and 
+                            max(map(len, predDict[word])) > 0])
+        goldLabels = sorted(set([m for analyses in goldDict.values()
+                                 for a in analyses for m in a]))
+        goldLines = list()
+        predLines = list()
+        for i in range(words):
+            baseWord = baseWords[i % len(baseWords)]
+            copy = i // len(baseWords)
+            word = baseWord
+            goldAnalyses = [list(a) for a in goldDict[baseWord] if len(a) > 0]
+            predAnalyses = [list(a) for a in predDict[baseWord] if len(a) > 0]
+            if copy > 0:
+                # copy with renamed stem
+                word = baseWord + "_" + str(copy)
+                for a in predAnalyses:
+                    longest = max(range(len(a)), key=lambda k: len(a[k]))
+                    a[longest] = a[longest] + "_" + str(copy)
+            goldAnalyses = corpus.alternatives(goldAnalyses, alternatives, rng,
+                                               lambda a: corpus.perturbLabels(a, goldLabels, rng))
+            predAnalyses = corpus.alternatives(predAnalyses, alternatives, rng,
+                                               lambda a: corpus.perturbSegments(a, rng))
+            if labels > 0:
+                predAnalyses = [["m" + str(zlib.crc32(s) % labels) for s in a]
+                                for a in predAnalyses]
+            goldLines.append(word + "\t" + ", ".join([" ".join(a) for a in goldAnalyses]) + "\n")
+            predLines.append(word + "\t" + ", ".join([" ".join(a) for a in predAnalyses]) + "\n")
+        return (goldLines, predLines)
+
+    #===========================================================================
+    # method which returns exactly count alternatives, missing ones are
+    # perturbations of the first alternative
+    #===========================================================================
+    @staticmethod
+    def alternatives(analyses, count, rng, perturb):
+        analyses = analyses[:count]
+        while len(analyses) < count:
+            analyses.append(perturb(list(analyses[0])))
+        return analyses
+
+    # drops one label or replaces it by another gold standard label
+    @staticmethod
+    def perturbLabels(analysis, goldLabels, rng):
+        k = rng.randrange(len(analysis))
+        if len(analysis) > 1 and rng.random() < 0.5:
+            del analysis[k]
+        else:
+            analysis[k] = rng.choice(goldLabels)
+        return analysis
+
+    # merges two adjacent segments or splits a segment
+    @staticmethod
+    def perturbSegments(analysis, rng):
+        k = rng.randrange(len(analysis))
+        if len(analysis) > 1 and (len(analysis[k]) < 2 or rng.random() < 0.5):
+            k = min(k, len(analysis) - 2)
+            analysis[k:k + 2] = [analysis[k] + analysis[k + 1]]
+        elif len(analysis[k]) > 1:
+            cut = rng.randrange(1, len(analysis[k]))
+            analysis[k:k + 1] = [analysis[k][:cut], analysis[k][cut:]]
+        else:
+            analysis.append(analysis[k])
+        return analysis
+
+################################################################################
+#
+# Option parser
+#
+################################################################################
+def intList(values):
+    return [int(v) for v in values.split(",")]
+
+if __name__ == "__main__":
+    usage ="%prog [-o outFile -w wordCounts -n labelCounts -a alternativeCounts -l solvers -r repeat --grid -c baselineFile]"
+    usage +="\n       Benchmark of EMMA on synthetic data derived from the Ukwabelana word lists.\n"
+    parser = OptionParser(usage=usage, version="%prog 1.0")
+    parser.add_option("-o", "--outFile", action="store", type="string", dest="outFile", help="JSON file of results")
+    parser.add_option("-w", "--words", action="store", type="string", dest="words", default="2000,5000,10000,20000", help="comma separated numbers of words (default: 2000,5000,10000,20000)")
+    parser.add_option("-n", "--labels", action="store", type="string", dest="labels", default="0,100,1000,10000", help="comma separated sizes of predicted label inventory, 0: segments (default: 0,100,1000,10000)")
+    parser.add_option("-a", "--alternatives", action="store", type="string", dest="alternatives", default="1,2,4", help="comma separated numbers of alternatives per word (default: 1,2,4)")
+    parser.add_option("-l", "--solvers", action="store", type="string", dest="solvers", default="hungarian", help="comma separated solver backends (default: hungarian)")
+    parser.add_option("-r", "--repeat", action="store", type="int", dest="repeat", default=1, help="runs per configuration, minimum time and maximum memory are reported (default: 1)")
+    parser.add_option("--grid", action="store_true", dest="grid", help="all combinations of words, labels and alternatives")
+    parser.add_option("-s", "--seed", action="store", type="int", dest="seed", default=0, help="seed of perturbations (default: 0)")
+    parser.add_option("-c", "--compare", action="store", type="string", dest="compareFile", help="JSON file of previous benchmark which is compared to")
+    parser.add_option("--labelledFile", action="store", type="string", dest="labelledFile", help="labelled word list (default: from " + _corpusArchive + ")")
+    parser.add_option("--segmentedFile", action="store", type="string", dest="segmentedFile", help="segmented word list (default: from " + _corpusArchive + ")")
+    parser.add_option("--worker", action="store", type="string", dest="worker", help="internal: configuration evaluated by worker process")
+    parser.add_option("--workerOut", action="store", type="string", dest="workerOut", help="internal: result file of worker process")
+
+    (options, args) = parser.parse_args()
+    if options.worker:
+        worker.main(json.loads(options.worker), options.labelledFile,
+                    options.segmentedFile, options.workerOut)
+    else:
+        benchmark.main(options.labelledFile, options.segmentedFile,
+                       options.outFile, intList(options.words),
+                       intList(options.labels), intList(options.alternatives),
+                       options.solvers.split(","), options.repeat, options.grid,
+                       options.seed, options.compareFile)
@@ -1,6 +1,15 @@
 #!/usr/bin/python
 from optparse import OptionParser
+import collections
+import heapq
+import mmap
+import multiprocessing
+import os
 import re
+import shutil
+import struct
+import tempfile
+import zlib
 
 '''
 Simple part-of-speech tagger which either tags analyses in a text file or
@@ -25,13 +34,15 @@ a single analyses on the command line.
 
 This is a prototype for a rule-based Zulu part-of-speech (POS) tagger. 
 It is based on 34 hard-coded rules which assign a to a morphologically 
-analysed Zulu word.
+analysed Zulu word. The rules are compiled once into a lookup table keyed on
+classes of the first morpheme and the first J morpheme.
 
 The POS-tagger can be used in 3 different ways:
 1) assign POS-tags to a list of morphological analyses.
 2) assign a POS-tag to a single morphological analysis in the console.
 3) assign POS-tags to words in sentences for which a morphological analysis
-   is given in a separate file.
+   is given in a separate file. The words and POS tags of the analyses can
+   be compiled once into a lexicon file which later runs memory-map.
 
 For help use: "posTagger.py -h". 
 
@@ -42,12 +53,214 @@ For help use: "posTagger.py -h".
 Created on Jul 17, 2010
 '''
 
+#===============================================================================
+# tagger of each worker process, see PosTagger.tagChunks
+#===============================================================================
+_workerTagger = None
+
+def _initTagWorker(cacheSize):
+    global _workerTagger
+    _workerTagger = PosTagger(cacheSize)
+    _workerTagger.calcSets()
+
+def _tagChunk(args):
+    (lines, printWord, debug) = args
+    return _workerTagger.formatLines(lines, printWord, debug)
+
+class LruCache(object):
+################################################################################
+#
+# Bounded cache which drops the least recently used entry, entries are links
+# [previous, next, key, value] of a circular list in order of use
+#
+################################################################################
+    def __init__(self, maxSize):
+        self.maxSize = maxSize
+        self.hits = 0
+        self.misses = 0
+        self._links = dict()
+        self._root = list()
+        self._root[:] = [self._root, self._root, None, None]
+
+    def get(self, key):
+        link = self._links.get(key)
+        if link == None:
+            self.misses += 1
+            return None
+        # move link to the end (most recently used)
+        (previous, next) = (link[0], link[1])
+        previous[1] = next
+        next[0] = previous
+        root = self._root
+        last = root[0]
+        last[1] = root[0] = link
+        link[0] = last
+        link[1] = root
+        self.hits += 1
+        return link[3]
+
+    def put(self, key, value):
+        if self.maxSize <= 0 or self._links.__contains__(key):
+            return
+        root = self._root
+        if len(self._links) >= self.maxSize:
+            # remove least recently used link
+            oldest = root[1]
+            root[1] = oldest[1]
+            oldest[1][0] = root
+            del self._links[oldest[2]]
+        last = root[0]
+        link = [last, root, key, value]
+        last[1] = root[0] = link
+        self._links[key] = link
+
+    def __len__(self):
+        return len(self._links)
+
+    def stats(self):
+        return {'hits': self.hits, 'misses': self.misses, 'size': len(self._links)}
+
+#===============================================================================
+# numpy is only imported for lexicon files, its import takes about as long as
+# tagging the analyses of a small corpus
+#===============================================================================
+numpy = None
+
+def _importNumpy():
+    global numpy
+    if numpy == None:
+        import numpy
+
+class PosLexicon(object):
+################################################################################
+#
+# Read-only word => POS tags lexicon in a memory-mapped file:
+#   header, offsets of the words (wordCount + 1 x uint64), crc32 of the words
+#   (wordCount x uint32, sorted), POS tag sequence id of the words (wordCount
+#   x uint32), POS tag sequences (one per line, tags separated by commas) and 
+#   the words, which are ordered by crc32 and then by word.
+# Words are looked up in bulk by binary search over the crc32 array, the 
+# POS tags of a word keep the order in which the tagger listed its set.
+#
+################################################################################
+    _magic = 'ZULUPOS2'
+    _header = struct.Struct('<8sIIQQQ')
+
+    def __init__(self, fileName):
+        _importNumpy()
+        self._file = open(fileName, 'rb')
+        self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        (magic, debug, setCount, wordCount, setsLength, keysLength) = self._header.unpack_from(self._map, 0)
+        if magic != self._magic:
+            raise ValueError("not a POS lexicon: " + fileName)
+        self.debug = bool(debug)
+        start = self._header.size
+        self._offsets = numpy.frombuffer(self._map, dtype='<u8', count=wordCount + 1, offset=start)
+        start += 8 * (wordCount + 1)
+        self._crcs = numpy.frombuffer(self._map, dtype='<u4', count=wordCount, offset=start)
+        start += 4 * wordCount
+        self._setIds = numpy.frombuffer(self._map, dtype='<u4', count=wordCount, offset=start)
+        start += 4 * wordCount
+        self._keysStart = start + setsLength
+        self._posSets = [posSeq.split(',') for posSeq in self._map[start:self._keysStart].split('\n')[:setCount]]
+
+    @staticmethod
+    def write(fileName, wordDictSet, debug):
+        #===========================================================================
+        # writes the lexicon of wordDictSet (word => set of POS tags) to a 
+        # temporary file which replaces fileName once it is complete
+        #===========================================================================
+        _importNumpy()
+        setIds = dict()
+        posSeqs = list()
+        words = sorted(wordDictSet.keys(), key=lambda word: (PosLexicon.crc(word), word))
+        wordSetIds = list()
+        for word in words:
+            posSeq = ",".join(list(wordDictSet[word]))
+            if not setIds.__contains__(posSeq):
+                setIds[posSeq] = len(posSeqs)
+                posSeqs.append(posSeq)
+            wordSetIds.append(setIds[posSeq])
+        sets = "\n".join(posSeqs)
+
+        (fd, tmpFile) = tempfile.mkstemp(prefix=os.path.basename(fileName) + '.', dir=os.path.dirname(os.path.abspath(fileName)))
+        f_out = os.fdopen(fd, 'wb')
+        f_out.write(PosLexicon._header.pack(PosLexicon._magic, int(bool(debug)), len(posSeqs), len(words), len(sets), sum([len(word) for word in words])))
+        offsets = numpy.zeros(len(words) + 1, dtype='<u8')
+        numpy.cumsum([len(word) for word in words], out=offsets[1:])
+        offsets.tofile(f_out)
+        numpy.array([PosLexicon.crc(word) for word in words], dtype='<u4').tofile(f_out)
+        numpy.array(wordSetIds, dtype='<u4').tofile(f_out)
+        f_out.write(sets)
+        for word in words:
+            f_out.write(word)
+        f_out.close()
+        # mkstemp creates the file readable by its owner only
+        umask = os.umask(0)
+        os.umask(umask)
+        os.chmod(tmpFile, 0666 & ~umask)
+        os.rename(tmpFile, fileName)
+
+    @staticmethod
+    def crc(word):
+        return zlib.crc32(word) & 0xffffffff
+
+    def lookup(self, words):
+        #===========================================================================
+        # dict: word => POS tags of the given words which are in the lexicon
+        #===========================================================================
+        words = list(words)
+        found = dict()
+        if len(words) == 0 or len(self._crcs) == 0:
+            return found
+        crcs = numpy.array([PosLexicon.crc(word) for word in words], dtype='<u4')
+        lows = numpy.searchsorted(self._crcs, crcs, 'left')
+        highs = numpy.searchsorted(self._crcs, crcs, 'right')
+        candidates = numpy.flatnonzero(highs > lows)
+        for (i, low, high) in zip(candidates.tolist(), lows[candidates].tolist(), highs[candidates].tolist()):
+            word = words[i]
+            for index in range(low, high):
+                if self.key(index) == word:
+                    found[word] = self._posSets[self._setIds[index]]
+                    break
+        return found
+
+    def key(self, index):
+        return self._map[self._keysStart + int(self._offsets[index]):self._keysStart + int(self._offsets[index + 1])]
+
+    def get(self, word, default=None):
+        return self.lookup([word]).get(word, default)
+
+    def __contains__(self, word):
+        return self.get(word) != None
+
+    def __getitem__(self, word):
+        posSet = self.get(word)
+        if posSet == None:
+            raise KeyError(word)
+        return posSet
+
+    def __len__(self):
+        return len(self._crcs)
+
+    def close(self):
+        self._offsets = self._crcs = self._setIds = None
+        self._map.close()
+        self._file.close()
+
 class PosTagger(object):
 ################################################################################
 #
 # Variables
 #
 ################################################################################
+    def __init__(self, cacheSize=65536):
+        self.cacheSize = cacheSize
+        # raw analysis => (segmentation, labels, segLabelCombis, (POS tag, POS tag with rule number))
+        self._lineCache = LruCache(cacheSize)
+        # label sequence => (POS tag, POS tag with rule number)
+        self._signatureCache = LruCache(cacheSize)
+
     def add2DictList(self, _dict, _key, _element):
         if _dict.__contains__(_key):
             _list = _dict[_key]
@@ -127,6 +340,62 @@ class PosTagger(object):
             self._sXSet.add('<s' + x + '>')
             self._oXSet.add('<o' + x + '>')
 
+        self.compileRules()
+
+    def compileRules(self):
+        #===========================================================================
+        # Compiled rules
+        #===========================================================================
+
+        # the rules only depend on the first morpheme, the first J morpheme and 
+        # whether there is a single label. First morphemes which are the same
+        # literal in the rules and belong to the same sets fall into the same 
+        # class, J morphemes are members of the J set or None.
+        self._ruleSets = [self._prXSet, self._pXSet, self._iXSet, self._dXSet, self._nXSet, self._iv_nXSet, self._zXSet, self._zX_ivSet, self._iX_vrSet, self._pX_vrSet, self._sXSet, self._oXSet]
+        self._firstLiterals = set(['<adv>', '<advpf>', '<ar>', '<asp>', '<cj>', '<d>', '<der>', '<hort>', '<intj>', '<iv>', '<locpf>', '<neg>', '<nr>', '<p>', '<past>', '<pres>', '<r>', '<red>', '<refl>', '<st>', '<voc>', '<vr>', '<w>'])
+        
+        # first morpheme => class, class signature => class, class => first morpheme
+        self._firstClasses = dict()
+        self._classSignatures = dict()
+        self._classRepresentatives = list()
+        
+        # (class, J morpheme, single label) => (POS tag, POS tag with rule number)
+        self._posTable = dict()
+        
+        candidates = sorted(self._firstLiterals)
+        for ruleSet in self._ruleSets:
+            candidates.extend(sorted(ruleSet))
+        # representative of morphemes which no rule refers to
+        candidates.append('<>')
+        for label in candidates:
+            self.getFirstClass(label)
+
+    def getFirstClass(self, label):
+        try:
+            return self._firstClasses[label]
+        except KeyError:
+            pass
+        literal = None
+        if self._firstLiterals.__contains__(label):
+            literal = label
+        signature = (literal,) + tuple([ruleSet.__contains__(label) for ruleSet in self._ruleSets])
+        if not self._classSignatures.__contains__(signature):
+            firstClass = len(self._classRepresentatives)
+            self._classSignatures[signature] = firstClass
+            self._classRepresentatives.append(label)
+            # rules applied to representative 
+            for jMorpheme1 in [None] + sorted(self._jSet):
+                for single in [True, False]:
+                    if single and jMorpheme1 != None:
+                        continue
+                    labels = [label]
+                    if not single:
+                        labels.append(jMorpheme1)
+                    self._posTable[(firstClass, jMorpheme1, single)] = (self.applyRules(label, jMorpheme1, labels, False), self.applyRules(label, jMorpheme1, labels, True))
+        firstClass = self._classSignatures[signature]
+        self._firstClasses[intern(label)] = firstClass
+        return firstClass
+
     def getSegmentLabelSeq(self, line):
         pattern = "(\w+)(<\w+>)"
         found = re.findall(pattern, line)
@@ -143,60 +412,141 @@ class PosTagger(object):
                 labels.extend(l.split("_"))
         return (segmentation, labels, segLabelCombis)
     
-    def processing(self, inFile, outFile, separate, printWord, multiLabel, sentenceInFile, debug):
+    def processing(self, inFile, outFile, separate, printWord, multiLabel, sentenceInFile, debug, jobs=1, chunkLines=10000, runLines=1000000, lexiconFile=None):
         self.calcSets()
         #if debug:
         #    self.printDebug()
         #    exit()
         
         if not multiLabel and sentenceInFile == None:  
-            self.doPosTagging(inFile, outFile, separate, printWord, debug)
+            self.doPosTagging(inFile, outFile, separate, printWord, debug, jobs, chunkLines, runLines)
         elif multiLabel and sentenceInFile == None:
             self.doPosTaggingMulti(inFile, outFile, debug)
         elif sentenceInFile != None:
-            self.doSentenceTag(inFile, sentenceInFile, outFile, debug)
+            self.doSentenceTag(inFile, sentenceInFile, outFile, debug, lexiconFile)
         else:
             print "Confusing parameters!"
             
-    def doPosTagging(self, inFile, outFile, separate, printWord, debug):
-        resultList = list()
-        resultDictList = dict()
-        for line in open(inFile,'r'):
-            (segmentation, labels, segLabelCombis) = self.getSegmentLabelSeq(line)
-            
-            pos = self.getPosTag(line, labels, segLabelCombis, debug)
-            
-            if not separate:
-                if not printWord:
-                    resultList.append(pos + "\t" + line)
-                else:
-                    resultList.append("".join(segmentation) + "\t" + pos + "\t" + line)
-            else:
+    def doPosTagging(self, inFile, outFile, separate, printWord, debug, jobs=1, chunkLines=10000, runLines=1000000):
+        if not separate and jobs <= 1:
+            f_out = open(outFile, 'w')
+            for line in open(inFile,'r'):
+                (segmentation, labels, segLabelCombis, pos) = self.tagAnalysis(line, debug)
                 if not printWord:
-                    resultDictList = self.add2DictList(resultDictList, pos, line)
+                    f_out.write(pos + "\t" + line)
                 else:
-                    line = "".join(segmentation) + "\t" + pos + "\t" + line
-                    resultDictList = self.add2DictList(resultDictList, pos, line)
-                    
-        if not separate:
+                    f_out.write("".join(segmentation) + "\t" + pos + "\t" + line)
+            f_out.close()
+            return
+        elif not separate:
             f_out = open(outFile, 'w')
-            f_out.writelines(resultList)
+            for chunk in self.tagChunks(inFile, printWord, debug, jobs, chunkLines):
+                f_out.write(chunk)
             f_out.close()
-        else:
-            for key in resultDictList:
-                sublist = resultDictList[key]
-                f_out = open(outFile + '.' + key, 'w')
-                f_out.writelines(sorted(sublist))
-                f_out.close()
-                
-    def doPosTaggingMulti(self, inFile, outFile, debug):
-        wordDictSet = dict()
+            return
+
+        # at most runLines lines are held in memory, beyond that each POS 
+        # sublist is sorted and spilled to a run file which is merged at the end
+        tmpDir = None
+        runDictList = dict()
+        resultDictList = dict()
+        bufferedLines = 0
+        try:
+            for line in open(inFile,'r'):
+                if bufferedLines >= runLines:
+                    if tmpDir == None:
+                        tmpDir = tempfile.mkdtemp(prefix='posTagger.', dir=os.path.dirname(os.path.abspath(outFile)))
+                    for key in resultDictList:
+                        runDictList = self.add2DictList(runDictList, key, self.writeRun(tmpDir, resultDictList[key]))
+                    resultDictList = dict()
+                    bufferedLines = 0
+
+                (segmentation, labels, segLabelCombis, pos) = self.tagAnalysis(line, debug)
+                if printWord:
+                    line = "".join(segmentation) + "\t" + pos + "\t" + line
+                resultDictList = self.add2DictList(resultDictList, pos, line)
+                bufferedLines += 1
+
+            for key in set(resultDictList.keys()) | set(runDictList.keys()):
+                self.mergeRuns(tmpDir, runDictList.get(key, list()), resultDictList.get(key, list()), outFile + '.' + key)
+        finally:
+            if tmpDir != None:
+                shutil.rmtree(tmpDir, True)
+
+    def writeRun(self, tmpDir, lines):
+        lines.sort()
+        (fd, runFile) = tempfile.mkstemp(dir=tmpDir)
+        f_run = os.fdopen(fd, 'w')
+        f_run.writelines(lines)
+        f_run.close()
+        return runFile
+
+    def mergeRuns(self, tmpDir, runFiles, lines, outFileName, fanIn=64):
+        #===========================================================================
+        # writes the sorted lines of all run files and of lines to outFileName,
+        # runs are merged in passes so that at most fanIn files are open
+        #===========================================================================
+        while len(runFiles) >= fanIn:
+            (fd, runFile) = tempfile.mkstemp(dir=tmpDir)
+            self.writeMerged(os.fdopen(fd, 'w'), runFiles[:fanIn], list())
+            for mergedFile in runFiles[:fanIn]:
+                os.remove(mergedFile)
+            runFiles = runFiles[fanIn:] + [runFile]
+        self.writeMerged(open(outFileName, 'w'), runFiles, lines)
+
+    def writeMerged(self, f_out, runFiles, lines):
+        f_runs = [open(runFile, 'r') for runFile in runFiles]
+        f_out.writelines(heapq.merge(sorted(lines), *f_runs))
+        for f_run in f_runs:
+            f_run.close()
+        f_out.close()
+
+    def tagChunks(self, inFile, printWord, debug, jobs, chunkLines=10000, window=None):
+        #===========================================================================
+        # tagged lines of inFile in input order, one string per chunk of 
+        # chunkLines lines; the chunks are tagged by a pool of jobs processes 
+        # and at most window chunks (default: 2 per job) are in flight. A single 
+        # job tags line by line in doPosTagging.
+        #===========================================================================
+        chunks = self.readChunks(inFile, chunkLines)
+        if window == None:
+            window = 2 * jobs
+        pool = multiprocessing.Pool(jobs, _initTagWorker, (self.cacheSize,))
+        try:
+            pending = collections.deque()
+            for lines in chunks:
+                pending.append(pool.apply_async(_tagChunk, ((lines, printWord, debug),)))
+                if len(pending) >= window:
+                    yield pending.popleft().get()
+            while pending:
+                yield pending.popleft().get()
+            pool.close()
+        finally:
+            pool.terminate()
+            pool.join()
+
+    def readChunks(self, inFile, chunkLines):
+        lines = list()
         for line in open(inFile,'r'):
-            (segmentation, labels, segLabelCombis) = self.getSegmentLabelSeq(line)
-            word = "".join(segmentation)
-            pos = self.getPosTag(line, labels, segLabelCombis, debug)
-            wordDictSet = self.add2DictSet(wordDictSet, word, pos)
+            lines.append(line)
+            if len(lines) >= chunkLines:
+                yield lines
+                lines = list()
+        if lines:
+            yield lines
+
+    def formatLines(self, lines, printWord, debug):
+        resultList = list()
+        for line in lines:
+            (segmentation, labels, segLabelCombis, pos) = self.tagAnalysis(line, debug)
+            if not printWord:
+                resultList.append(pos + "\t" + line)
+            else:
+                resultList.append("".join(segmentation) + "\t" + pos + "\t" + line)
+        return "".join(resultList)
 
+    def doPosTaggingMulti(self, inFile, outFile, debug):
+        wordDictSet = self.getWordDictSet(inFile, debug)
         
         posStats = dict()
         f_out = open(outFile, 'w')
@@ -212,57 +562,129 @@ class PosTagger(object):
         
         print "POS statistics:", posStats
 
-    def doSentenceTag(self, inFile, sentenceInFile, outFile, debug):
+    def getWordDictSet(self, inFile, debug):
         wordDictSet = dict()
         for line in open(inFile,'r'):
-            (segmentation, labels, segLabelCombis) = self.getSegmentLabelSeq(line)
+            (segmentation, labels, segLabelCombis, pos) = self.tagAnalysis(line, debug)
             word = "".join(segmentation)
-            pos = self.getPosTag(line, labels, segLabelCombis, debug)
             wordDictSet = self.add2DictSet(wordDictSet, word, pos)
+        return wordDictSet
+
+    def buildLexicon(self, inFile, lexiconFile, debug):
+        PosLexicon.write(lexiconFile, self.getWordDictSet(inFile, debug), debug)
+
+    def loadLexicon(self, inFile, lexiconFile, debug):
+        #===========================================================================
+        # lexicon of lexiconFile, (re)built from inFile if it is missing, older
+        # than inFile or was built with the other debug setting
+        #===========================================================================
+        lexicon = None
+        if os.path.exists(lexiconFile):
+            lexicon = PosLexicon(lexiconFile)
+        if inFile != None:
+            if lexicon == None or lexicon.debug != bool(debug) or os.path.getmtime(lexiconFile) < os.path.getmtime(inFile):
+                if lexicon != None:
+                    lexicon.close()
+                self.buildLexicon(inFile, lexiconFile, debug)
+                lexicon = PosLexicon(lexiconFile)
+        elif lexicon == None:
+            raise IOError("lexicon file does not exist: " + lexiconFile)
+        if lexicon.debug != bool(debug):
+            raise ValueError("lexicon " + lexiconFile + " was built " + ("with" if lexicon.debug else "without") + " debug tags")
+        return lexicon
+
+    def doSentenceTag(self, inFile, sentenceInFile, outFile, debug, lexiconFile=None, chunkLines=10000):
+        lexicon = None
+        if lexiconFile == None:
+            wordDictSet = self.getWordDictSet(inFile, debug)
+        else:
+            lexicon = self.loadLexicon(inFile, lexiconFile, debug)
         
         multiStats = dict()
         f_out = open(outFile, 'w')
-        for line in open(sentenceInFile, 'r'):
-            line = re.sub("\n$", "", line)
-            words = line.split(" ")
-            
-            stopFlag = 0
-            multiFlag = 0
-            
-            posList = list()
-            for word in words:
-                if wordDictSet.__contains__(word):
-                    posSet = wordDictSet[word]
-                    posList.append(list(posSet))
-                    if len(posSet) > 1:
-                        multiFlag += 1
-                else:
-                    stopFlag = 1
+        for lines in self.readChunks(sentenceInFile, chunkLines):
+            sentences = [re.sub("\n$", "", line) for line in lines]
+            # words of the sentences of a chunk are looked up in the lexicon at once
+            if lexicon != None:
+                wordDictSet = lexicon.lookup(set([word for line in sentences for word in line.split(" ")]))
+            for line in sentences:
+                words = line.split(" ")
+                
+                stopFlag = 0
+                multiFlag = 0
                 
-            if stopFlag == 0:
-                result = str(posList)
-                result = re.sub("'", "", result)
-                result = re.sub(" ", "", result)
-                result = line + "\t" + result
-                f_out.write(result + "\n")
-            if not stopFlag:
-                multiStats = self.incDict(multiStats, multiFlag, 1)
+                posList = list()
+                for word in words:
+                    if wordDictSet.__contains__(word):
+                        posSet = wordDictSet[word]
+                        posList.append(list(posSet))
+                        if len(posSet) > 1:
+                            multiFlag += 1
+                    else:
+                        stopFlag = 1
+                    
+                if stopFlag == 0:
+                    result = str(posList)
+                    result = re.sub("'", "", result)
+                    result = re.sub(" ", "", result)
+                    result = line + "\t" + result
+                    f_out.write(result + "\n")
+                if not stopFlag:
+                    multiStats = self.incDict(multiStats, multiFlag, 1)
         f_out.close()
+        if lexicon != None:
+            lexicon.close()
         print "Sentence stats:", multiStats
             
            
+    def tagAnalysis(self, line, debug):
+        #===========================================================================
+        # segmentation, labels, segment-label combinations and POS tag of an 
+        # analysis, looked up in the caches of analyses and label sequences
+        # unless they are switched off
+        #===========================================================================
+        if self.cacheSize <= 0:
+            (segmentation, labels, segLabelCombis) = self.getSegmentLabelSeq(line)
+            return (segmentation, labels, segLabelCombis, self.getPosTag(line, labels, segLabelCombis, debug))
+        tagged = self._lineCache.get(line)
+        if tagged == None:
+            (segmentation, labels, segLabelCombis) = self.getSegmentLabelSeq(line)
+            signature = tuple(labels)
+            posTags = self._signatureCache.get(signature)
+            if posTags == None:
+                posTags = self.getPosTags(labels)
+                self._signatureCache.put(signature, posTags)
+            tagged = (segmentation, labels, segLabelCombis, posTags)
+            self._lineCache.put(line, tagged)
+        (segmentation, labels, segLabelCombis, (posTag, debugTag)) = tagged
+        if debug:
+            return (segmentation, labels, segLabelCombis, debugTag)
+        return (segmentation, labels, segLabelCombis, posTag)
+
+    def cacheStats(self):
+        return {'analyses': self._lineCache.stats(), 'labels': self._signatureCache.stats()}
+
     def getPosTag(self, line, labels, segLabelCombis, debug):
+        (posTag, debugTag) = self.getPosTags(labels)
+        if debug:
+            return debugTag
+        return posTag
+
+    def getPosTags(self, labels):
         firstMorpheme = labels[0]
-        jMorphemes = list()
+        jMorpheme1 = None
         for i in range(1, len(labels)):
-            label = labels[i]
-            if self._jSet.__contains__(label):
-                jMorphemes.append(label)
-        try:
-            jMorpheme1 = jMorphemes[0]
-        except IndexError:
-            jMorpheme1 = None
-            
+            if self._jSet.__contains__(labels[i]):
+                jMorpheme1 = labels[i]
+                break
+        
+        # lookup in compiled rules
+        firstClass = self._firstClasses.get(firstMorpheme)
+        if firstClass == None:
+            firstClass = self.getFirstClass(firstMorpheme)
+        return self._posTable[(firstClass, jMorpheme1, len(labels) == 1)]
+
+    def applyRules(self, firstMorpheme, jMorpheme1, labels, debug):
         posTag = str()
         
         #adv rules
@@ -481,9 +903,8 @@ class PosTagger(object):
 
     def processingSingle(self, singleAnalysis, debug):
         self.calcSets()
-        (segmentation, labels, segLabelCombis) = self.getSegmentLabelSeq(singleAnalysis)
+        (segmentation, labels, segLabelCombis, pos) = self.tagAnalysis(singleAnalysis, debug)
         word = "".join(segmentation)
-        pos = self.getPosTag(singleAnalysis, labels, segLabelCombis, debug)
         print word + "\t" + singleAnalysis  + ":\t" + pos 
 
         
@@ -492,40 +913,60 @@ class PosTagger(object):
 # Main
 #
 ################################################################################
-usage = "\nRule-based part-of-speech tagger for Zulu which uses morphological information\n"
-usage +="\nusage 1: %prog -a singleAnalysis, e.g. posTagger.py -a 'a<hort>k<s1>enz<vr>e<vs>'\n"
-usage +="\nusage 2: %prog -i inFile -o outFile [-s flag for separate files for each POS] [-w print word at beginning of line] [-m multiLabel (word + all labels)]\n"
-usage +="\nusage 3: %prog -i inFile -o outFile -t sentenceInFile\n"
-usage +="\nPOS tags:\ta (adjective)\n\t\tadv (adverb)\n\t\tconj (conjunction)\n\t\tcop (copulative)\n\t\tdem (demonstrative)\n\t\tintj (interjection)\n\t\tloc (locative)\n\t\tm (modal)\n\t\tn (noun)\n\t\tp (prepositional)\n\t\tpos (possessive)\n\t\tpres (presentative)\n\t\tpron (pronoun)\n\t\tq (quantifier)\n\t\trel (relative)\n\t\tv (verb)\n"
-parser = OptionParser(usage=usage, version="%prog 1.0")
-parser.add_option("-i", "--inFile", action="store", type="string", dest="inFile", help="input file")
-parser.add_option("-o", "--outFile", action="store", type="string", dest="outFile", help="output file")
-parser.add_option("-s", "--separate", action="store_true", dest="separate", help="separate file")
-parser.add_option("-w", "--printWord", action="store_true", dest="printWord", help="print word")
-parser.add_option("-m", "--multiLabel", action="store_true", dest="multiLabel", help="give word and all labels")
-parser.add_option("-d", "--debug", action="store_true", dest="debug", help="debug")
-parser.add_option("-t", "--sentenceInFile", action="store", type="string", dest="sentenceInFile", help="sentence input file")
-parser.add_option("-a", "--singleAnalysis", action="store", type="string", dest="singleAnalysis", help="single analysis will be analysed")
-
-(options, args) = parser.parse_args()
-if options.inFile and options.outFile:
-    inFile=options.inFile
-    outFile=options.outFile
-    separate=options.separate
-    printWord=options.printWord
-    debug=options.debug
-    multiLabel=options.multiLabel
-    sentenceInFile=options.sentenceInFile
-
-    pt = PosTagger()
-    pt.processing(inFile, outFile, separate, printWord, multiLabel, sentenceInFile, debug)
+if __name__ == "__main__":
+    usage = "\nRule-based part-of-speech tagger for Zulu which uses morphological information\n"
+    usage +="\nusage 1: %prog -a singleAnalysis, e.g. posTagger.py -a 'a<hort>k<s1>enz<vr>e<vs>'\n"
+    usage +="\nusage 2: %prog -i inFile -o outFile [-s flag for separate files for each POS] [-w print word at beginning of line] [-m multiLabel (word + all labels)]\n"
+    usage +="\nusage 3: %prog -i inFile -o outFile -t sentenceInFile [-x lexiconFile]\n"
+    usage +="\nusage 4: %prog -x lexiconFile -o outFile -t sentenceInFile (lexicon built before)\n"
+    usage +="\nusage 5: %prog -i inFile -x lexiconFile (build lexicon only)\n"
+    usage +="\nPOS tags:\ta (adjective)\n\t\tadv (adverb)\n\t\tconj (conjunction)\n\t\tcop (copulative)\n\t\tdem (demonstrative)\n\t\tintj (interjection)\n\t\tloc (locative)\n\t\tm (modal)\n\t\tn (noun)\n\t\tp (prepositional)\n\t\tpos (possessive)\n\t\tpres (presentative)\n\t\tpron (pronoun)\n\t\tq (quantifier)\n\t\trel (relative)\n\t\tv (verb)\n"
+    parser = OptionParser(usage=usage, version="%prog 1.0")
+    parser.add_option("-i", "--inFile", action="store", type="string", dest="inFile", help="input file")
+    parser.add_option("-o", "--outFile", action="store", type="string", dest="outFile", help="output file")
+    parser.add_option("-s", "--separate", action="store_true", dest="separate", help="separate file")
+    parser.add_option("-w", "--printWord", action="store_true", dest="printWord", help="print word")
+    parser.add_option("-m", "--multiLabel", action="store_true", dest="multiLabel", help="give word and all labels")
+    parser.add_option("-d", "--debug", action="store_true", dest="debug", help="debug")
+    parser.add_option("-t", "--sentenceInFile", action="store", type="string", dest="sentenceInFile", help="sentence input file")
+    parser.add_option("-x", "--lexicon", action="store", type="string", dest="lexicon", help="word => POS lexicon file used with -t, (re)built from the input file if it is missing or older")
+    parser.add_option("-c", "--cacheSize", action="store", type="int", dest="cacheSize", default=65536, help="number of analyses and label sequences whose POS tags are cached (default: 65536, 0: no cache)")
+    parser.add_option("-j", "--jobs", action="store", type="int", dest="jobs", default=1, help="number of processes tagging the input file, without -s, -m and -t (default: 1)")
+    parser.add_option("--chunkLines", action="store", type="int", dest="chunkLines", default=10000, help="number of lines tagged and written at a time (default: 10000)")
+    parser.add_option("--runLines", action="store", type="int", dest="runLines", default=1000000, help="number of lines held in memory with -s before sorted runs are spilled to disk (default: 1000000)")
+    parser.add_option("--cacheStats", action="store_true", dest="cacheStats", help="print hits and misses of caches (of the main process only)")
+    parser.add_option("-a", "--singleAnalysis", action="store", type="string", dest="singleAnalysis", help="single analysis will be analysed")
+
+    (options, args) = parser.parse_args()
+    if options.inFile and options.outFile:
+        inFile=options.inFile
+        outFile=options.outFile
+        separate=options.separate
+        printWord=options.printWord
+        debug=options.debug
+        multiLabel=options.multiLabel
+        sentenceInFile=options.sentenceInFile
+
+        pt = PosTagger(options.cacheSize)
+        pt.processing(inFile, outFile, separate, printWord, multiLabel, sentenceInFile, debug, options.jobs, options.chunkLines, options.runLines, options.lexicon)
+        if options.cacheStats:
+            print "Cache stats:", pt.cacheStats()
     
-elif options.singleAnalysis:
-    singleAnalysis=options.singleAnalysis
-    debug=options.debug
+    elif options.lexicon and options.outFile and options.sentenceInFile:
+        pt = PosTagger(options.cacheSize)
+        pt.processing(None, options.outFile, False, False, False, options.sentenceInFile, options.debug, lexiconFile=options.lexicon)
+
+    elif options.inFile and options.lexicon:
+        pt = PosTagger(options.cacheSize)
+        pt.calcSets()
+        pt.buildLexicon(options.inFile, options.lexicon, options.debug)
+
+    elif options.singleAnalysis:
+        singleAnalysis=options.singleAnalysis
+        debug=options.debug
     
-    pt = PosTagger()
-    pt.processingSingle(singleAnalysis, debug)
+        pt = PosTagger(options.cacheSize)
+        pt.processingSingle(singleAnalysis, debug)
 
-else:
-    print usage
\ No newline at end of file
+    else:
+        print usage
\ No newline at end of file
@@ -0,0 +1,233 @@
+#!/usr/bin/python
+from optparse import OptionParser
+import os
+import sys
+import random
+import shutil
+import tempfile
+import EMMA
+import posTagger
+from benchmarkEMMA import corpus
+
+'''
+Regression checks of EMMA and the POS tagger which compare fast code paths
+with the straightforward ones they replace.
+
+    ----------------------------------------------------------------------
+    This program is free software: you can redistribute it and/or modify
+    it under the terms of the GNU General Public License as published by
+    the Free Software Foundation, either version 3 of the License, or
+    (at your option) any later version.
+
+    This program is distributed in the hope that it will be useful,
+    but WITHOUT ANY WARRANTY; without even the implied warranty of
+    MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+    GNU General Public License for more details.
+
+    You should have received a copy of the GNU General Public License
+    along with this program.  If not, see <http://www.gnu.org/licenses/>.
+    ----------------------------------------------------------------------
+
+The sample is a fixed selection of words of the Ukwabelana word lists: the
+labels of WordListLabelled are the gold standard analyses, the segments of
+WordListSegmented are the predicted analyses. The checks are
+    solvers:     the morpheme assignment of the hungarian solver has the same
+                 weight as the optimum found by lp_solve (skipped if lp_solve
+                 cannot be run)
+    incremental: predictions changed in several rounds are evaluated
+                 incrementally with a state file and from scratch, precision,
+                 recall, f-measure and per-word scores have to be identical
+    rules:       POS tags of random label sequences looked up in the compiled
+                 rules (PosTagger.compileRules) equal the tags of the rules
+                 applied directly (PosTagger.applyRules), with and without
+                 rule numbers
+Each check prints one line, the exit status is 1 if a check failed.
+'''
+################################################################################
+#
+# Important variables
+#
+################################################################################
+
+# corpus archive of benchmarkEMMA
+_corpusArchive = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                              "UkwabelanaCorpus.tar.gz")
+
+# labels of random label sequences which no rule refers to
+_unknownLabels = ['<>', '<xyz>', '<n16>', '<pr0>', '<vs>', '<va>', '<rsf>']
+
+################################################################################
+#
+# Class check
+#
+################################################################################
+class check:
+    #===========================================================================
+    # main method which runs all checks on sample of words, returns True if
+    # all passed
+    #===========================================================================
+    @staticmethod
+    def main(labelledFile, segmentedFile, words, rounds, sequences, lpSolvePath,
+             seed):
+        tempDir = tempfile.mkdtemp(prefix="emmacheck")
+        try:
+            if labelledFile is None or segmentedFile is None:
+                (labelledFile, segmentedFile) = corpus.extract(_corpusArchive,
+                                                               tempDir)
+            (goldDict, predDict) = check.sample(labelledFile, segmentedFile,
+                                                words)
+            results = [("solvers", check.solvers(goldDict, predDict,
+                                                 lpSolvePath, tempDir)),
+                       ("incremental", check.incremental(goldDict, predDict,
+                                                         rounds, seed,
+                                                         tempDir)),
+                       ("rules", check.rules(sequences, seed))]
+        finally:
+            shutil.rmtree(tempDir, True)
+        passed = True
+        for (name, (status, message)) in results:
+            print name.ljust(12) + status.ljust(8) + message
+            passed = passed and status != "FAILED"
+        return passed
+
+    #===========================================================================
+    # method which returns gold standard and predictions of the first words
+    # (sorted) of the word lists
+    #===========================================================================
+    @staticmethod
+    def sample(labelledFile, segmentedFile, words):
+        (goldDict, predDict) = corpus.read(labelledFile, segmentedFile)
+        selected = sorted(goldDict.keys())[:words]
+        return (dict((word, goldDict[word]) for word in selected),
+                dict((word, predDict[word]) for word in selected))
+
+    #===========================================================================
+    # method which compares weight of hungarian and lp_solve assignment
+    #===========================================================================
+    @staticmethod
+    def solvers(goldDict, predDict, lpSolvePath, tempDir):
+        countMatrix = EMMA.morphassignment.calcSparseCountMatrix(goldDict, predDict,
+                                                                 EMMA.morphassignment.wordSegmentationList2MorphIndex(goldDict),
+                                                                 EMMA.morphassignment.wordSegmentationList2MorphIndex(predDict))
+        weights = dict()
+        for solver in ("hungarian", "lpsolve"):
+            backend = EMMA.solverbackend.create(solver,
+                                                lpInput=os.path.join(tempDir, "check.lpInput"),
+                                                lpOutput=os.path.join(tempDir, "check.lpOutput"),
+                                                lpSolvePath=lpSolvePath)
+            try:
+                assignment = backend.solve(countMatrix, False)
+            except OSError, e:
+                return ("skipped", "lp_solve cannot be run: " + str(e))
+            finally:
+                backend.cleanup()
+            weights[solver] = check.weight(countMatrix, assignment)
+        message = "weight hungarian " + repr(weights["hungarian"]) + ", lp_solve " + repr(weights["lpsolve"])
+        if abs(weights["hungarian"] - weights["lpsolve"]) > 1e-9 * max(1.0, weights["lpsolve"]):
+            return ("FAILED", message)
+        return ("OK", message)
+
+    # sum of count matrix cells of assigned (row, col) pairs
+    @staticmethod
+    def weight(countMatrix, assignment):
+        cells = dict(((r, c), v) for (r, c, v) in zip(countMatrix.rows.tolist(),
+                                                      countMatrix.cols.tolist(),
+                                                      countMatrix.data.tolist()))
+        total = float(0)
+        for (r, c) in sorted(assignment):
+            total += cells.get((r, c), 0)
+        return total
+
+    #===========================================================================
+    # method which compares incremental evaluation of changed predictions
+    # with evaluation from scratch
+    #===========================================================================
+    @staticmethod
+    def incremental(goldDict, predDict, rounds, seed, tempDir):
+        rng = random.Random(seed)
+        gold = EMMA.GoldStandard(goldDict)
+        stateFile = os.path.join(tempDir, "check.state")
+        EMMA.incremental.evaluate(gold, predDict, stateFile)
+        for r in range(rounds):
+            predDict = check.changePredictions(predDict, rng)
+            result = EMMA.incremental.evaluate(gold, predDict, stateFile)
+            full = EMMA.evaluate(gold, predDict, useCache=False, quiet=True)
+            if ((result.precision, result.recall, result.fmeasure) !=
+                (full.precision, full.recall, full.fmeasure) or
+                result.wordScores != full.wordScores):
+                return ("FAILED", "round " + str(r + 1) + ": incremental " +
+                        repr((result.precision, result.recall, result.fmeasure)) +
+                        ", full " + repr((full.precision, full.recall, full.fmeasure)))
+        return ("OK", str(rounds) + " rounds, fmeasure " + repr(full.fmeasure))
+
+    #===========================================================================
+    # method which returns copy of predictions with about 5% of the words
+    # changed: segments merged, a segment renamed or predictions of two
+    # words exchanged
+    #===========================================================================
+    @staticmethod
+    def changePredictions(predDict, rng):
+        predDict = dict(predDict)
+        words = sorted(predDict.keys())
+        for word in rng.sample(words, max(1, len(words) // 20)):
+            analyses = [list(analysis) for analysis in predDict[word]]
+            analysis = analyses[rng.randrange(len(analyses))]
+            action = rng.randrange(3)
+            if action == 0 and len(analysis) > 1:
+                k = rng.randrange(len(analysis) - 1)
+                analysis[k:k + 2] = [analysis[k] + analysis[k + 1]]
+            elif action == 1 and len(analysis) > 0:
+                analysis[rng.randrange(len(analysis))] = "changed" + str(rng.randrange(10))
+            else:
+                other = rng.choice(words)
+                (analyses, predDict[other]) = (predDict[other], analyses)
+            predDict[word] = analyses
+        return predDict
+
+    #===========================================================================
+    # method which compares compiled and directly applied POS rules on random
+    # label sequences
+    #===========================================================================
+    @staticmethod
+    def rules(sequences, seed):
+        rng = random.Random(seed)
+        pt = posTagger.PosTagger(0)
+        pt.calcSets()
+        labels = sorted(pt._firstLiterals.union(pt._jSet, *pt._ruleSets)) + _unknownLabels
+        for s in range(sequences):
+            sequence = [rng.choice(labels) for i in range(rng.randint(1, 6))]
+            jMorpheme1 = None
+            for label in sequence[1:]:
+                if pt._jSet.__contains__(label):
+                    jMorpheme1 = label
+                    break
+            expected = (pt.applyRules(sequence[0], jMorpheme1, sequence, False),
+                        pt.applyRules(sequence[0], jMorpheme1, sequence, True))
+            compiled = pt.getPosTags(sequence)
+            if compiled != expected:
+                return ("FAILED", " ".join(sequence) + ": compiled " +
+                        repr(compiled) + ", rules " + repr(expected))
+        return ("OK", str(sequences) + " label sequences")
+
+################################################################################
+#
+# Option parser
+#
+################################################################################
+if __name__ == "__main__":
+    usage ="%prog [-w words -r rounds -q sequences -L lp_solve path -s seed]"
+    usage +="\n       Regression checks of EMMA solvers, incremental evaluation and compiled POS rules.\n"
+    parser = OptionParser(usage=usage, version="%prog 1.0")
+    parser.add_option("-w", "--words", action="store", type="int", dest="words", default=300, help="number of words of the sample (default: 300)")
+    parser.add_option("-r", "--rounds", action="store", type="int", dest="rounds", default=3, help="rounds of changed predictions evaluated incrementally (default: 3)")
+    parser.add_option("-q", "--sequences", action="store", type="int", dest="sequences", default=20000, help="number of random label sequences (default: 20000)")
+    parser.add_option("-L", "--lpSolvePath", action="store", type="string", dest="lpSolvePath", help="executable of lp_solve (default: " + EMMA._lpSolvePath + ")")
+    parser.add_option("-s", "--seed", action="store", type="int", dest="seed", default=0, help="seed of changes and label sequences (default: 0)")
+    parser.add_option("--labelledFile", action="store", type="string", dest="labelledFile", help="labelled word list (default: from " + _corpusArchive + ")")
+    parser.add_option("--segmentedFile", action="store", type="string", dest="segmentedFile", help="segmented word list (default: from " + _corpusArchive + ")")
+
+    (options, args) = parser.parse_args()
+    if not check.main(options.labelledFile, options.segmentedFile,
+                      options.words, options.rounds, options.sequences,
+                      options.lpSolvePath, options.seed):
+        sys.exit(1)